@@ -0,0 +1,92 @@
+import argparse
+import datetime
+import logging
+import os
+import threading
+import time
+
+from repositorio import obtener_repositorio, RUTA_BD, ruta_archivo
+
+# --- ARCHIVADO DE CITAS VIEJAS ---
+# Mueve las citas anteriores al horizonte (por defecto, dos años) a citas_archivo.db, por
+# lotes: cada lote es una transacción corta y entre lotes hay una pausa, así las sesiones
+# siguen agendando mientras corre. La BD caliente queda del tamaño de la agenda reciente.
+#
+#   python archivo.py                 -> archiva con el horizonte por defecto
+#   python archivo.py --dias 365
+#   python archivo.py --compactar     -> además, VACUUM (la primera vez, para que la BD se achique)
+#
+# En la app es opcional: con AGENDA_ARCHIVO_DIAS=730 corre poco después de abrir y luego una
+# vez al día. Sin la variable (o con 0) no se archiva nada solo; la línea de comandos sigue igual.
+
+HORIZONTE_DIAS = 730
+LOTE = 2_000
+PAUSA = 0.05         # Segundos entre lotes (deja pasar las escrituras de las sesiones)
+ESPERA_INICIAL = 60  # El primer archivado no compite con el arranque
+INTERVALO = 24 * 3600
+
+log = logging.getLogger("agenda.archivo")
+
+
+def limite(dias, hoy=None):
+    # Primer día que se queda en la BD caliente
+    return ((hoy or datetime.date.today()) - datetime.timedelta(days=dias)).isoformat()
+
+
+def archivar(repo, dias=HORIZONTE_DIAS, lote=LOTE, pausa=PAUSA):
+    # {'movidas', 'lotes', 'segundos'}
+    hasta = limite(dias)
+    resultado = {"movidas": 0, "lotes": 0, "segundos": 0.0}
+    inicio = time.perf_counter()
+    while True:
+        movidas = repo.archivar_lote(hasta, lote)
+        if not movidas: break
+        resultado["movidas"] += movidas
+        resultado["lotes"] += 1
+        if pausa: time.sleep(pausa)
+    resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def _periodico(repo, dias):
+    time.sleep(ESPERA_INICIAL)
+    while True:
+        try:
+            r = archivar(repo, dias)
+            if r["movidas"]: log.info("archivo %s", r)
+        except Exception as ex:
+            log.warning("archivado falló: %s", ex)  # Se reintenta en el próximo ciclo
+        time.sleep(INTERVALO)
+
+
+_iniciado = [False]
+_iniciado_lock = threading.Lock()
+
+def configurar_desde_entorno(repo):
+    # Una sola vez por proceso, aunque main() corra por cada sesión
+    with _iniciado_lock:
+        if _iniciado[0]: return
+        _iniciado[0] = True
+    dias = int(os.environ.get("AGENDA_ARCHIVO_DIAS", 0))
+    if dias > 0:
+        threading.Thread(target=_periodico, args=(repo, dias), daemon=True, name="archivo").start()
+
+
+def principal(argv=None):
+    parser = argparse.ArgumentParser(description="Mueve las citas viejas a la BD de archivo")
+    parser.add_argument("--bd", default=RUTA_BD)
+    parser.add_argument("--dias", type=int, default=HORIZONTE_DIAS, help="Se quedan en la BD caliente los últimos N días")
+    parser.add_argument("--lote", type=int, default=LOTE)
+    parser.add_argument("--compactar", action="store_true", help="VACUUM de la BD caliente al terminar")
+    args = parser.parse_args(argv)
+
+    repo = obtener_repositorio(args.bd)
+    r = archivar(repo, args.dias, args.lote)
+    print(f"Movidas: {r['movidas']} en {r['lotes']} lotes ({r['segundos']} s) -> {ruta_archivo(args.bd)}")
+    if args.compactar:
+        repo.compactar()
+        print(f"{args.bd}: {os.path.getsize(args.bd) / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    principal()
@@ -0,0 +1,453 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+
+from repositorio import Repositorio, HorarioOcupado, Cambio, TAM_PAGINA, ruta_archivo
+import archivo
+from recordatorios import Recordatorios, inicio_de
+from disponibilidad import Disponibilidad
+from cache_meses import CacheMeses, CacheDias
+from recurrencia import Recurrencias
+from tiempo import iso_a_fecha, minutos_a_hora, limites_mes
+
+# --- BENCHMARK SIN INTERFAZ ---
+# Genera citas.db sintéticas (1k, 100k, 1M citas repartidas en varios años) y mide
+# las rutas de datos que usan el arranque, verificar_choque, buscar_hueco, cargar_citas_en_grid,
+# la búsqueda de clientes, construir_cal_grande y construir_cal_peque. La salida es
+# JSON para comparar versiones. Aparte, una agenda con varias manicuristas/sillas mide
+# la sugerencia de huecos por recurso.
+#
+#   python benchmark.py                       -> 1k, 100k y 1M
+#   python benchmark.py --tamanos 1000 --salida bench.json
+#   python benchmark.py --estres              -> además, reservas concurrentes (sale con 1 si hay choques)
+#   python benchmark.py --sesiones            -> además, N sesiones mirando la misma semana (con y sin caché compartida)
+#   python benchmark.py --archivo             -> además, la mayor agenda antes y después de archivar lo viejo
+#   python benchmark.py --recordatorios       -> además, CPU del planificador de recordatorios en reposo (sale con 1 si no duerme)
+
+TAMANOS = [1_000, 100_000, 1_000_000]
+DIR_BD = "bench_dbs"
+DESDE = datetime.date(2022, 1, 1)
+DURACIONES = [90, 135, 150, 195]
+MIN_RESERVAS_S = 200  # Intentos de reserva por segundo por debajo de los cuales el estrés falla
+SESIONES = [1, 4, 16, 64]
+CITAS_FUTURAS = 50_000
+MAX_CPU_REPOSO = 0.05  # Segundos de CPU tolerados en REPOSO_S sin avisos
+REPOSO_S = 5
+SEMANA = datetime.date(2024, 3, 4)  # Semana que miran todas las sesiones en --sesiones
+RECURSOS = 8          # Agenda con personal: recursos, días y citas por recurso y día
+DIAS_RECURSOS = 30
+CITAS_POR_RECURSO = 40
+
+
+def generar_bd(ruta, n, anios=4, semilla=7, ordenada=False):
+    # Inserta n citas en un solo lote; la semilla hace la BD reproducible.
+    # ordenada=True: los ids siguen al calendario, como en una agenda que se llenó día a día
+    rnd = random.Random(semilla)
+    dias = anios * 365
+    repo = Repositorio(ruta)
+    desplazamientos = [rnd.randrange(dias) for _ in range(n)]
+    if ordenada: desplazamientos.sort()
+
+    def filas():
+        for i in range(n):
+            dia = DESDE + datetime.timedelta(days=desplazamientos[i])
+            ini = rnd.randrange(7 * 60, 20 * 60, 15)
+            fin = ini + rnd.choice(DURACIONES)
+            iso = dia.isoformat()
+            costo = rnd.randrange(150, 900, 50)
+            yield (f"Cliente {i % 5000}", str(costo), iso_a_fecha(iso),
+                   minutos_a_hora(ini), minutos_a_hora(fin), "", iso, ini, fin, costo * 100)
+
+    repo.insertar_lote(filas())
+    repo.conn.execute("ANALYZE")
+    repo.cerrar()
+
+
+def generar_bd_recursos(ruta, semilla=5):
+    # Turnos de 15 minutos sin encimarse dentro de cada recurso, todos asignados
+    rnd = random.Random(semilla)
+    repo = Repositorio(ruta)
+    repo.guardar_recursos([(None, f"Recurso {k + 1}", k, 1) for k in range(RECURSOS)])
+    with repo.transaccion():
+        for d in range(DIAS_RECURSOS):
+            fecha = iso_a_fecha((DESDE + datetime.timedelta(days=d)).isoformat())
+            for recurso, _, _ in repo.recursos():
+                for turno in rnd.sample(range(60), CITAS_POR_RECURSO):
+                    ini = 7 * 60 + turno * 15
+                    repo.insertar_cita(f"Cliente {turno}", "100", fecha, minutos_a_hora(ini), minutos_a_hora(ini + 15), "",
+                                       recurso=recurso)
+    repo.cerrar()
+
+
+def preparar_bd(n, regenerar=False):
+    # n=None: la agenda con recursos
+    os.makedirs(DIR_BD, exist_ok=True)
+    ruta = os.path.join(DIR_BD, f"citas_{n}.db" if n else "recursos.db")
+    if regenerar or not os.path.exists(ruta):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(ruta + sufijo): os.remove(ruta + sufijo)
+        inicio = time.perf_counter()
+        if n: generar_bd(ruta, n)
+        else: generar_bd_recursos(ruta)
+        print(f"# generada {ruta} en {time.perf_counter() - inicio:.1f}s", file=sys.stderr)
+    return ruta
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(i)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "n": repeticiones,
+        "media_ms": round(statistics.fmean(tiempos), 4),
+        "mediana_ms": round(statistics.median(tiempos), 4),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 4),
+        "max_ms": round(tiempos[-1], 4),
+    }
+
+
+def escenarios(repo, rnd, repeticiones):
+    # (nombre, función(i)) — cada función recibe el índice de la repetición
+    dias = [(DESDE + datetime.timedelta(days=rnd.randrange(4 * 365))).isoformat() for _ in range(repeticiones)]
+    fechas = [iso_a_fecha(d) for d in dias]
+    meses = [(int(d[5:7]), int(d[:4])) for d in dias]
+    max_id = repo.consultar("SELECT MAX(id) FROM citas")[0][0] or 1
+    ids = [rnd.randrange(1, max_id + 1) for _ in range(repeticiones)]
+    # Lo que se teclea en el buscador: nombre completo + prefijo del número
+    textos = [f"Cliente {rnd.randrange(5000)}"[:rnd.randrange(9, 13)] for _ in range(repeticiones)]
+
+    motor = Disponibilidad(repo)
+    for f in fechas: motor.choca(f, 600, 690)
+    cache = CacheMeses(repo, max_meses=len(set(meses)) + 2)
+    for m in set(meses): cache._obtener(*m, prefetch=False)
+
+    def con_motor_frio(consulta):
+        # Motor recién creado: incluye la lectura de los días desde SQLite
+        def funcion(i):
+            frio = Disponibilidad(repo)
+            consulta(frio, i)
+            repo.desuscribir(frio.al_cambiar)
+        return funcion
+
+    return [
+        ("verificar_choque.frio", con_motor_frio(lambda m, i: m.choca(fechas[i], 600, 690))),
+        ("verificar_choque.caliente", lambda i: motor.choca(fechas[i], 600, 690)),
+        ("buscar_hueco.dia", lambda i: motor.primer_hueco(fechas[i], 150)),
+        ("buscar_hueco.7_dias_frio", con_motor_frio(lambda m, i: m.proximos_huecos(fechas[i], 195, n=3, dias=7))),
+        ("cargar_citas_en_grid.primera_pagina", lambda i: repo.pagina_citas()),
+        ("cargar_citas_en_grid.pagina_profunda", lambda i: repo.pagina_citas(ids[i])),
+        ("cargar_citas_en_grid.dia", lambda i: repo.citas_del_dia(fechas[i])),
+        ("cargar_citas_en_grid.dia_primera_pagina", lambda i: repo.citas_del_dia(fechas[i], limite=TAM_PAGINA)),
+        ("arranque.abrir_bd", lambda i: Repositorio(repo.ruta).cerrar()),
+        ("buscar_cliente.primera_pagina", lambda i: repo.buscar_citas(textos[i])),
+        ("buscar_cliente.pagina_profunda", lambda i: repo.buscar_citas(textos[i], ids[i])),
+        ("autocompletar_cliente", lambda i: repo.sugerir_clientes(textos[i])),
+        ("construir_cal_grande.sql", lambda i: repo.nombres_por_dia(*meses[i])),
+        ("construir_cal_grande.cache", lambda i: cache.nombres(*meses[i])),
+        ("construir_cal_peque.sql", lambda i: repo.conteos_por_dia(*meses[i])),
+        ("construir_cal_peque.cache", lambda i: cache.conteos(*meses[i])),
+        ("reporte_ingresos.mes", lambda i: repo.ingresos_por_dia(*meses[i])),
+        ("reporte_ingresos.anio", lambda i: repo.ingresos_por_mes(meses[i][1])),
+        ("reporte_ingresos.scan_completo", lambda i: repo.consultar(
+            "SELECT substr(dia, 1, 7), COUNT(*), SUM(centavos) FROM citas WHERE dia >= ? AND dia < ? GROUP BY 1",
+            (f"{meses[i][1]}-", f"{meses[i][1] + 1}-"))),
+    ]
+
+
+def escenarios_recursos(repo, rnd, repeticiones):
+    # Después de cada escritura se vuelven a fundir los bloques: para un recurso son sus
+    # citas (CITAS_POR_RECURSO), para el salón entero las de todos (RECURSOS veces más)
+    ids = [r[0] for r in repo.recursos()]
+    fechas = [iso_a_fecha((DESDE + datetime.timedelta(days=rnd.randrange(DIAS_RECURSOS))).isoformat())
+              for _ in range(repeticiones)]
+    motor = Disponibilidad(repo)
+    for f in set(fechas): motor.choca(f, 600, 615)
+
+    def tras_escritura(recursos):
+        def funcion(i):
+            r = ids[i % len(ids)]
+            fila = (-1, "x", "", fechas[i], "10:00 PM", "10:15 PM", "", r)
+            motor.al_cambiar(Cambio("insertar", -1, None, fila))
+            motor.primer_hueco(fechas[i], 60, recursos(r))
+            motor.al_cambiar(Cambio("eliminar", -1, fila, None))
+        return funcion
+
+    return [
+        ("verificar_choque.recurso", lambda i: motor.choca(fechas[i], 600, 615, recurso=ids[i % len(ids)])),
+        ("buscar_hueco.recurso_tras_escritura", tras_escritura(lambda r: [r])),
+        ("buscar_hueco.8_recursos_tras_escritura", tras_escritura(lambda r: ids)),
+        ("buscar_hueco.salon_tras_escritura", tras_escritura(lambda r: [None])),
+        ("construir_cal_grande.sql_recurso", lambda i: repo.nombres_por_dia(1, DESDE.year, ids[i % len(ids)])),
+    ]
+
+
+def estres_reservas(sesiones=16, intentos=300, conexiones=4, semilla=11):
+    # Muchas sesiones (hilos) agendando a la vez en el mismo día, repartidas en varias
+    # conexiones como si fueran procesos distintos. Pasa si no queda ninguna cita encimada
+    os.makedirs(DIR_BD, exist_ok=True)
+    ruta = os.path.join(DIR_BD, "estres.db")
+    for sufijo in ("", "-wal", "-shm"):
+        if os.path.exists(ruta + sufijo): os.remove(ruta + sufijo)
+    repos = [Repositorio(ruta) for _ in range(conexiones)]
+    fecha = iso_a_fecha("2025-06-16")
+    conteo = {"agendadas": 0, "ocupadas": 0, "errores": 0}
+    lock = threading.Lock()
+
+    def sesion(k):
+        rnd = random.Random(semilla + k)
+        repo = repos[k % conexiones]
+        for _ in range(intentos):
+            # Turnos cortos en todo el día: muchas reservas llegan a escribirse y compiten de verdad
+            m_ini = rnd.randrange(0, 1440 - 30, 5)
+            ini, fin = minutos_a_hora(m_ini), minutos_a_hora(m_ini + rnd.choice((5, 10, 15, 30)))
+            try:
+                with repo.reserva(fecha, ini, fin):
+                    repo.insertar_cita(f"Sesion {k}", "100", fecha, ini, fin, "")
+                clave = "agendadas"
+            except HorarioOcupado:
+                clave = "ocupadas"
+            except sqlite3.Error:
+                clave = "errores"
+            with lock: conteo[clave] += 1
+
+    hilos = [threading.Thread(target=sesion, args=(k,)) for k in range(sesiones)]
+    inicio = time.perf_counter()
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    segundos = time.perf_counter() - inicio
+    encimadas = repos[0].consultar("""SELECT COUNT(*) FROM citas a JOIN citas b
+                                      ON a.dia = b.dia AND a.id < b.id AND a.min_ini < b.min_fin AND a.min_fin > b.min_ini""")[0][0]
+    for repo in repos: repo.cerrar()
+    por_segundo = round(sesiones * intentos / segundos, 1)
+    return {"sesiones": sesiones, "conexiones": conexiones, "intentos": sesiones * intentos, **conteo,
+            "encimadas": encimadas, "reservas_por_s": por_segundo,
+            "ok": encimadas == 0 and conteo["errores"] == 0 and por_segundo >= MIN_RESERVAS_S}
+
+
+def sesiones_compartidas(n=100_000, sesiones=SESIONES, rondas=5):
+    # N sesiones abren a la vez la misma semana: la lista de cada día, el calendario del mes
+    # y el reporte. Sin caché cada sesión consulta por su cuenta; con la caché compartida
+    # del proceso la consulta de cada clave se hace una vez. Antes de cada ronda se invalida
+    # todo, como tras una escritura
+    repo = Repositorio(preparar_bd(n))
+    dias = [iso_a_fecha((SEMANA + datetime.timedelta(days=k)).isoformat()) for k in range(7)]
+    mes, anio = SEMANA.month, SEMANA.year
+    recurrencias = Recurrencias(repo)
+    cache_meses, cache_dias = CacheMeses(repo), CacheDias(repo)
+    lecturas = lambda: cache_meses.meses.lecturas + cache_meses.reportes.lecturas + cache_dias.dias.lecturas
+
+    def sin_cache():
+        for fecha in dias: repo.citas_del_dia(fecha, limite=TAM_PAGINA) + recurrencias.filas_del_dia(fecha)
+        recurrencias.agregar_nombres(repo.nombres_por_dia(mes, anio), *limites_mes(mes, anio))
+        repo.ingresos_por_dia(mes, anio), repo.ingresos_por_mes(anio)
+
+    def con_cache():
+        for fecha in dias: cache_dias.primera_pagina(fecha)
+        cache_meses._obtener(mes, anio, prefetch=False)  # Sin meses vecinos: el conteo queda exacto
+        cache_meses.ingresos(mes, anio)
+
+    def ronda(funcion, k):
+        barrera = threading.Barrier(k)
+        def sesion():
+            barrera.wait()
+            funcion()
+        hilos = [threading.Thread(target=sesion) for _ in range(k)]
+        inicio = time.perf_counter()
+        for h in hilos: h.start()
+        for h in hilos: h.join()
+        return (time.perf_counter() - inicio) * 1000
+
+    resultados = []
+    for k in sesiones:
+        for modo, funcion in (("sin_cache", sin_cache), ("compartida", con_cache)):
+            tiempos, consultas = [], 0
+            for _ in range(rondas):
+                cache_meses.invalidar_todo(); cache_dias.dias.invalidar_todo()
+                antes = lecturas()
+                tiempos.append(ronda(funcion, k))
+                consultas += (lecturas() - antes) if modo == "compartida" else k * (len(dias) + 2)
+            resultados.append({"sesiones": k, "modo": modo, "consultas_por_ronda": consultas // rondas,
+                               "mediana_ms": round(statistics.median(tiempos), 3),
+                               "ms_por_sesion": round(statistics.median(tiempos) / k, 3)})
+            print(f"# sesiones {k:>3} {modo:<11} {resultados[-1]['consultas_por_ronda']:>5} consultas "
+                  f"{resultados[-1]['mediana_ms']:>10.3f} ms", file=sys.stderr)
+    repo.cerrar()
+    return resultados
+
+
+def particion_archivo(n, repeticiones, regenerar=False, dias=archivo.HORIZONTE_DIAS):
+    # Agenda de n citas con ids en orden de calendario: se miden las rutas de cada clic y las
+    # de historial antes de archivar y después (archivado + VACUUM), más el tamaño de la BD caliente
+    os.makedirs(DIR_BD, exist_ok=True)
+    base = os.path.join(DIR_BD, f"ordenada_{n}.db")
+    if regenerar or not os.path.exists(base):
+        for f in (base, ruta_archivo(base)):
+            for sufijo in ("", "-wal", "-shm"):
+                if os.path.exists(f + sufijo): os.remove(f + sufijo)
+        generar_bd(base, n, ordenada=True)
+    ruta = os.path.join(DIR_BD, f"particion_{n}.db")
+    for f in (ruta, ruta_archivo(ruta)):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(f + sufijo): os.remove(f + sufijo)
+    shutil.copyfile(base, ruta)
+    if os.path.exists(ruta_archivo(base)): shutil.copyfile(ruta_archivo(base), ruta_archivo(ruta))
+
+    rnd = random.Random(n)
+    hasta = archivo.limite(dias)
+    repo = Repositorio(ruta)
+    ultimo = repo.consultar("SELECT MAX(dia) FROM citas")[0][0]
+    recientes = [datetime.date.fromisoformat(ultimo) - datetime.timedelta(days=rnd.randrange(60)) for _ in range(repeticiones)]
+    viejos = [DESDE + datetime.timedelta(days=rnd.randrange(365)) for _ in range(repeticiones)]
+    textos = [f"Cliente {rnd.randrange(5000)}"[:rnd.randrange(9, 13)] for _ in range(repeticiones)]
+    operaciones = [
+        ("cargar_citas_en_grid.primera_pagina", lambda i: repo.pagina_citas()),
+        ("cargar_citas_en_grid.dia_reciente", lambda i: repo.citas_del_dia(iso_a_fecha(recientes[i].isoformat()), limite=TAM_PAGINA)),
+        ("construir_cal_grande.mes_reciente", lambda i: repo.nombres_por_dia(recientes[i].month, recientes[i].year)),
+        ("verificar_choque.sql_reciente", lambda i: repo.consultar(
+            "SELECT 1 FROM citas WHERE dia=? AND min_ini < 690 AND min_fin > 600 LIMIT 1", (recientes[i].isoformat(),))),
+        ("historial.dia_archivado", lambda i: repo.citas_del_dia(iso_a_fecha(viejos[i].isoformat()), limite=TAM_PAGINA)),
+        ("historial.mes_archivado", lambda i: repo.nombres_por_dia(viejos[i].month, viejos[i].year)),
+        ("buscar_cliente.primera_pagina", lambda i: repo.buscar_citas(textos[i])),
+    ]
+    tam = lambda f: os.path.getsize(f) if os.path.exists(f) else 0
+    resultados = []
+    for etapa in ("antes", "despues"):
+        if etapa == "despues":
+            movidas = archivo.archivar(repo, dias, pausa=0)
+            repo.compactar()
+            print(f"# archivo: {movidas} (antes de {hasta})", file=sys.stderr)
+        fila = {"etapa": etapa, "bd_caliente_mb": round(tam(ruta) / 2 ** 20, 1),
+                "bd_archivo_mb": round(tam(ruta_archivo(ruta)) / 2 ** 20, 1),
+                "citas_calientes": repo.consultar("SELECT COUNT(*) FROM citas")[0][0]}
+        for nombre, funcion in operaciones:
+            fila[nombre] = medir(funcion, repeticiones)["mediana_ms"]
+            print(f"# {etapa:>7} {nombre:<40} {fila[nombre]:>10.3f} ms", file=sys.stderr)
+        resultados.append(fila)
+    repo.cerrar()
+    return resultados
+
+
+def recordatorios_en_reposo(n=CITAS_FUTURAS, semilla=13):
+    # n citas futuras (un año desde mañana) y el planificador arriba: cuánto cuesta armarlo,
+    # cuánto mete / saca una escritura, cuánta CPU gasta mientras no vence nada y con qué
+    # retraso dispara un aviso
+    os.makedirs(DIR_BD, exist_ok=True)
+    ruta = os.path.join(DIR_BD, "futuras.db")
+    for f in (ruta, ruta_archivo(ruta)):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(f + sufijo): os.remove(f + sufijo)
+    rnd = random.Random(semilla)
+    manana = datetime.date.today() + datetime.timedelta(days=1)
+    repo = Repositorio(ruta)
+
+    def filas():
+        for i in range(n):
+            iso = (manana + datetime.timedelta(days=rnd.randrange(365))).isoformat()
+            ini = rnd.randrange(7 * 60, 20 * 60, 15)
+            yield (f"Cliente {i}", "100", iso_a_fecha(iso), minutos_a_hora(ini), minutos_a_hora(ini + 60), "",
+                   iso, ini, ini + 60, 10000)
+
+    repo.insertar_lote(filas())
+    inicio = time.perf_counter()
+    planificador = Recordatorios(repo)
+    planificador.iniciar()
+    carga_ms = (time.perf_counter() - inicio) * 1000
+
+    # Escrituras: cada una toca solo su entrada del heap
+    fecha = iso_a_fecha((manana + datetime.timedelta(days=2)).isoformat())
+    ids = [repo.insertar_cita("Nueva", "100", fecha, "06:00 AM", "06:30 AM", "") for _ in range(200)]
+    oyente_ms = medir(lambda i: planificador.al_cambiar(Cambio("eliminar", ids[i], None, None)), len(ids))["mediana_ms"]
+
+    # Reposo: nada vence en REPOSO_S; el hilo tiene que estar dormido
+    despertares, cpu = planificador.despertares, time.process_time()
+    time.sleep(REPOSO_S)
+    cpu_reposo = time.process_time() - cpu
+    despertares = planificador.despertares - despertares
+
+    # Un aviso que vence en ~1 s: se adelanta el margen para no esperar al minuto siguiente
+    disparos = []
+    planificador.suscribir(lambda fila: disparos.append(time.time()))
+    ahora = datetime.datetime.now().replace(second=0, microsecond=0) + datetime.timedelta(minutes=2)
+    fila = (None, "Pronto", "100", ahora.strftime("%d/%m/%Y"), minutos_a_hora(ahora.hour * 60 + ahora.minute), "", "", None)
+    planificador.minutos = (inicio_de(fila) - time.time() - 1) / 60
+    id_cita = repo.insertar_cita(*fila[1:7])
+    esperado = inicio_de(fila) - planificador.minutos * 60
+    time.sleep(2)
+    retraso_ms = round((disparos[0] - esperado) * 1000, 1) if disparos else None
+    repo.eliminar_cita(id_cita)
+    repo.cerrar()
+    resultado = {"citas_futuras": n, "en_heap": planificador.pendientes(), "carga_ms": round(carga_ms, 1),
+                 "al_cambiar_ms": oyente_ms, "cpu_reposo_s": round(cpu_reposo, 4), "reposo_s": REPOSO_S,
+                 "despertares_reposo": despertares, "retraso_aviso_ms": retraso_ms,
+                 "ok": cpu_reposo <= MAX_CPU_REPOSO and retraso_ms is not None}
+    print(f"# recordatorios {resultado}", file=sys.stderr)
+    return resultado
+
+
+def ejecutar(tamanos, repeticiones, regenerar=False, filtro=None):
+    resultados = []
+    for n in tamanos + [None]:
+        repo = Repositorio(preparar_bd(n, regenerar))
+        rnd = random.Random(n)
+        tamano = n or f"{RECURSOS}x{CITAS_POR_RECURSO}"
+        for nombre, funcion in (escenarios if n else escenarios_recursos)(repo, rnd, repeticiones):
+            if filtro and filtro not in nombre: continue
+            resultados.append({"tamano": tamano, "operacion": nombre, **medir(funcion, repeticiones)})
+            print(f"# {tamano:>9} {nombre:<40} {resultados[-1]['mediana_ms']:>10.3f} ms", file=sys.stderr)
+        repo.cerrar()
+    return {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "repeticiones": repeticiones,
+        "resultados": resultados,
+    }
+
+
+def principal(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de Agenda Liz sobre agendas sintéticas")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--solo", help="Solo operaciones cuyo nombre contenga este texto")
+    parser.add_argument("--regenerar", action="store_true", help="Vuelve a crear las BD sintéticas")
+    parser.add_argument("--salida", help="Archivo JSON (por defecto, stdout)")
+    parser.add_argument("--estres", action="store_true", help="Agrega la prueba de reservas concurrentes")
+    parser.add_argument("--sesiones", action="store_true", help="Agrega la prueba de sesiones por proceso")
+    parser.add_argument("--archivo", action="store_true", help="Agrega la comparación antes / después de archivar")
+    parser.add_argument("--recordatorios", action="store_true", help="Agrega la prueba del planificador en reposo")
+    args = parser.parse_args(argv)
+
+    informe = ejecutar(args.tamanos, args.repeticiones, args.regenerar, args.solo)
+    if args.estres:
+        informe["estres"] = estres_reservas()
+        print(f"# estres {informe['estres']}", file=sys.stderr)
+    if args.sesiones:
+        informe["sesiones"] = sesiones_compartidas()
+    if args.archivo:
+        informe["archivo"] = particion_archivo(max(args.tamanos), args.repeticiones, args.regenerar)
+    if args.recordatorios:
+        informe["recordatorios"] = recordatorios_en_reposo()
+    texto = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f: f.write(texto + "\n")
+    else:
+        print(texto)
+    if args.estres and not informe["estres"]["ok"]: sys.exit(1)
+    if args.recordatorios and not informe["recordatorios"]["ok"]: sys.exit(1)
+
+
+if __name__ == "__main__":
+    principal()
@@ -0,0 +1,196 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from tiempo import fecha_a_iso, limites_mes
+from recurrencia import Recurrencias
+from repositorio import TAM_PAGINA
+from tareas import POOL
+
+# --- CACHÉ DE LECTURAS (MESES Y DÍAS) ---
+# Compartida por todas las sesiones del proceso: cuando varias miran el mismo mes o el
+# mismo día, la consulta se hace una sola vez. Si piden la misma clave a la vez (p. ej.
+# todas recargan tras una escritura), una consulta y las demás esperan ese resultado.
+# LRU acotada; una escritura invalida solo los meses / días de las fechas que toca.
+#
+# Meses: un resumen ({fecha: [clientes]}) sirve a los dos calendarios (el grande muestra
+# los nombres y el pequeño cuenta cuántos hay), por recurso si hay filtro; y los ingresos
+# del mes y del año para el reporte.
+# Días: la primera página de la lista del día y los nombres de su celda.
+# Las series recurrentes se expanden aquí, solo para el mes o día que se lee.
+
+MAX_MESES = 24
+MAX_DIAS = 60
+
+
+def clave_de_fecha(fecha):
+    # 'dd/mm/yyyy' -> (mes, anio)
+    iso = fecha_a_iso(fecha)
+    return (int(iso[5:7]), int(iso[:4])) if iso else None
+
+
+def meses_vecinos(mes, anio):
+    anterior = (12, anio - 1) if mes == 1 else (mes - 1, anio)
+    siguiente = (1, anio + 1) if mes == 12 else (mes + 1, anio)
+    return anterior, siguiente
+
+
+class _Compartida:
+    # LRU con carga única por clave. Cada clave pertenece a un grupo (un mes, un día) y se
+    # invalida por grupo; la versión del grupo evita guardar lecturas que quedaron viejas
+    def __init__(self, maximo, grupo):
+        self.maximo = maximo
+        self.grupo = grupo
+        self.datos = OrderedDict()
+        self.en_vuelo = {}
+        self.versiones = {}
+        self.lock = threading.Lock()
+        self.lecturas = 0   # Cargas que llegaron a SQLite (para medir aciertos entre sesiones)
+
+    def obtener(self, clave, cargar):
+        grupo = self.grupo(clave)
+        with self.lock:
+            if clave in self.datos:
+                self.datos.move_to_end(clave)
+                return self.datos[clave]
+            futuro = self.en_vuelo.get(clave)
+            propio = futuro is None
+            if propio:
+                futuro = self.en_vuelo[clave] = Future()
+                version = self.versiones.get(grupo, 0)
+        if not propio: return futuro.result()
+        try:
+            valor = cargar()
+        except BaseException as ex:
+            with self.lock:
+                if self.en_vuelo.get(clave) is futuro: del self.en_vuelo[clave]
+            futuro.set_exception(ex)
+            raise
+        with self.lock:
+            self.lecturas += 1
+            if self.en_vuelo.get(clave) is futuro: del self.en_vuelo[clave]
+            if self.versiones.get(grupo, 0) == version:
+                self.datos[clave] = valor
+                self.datos.move_to_end(clave)
+                while len(self.datos) > self.maximo:
+                    self.datos.popitem(last=False)
+        futuro.set_result(valor)
+        return valor
+
+    def invalidar(self, grupo):
+        # Lo que esté cargándose de ese grupo ya no se guarda; quien pida después vuelve a leer
+        with self.lock:
+            for clave in [k for k in self.datos if self.grupo(k) == grupo]: del self.datos[clave]
+            for clave in [k for k in self.en_vuelo if self.grupo(k) == grupo]: del self.en_vuelo[clave]
+            self.versiones[grupo] = self.versiones.get(grupo, 0) + 1
+
+    def invalidar_todo(self):
+        with self.lock:
+            for grupo in {self.grupo(k) for k in list(self.datos) + list(self.en_vuelo)} | set(self.versiones):
+                self.versiones[grupo] = self.versiones.get(grupo, 0) + 1
+            self.datos.clear()
+            self.en_vuelo.clear()
+
+
+class CacheMeses:
+    def __init__(self, repo, max_meses=MAX_MESES, pool=POOL):
+        self.repo = repo
+        self.pool = pool
+        self.precargando = set()   # Claves encoladas en el pool y aún sin empezar a leer
+        self.lock = threading.Lock()
+        self.recurrencias = Recurrencias(repo)
+        self.meses = _Compartida(max_meses, lambda clave: clave[:2])          # (mes, anio, recurso)
+        self.reportes = _Compartida(max_meses, lambda clave: clave[1])        # (mes, anio): el año entero
+        repo.suscribir(self.al_cambiar)
+
+    def nombres(self, mes, anio, recurso=None):
+        return self._obtener(mes, anio, recurso)
+
+    def conteos(self, mes, anio, recurso=None):
+        return {f: len(n) for f, n in self._obtener(mes, anio, recurso).items()}
+
+    def ingresos(self, mes, anio):
+        # (por día del mes, por mes del año) como Repositorio.ingresos_por_dia / ingresos_por_mes
+        return self.reportes.obtener((mes, anio), lambda: (self.repo.ingresos_por_dia(mes, anio),
+                                                            self.repo.ingresos_por_mes(anio)))
+
+    def _obtener(self, mes, anio, recurso=None, prefetch=True):
+        datos = self.meses.obtener((mes, anio, recurso), lambda: self.recurrencias.agregar_nombres(
+            self.repo.nombres_por_dia(mes, anio, recurso), *limites_mes(mes, anio), recurso))
+        if prefetch:
+            # En un acierto los vecinos casi siempre ya están: se mira sin lock (leer un dict es
+            # atómico; un dato desfasado solo adelanta o salta una precarga) antes de ir al pool
+            meses = self.meses
+            for vecino in meses_vecinos(mes, anio):
+                clave = (*vecino, recurso)
+                if clave not in meses.datos and clave not in meses.en_vuelo: self._precargar(clave)
+        return datos
+
+    def _precargar(self, clave):
+        # Los meses vecinos se leen en segundo plano (pool compartido de tareas) para que las
+        # flechas no esperen al disco. Una sola tarea por clave aunque se pida muchas veces
+        with self.lock:
+            if clave in self.precargando: return
+            self.precargando.add(clave)
+        def tarea():
+            try: self._obtener(*clave, prefetch=False)
+            except: pass
+            finally:
+                with self.lock: self.precargando.discard(clave)
+        self.pool.submit(tarea)
+
+    def invalidar(self, clave):
+        # clave = (mes, anio): el mes sale para todos los recursos, y el reporte de su año
+        self.meses.invalidar(clave)
+        self.reportes.invalidar(clave[1])
+
+    def invalidar_todo(self):
+        self.meses.invalidar_todo()
+        self.reportes.invalidar_todo()
+
+    def al_cambiar(self, cambio):
+        if cambio.accion == "recargar":
+            self.invalidar_todo(); return
+        for fila in (cambio.antes, cambio.despues):
+            clave = clave_de_fecha(fila[3]) if fila else None
+            if clave: self.invalidar(clave)
+
+
+class CacheDias:
+    def __init__(self, repo, max_dias=MAX_DIAS):
+        self.repo = repo
+        self.recurrencias = Recurrencias(repo)
+        self.dias = _Compartida(max_dias, lambda clave: clave[1])   # (tipo, 'dd/mm/yyyy'[, recurso])
+        repo.suscribir(self.al_cambiar)
+
+    def primera_pagina(self, fecha):
+        # Las citas guardadas del día (una página) más las ocurrencias de series, completas
+        return self.dias.obtener(("lista", fecha), lambda: self.repo.citas_del_dia(fecha, limite=TAM_PAGINA)
+                                 + self.recurrencias.filas_del_dia(fecha))
+
+    def nombres(self, fecha, recurso=None):
+        # Clientes de la celda del calendario grande
+        return self.dias.obtener(("nombres", fecha, recurso), lambda: self.repo.nombres_del_dia(fecha, recurso)
+                                 + self.recurrencias.nombres_del_dia(fecha, recurso))
+
+    def al_cambiar(self, cambio):
+        if cambio.accion == "recargar":
+            self.dias.invalidar_todo(); return
+        for fila in (cambio.antes, cambio.despues):
+            if fila: self.dias.invalidar(fila[3])
+
+
+_cache = [None]
+_cache_dias = [None]
+_cache_lock = threading.Lock()
+
+def obtener_cache_meses(repo):
+    with _cache_lock:
+        if _cache[0] is None:
+            _cache[0] = CacheMeses(repo)
+        return _cache[0]
+
+def obtener_cache_dias(repo):
+    with _cache_lock:
+        if _cache_dias[0] is None:
+            _cache_dias[0] = CacheDias(repo)
+        return _cache_dias[0]
@@ -0,0 +1,205 @@
+import bisect
+import datetime
+import heapq
+import threading
+from collections import OrderedDict
+from tiempo import fecha_a_iso, iso_a_fecha, rango_minutos
+from recurrencia import Recurrencias
+
+# --- MOTOR DE DISPONIBILIDAD ---
+# Por cada día guardamos los intervalos ocupados ordenados por inicio y, bajo demanda,
+# los bloques ya fusionados. Un día se lee de SQLite una sola vez; después se mantiene
+# al día con los avisos del repositorio (insertar / actualizar / eliminar).
+# Las ocurrencias de series recurrentes entran como un intervalo más, calculadas solo
+# para el día que se carga (su id es texto: 'r<regla>@<dia>').
+# Cada día se reparte además por recurso (manicurista, silla): lo que ocupa a un recurso son
+# sus citas más las sin asignar, así que preguntar por un recurso no recorre el día entero.
+# recurso=None en las consultas es el salón como un solo recurso (cualquier cita bloquea).
+
+APERTURA = 7 * 60
+CIERRE = 22 * 60
+PASO = 30
+MAX_DIAS = 400
+
+
+class _Dia:
+    def __init__(self, intervalos):
+        self.intervalos = sorted(intervalos, key=_inicio_fin)  # [(ini, fin, id, recurso)]
+        self.por_recurso = {}
+        for i in self.intervalos: self.por_recurso.setdefault(i[3], []).append(i)
+        self._bloques = {}
+        self._inicios = {}
+
+    def de(self, recurso):
+        # Lo que ocupa a 'recurso', ordenado: las suyas y las sin asignar
+        if recurso is None: return self.intervalos
+        propias, comunes = self.por_recurso.get(recurso, []), self.por_recurso.get(None, [])
+        if not comunes or not propias: return propias or comunes
+        return list(heapq.merge(propias, comunes, key=_inicio_fin))
+
+    def bloques(self, recurso=None):
+        # Intervalos fusionados del recurso: [(ini, fin)] disjuntos y ordenados
+        bloques = self._bloques.get(recurso)
+        if bloques is None:
+            bloques = self._bloques[recurso] = _fusionar(self.de(recurso))
+            self._inicios[recurso] = [b[0] for b in bloques]
+        return bloques
+
+    def agregar(self, ini, fin, id_cita, recurso=None):
+        intervalo = (ini, fin, id_cita, recurso)
+        bisect.insort(self.intervalos, intervalo, key=_inicio_fin)
+        bisect.insort(self.por_recurso.setdefault(recurso, []), intervalo, key=_inicio_fin)
+        self._olvidar(recurso)
+
+    def quitar(self, id_cita):
+        for recurso in {i[3] for i in self.intervalos if i[2] == id_cita}:
+            self.por_recurso[recurso] = [i for i in self.por_recurso[recurso] if i[2] != id_cita]
+            self._olvidar(recurso)
+        self.intervalos = [i for i in self.intervalos if i[2] != id_cita]
+
+    def _olvidar(self, recurso):
+        # Una cita sin asignar cambia los bloques de todos; una asignada, los suyos y los del salón
+        if recurso is None: self._bloques.clear()
+        else: self._bloques.pop(recurso, None); self._bloques.pop(None, None)
+
+
+def _inicio_fin(intervalo):
+    # Los ids mezclan enteros (citas) y texto (ocurrencias): no se comparan
+    return intervalo[0], intervalo[1]
+
+
+def _fusionar(intervalos):
+    bloques = []
+    for ini, fin, *_ in intervalos:
+        if bloques and ini < bloques[-1][1]:
+            if fin > bloques[-1][1]: bloques[-1] = (bloques[-1][0], fin)
+        else:
+            bloques.append((ini, fin))
+    return bloques
+
+
+def _huecos(bloques, duracion, apertura=APERTURA, cierre=CIERRE, paso=PASO):
+    # Primer inicio alineado a 'paso' dentro de cada hueco libre donde cabe 'duracion'
+    cursor = apertura
+    for ini, fin in bloques + [(cierre, cierre)]:
+        if ini > cursor:
+            tope = min(ini, cierre)
+            cand = apertura + -(-(cursor - apertura) // paso) * paso
+            if cand + duracion <= tope:
+                yield cand, cand + duracion
+        cursor = max(cursor, fin)
+        if cursor >= cierre: return
+
+
+class Disponibilidad:
+    def __init__(self, repo):
+        self.repo = repo
+        self.recurrencias = Recurrencias(repo)
+        self.dias = OrderedDict()
+        self.lock = threading.RLock()
+        repo.suscribir(self.al_cambiar)
+
+    def _dia(self, iso):
+        with self.lock:
+            dia = self.dias.get(iso)
+            if dia is None:
+                horarios = self.repo.horarios_del_dia(iso_a_fecha(iso)) + self.recurrencias.horarios_del_dia(iso)
+                dia = _Dia((ini, fin, i, r) for i, ini, fin, r in horarios)
+                self._guardar(iso, dia)
+            else:
+                self.dias.move_to_end(iso)
+            return dia
+
+    def _guardar(self, iso, dia):
+        self.dias[iso] = dia
+        while len(self.dias) > MAX_DIAS:
+            self.dias.popitem(last=False)
+
+    def precargar(self, iso_desde, iso_hasta):
+        # Carga de una sola consulta para varios días (sugerencias multi-día)
+        with self.lock:
+            faltan = {}
+            horarios = self.repo.horarios_rango(iso_desde, iso_hasta) + self.recurrencias.horarios_rango(iso_desde, iso_hasta)
+            for dia, i, ini, fin, r in horarios:
+                if dia not in self.dias: faltan.setdefault(dia, []).append((ini, fin, i, r))
+            d = datetime.date.fromisoformat(iso_desde)
+            fin_rango = datetime.date.fromisoformat(iso_hasta)
+            while d < fin_rango:
+                iso = d.isoformat()
+                if iso not in self.dias: self._guardar(iso, _Dia(faltan.get(iso, [])))
+                d += datetime.timedelta(days=1)
+
+    # --- CONSULTAS ---
+    def choca(self, fecha, ini, fin, excluir=None, recurso=None):
+        # ini/fin en minutos. O(log n) sobre los bloques fusionados del recurso
+        with self.lock:
+            dia = self._dia(fecha_a_iso(fecha))
+            if excluir is not None and any(i[2] == excluir for i in dia.intervalos):
+                return any(ini < f and fin > i for i, f, id_c, _ in dia.de(recurso) if id_c != excluir)
+            bloques = dia.bloques(recurso)
+            k = bisect.bisect_left(dia._inicios[recurso], fin) - 1
+            return k >= 0 and bloques[k][1] > ini
+
+    def recurso_libre(self, fecha, ini, fin, recursos, excluir=None):
+        # El primero de 'recursos' (en su orden) que no tiene nada a esa hora, o None
+        with self.lock:
+            for r in recursos:
+                if not self.choca(fecha, ini, fin, excluir, r): return r
+        return None
+
+    def _huecos_dia(self, iso, duracion, recursos):
+        # Huecos (ini, fin, recurso) del día en orden de inicio, mezclando los de cada recurso;
+        # a igual hora gana el primero de la lista
+        dia = self._dia(iso)
+        def de(k, r):
+            for ini, fin in _huecos(dia.bloques(r), duracion): yield ini, k, fin, r
+        vistos = set()
+        for ini, _, fin, r in heapq.merge(*(de(k, r) for k, r in enumerate(recursos))):
+            if ini not in vistos:
+                vistos.add(ini)
+                yield ini, fin, r
+
+    def primer_hueco(self, fecha, duracion, recursos=(None,)):
+        # (ini, fin, recurso) más temprano entre los recursos adecuados
+        with self.lock:
+            for hueco in self._huecos_dia(fecha_a_iso(fecha), duracion, recursos):
+                return hueco
+        return None, None, None
+
+    def proximos_huecos(self, fecha, duracion, n=3, dias=7, recursos=(None,)):
+        # Hasta n huecos [(fecha, ini, fin, recurso)] en los próximos 'dias' días, empezando por 'fecha'
+        desde = datetime.date.fromisoformat(fecha_a_iso(fecha))
+        hasta = desde + datetime.timedelta(days=dias)
+        resultado = []
+        with self.lock:
+            self.precargar(desde.isoformat(), hasta.isoformat())
+            d = desde
+            while d < hasta and len(resultado) < n:
+                for ini, fin, r in self._huecos_dia(d.isoformat(), duracion, recursos):
+                    resultado.append((iso_a_fecha(d.isoformat()), ini, fin, r))
+                    if len(resultado) >= n: break
+                d += datetime.timedelta(days=1)
+        return resultado
+
+    # --- MANTENIMIENTO INCREMENTAL ---
+    def al_cambiar(self, cambio):
+        with self.lock:
+            if cambio.accion == "recargar":
+                self.dias.clear(); return
+            if cambio.antes:
+                dia = self.dias.get(fecha_a_iso(cambio.antes[3]))
+                if dia: dia.quitar(cambio.id)
+            if cambio.despues:
+                dia = self.dias.get(fecha_a_iso(cambio.despues[3]))
+                ini, fin = rango_minutos(cambio.despues[4], cambio.despues[5])
+                if dia and ini is not None: dia.agregar(ini, fin, cambio.id, cambio.despues[7])
+
+
+_motor = [None]
+_motor_lock = threading.Lock()
+
+def obtener_disponibilidad(repo):
+    with _motor_lock:
+        if _motor[0] is None:
+            _motor[0] = Disponibilidad(repo)
+        return _motor[0]
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sin Pillow se sirve el original como miniatura
+    Image = None
+
+# --- ALMACÉN DE IMÁGENES ---
+# Las fotos elegidas se copian a la carpeta de la app con su hash como nombre
+# (una foto repetida se guarda una sola vez) y su miniatura se genera una vez,
+# en segundo plano. La lista y el detalle usan la miniatura; el original solo bajo demanda.
+
+DIR_IMAGENES = "imagenes"
+TAM_MINIATURA = 320
+BLOQUE = 1024 * 1024
+
+
+class AlmacenImagenes:
+    def __init__(self, raiz=DIR_IMAGENES):
+        self.raiz = raiz
+        self.dir_miniaturas = os.path.join(raiz, "miniaturas")
+        os.makedirs(self.dir_miniaturas, exist_ok=True)
+        self.trabajador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="miniaturas")
+        self.pendientes = {}
+        self.lock = threading.Lock()
+
+    def es_propia(self, ruta):
+        return bool(ruta) and os.path.dirname(os.path.abspath(ruta)) == os.path.abspath(self.raiz)
+
+    def guardar(self, ruta_origen):
+        # Devuelve la ruta dentro del almacén; si ya estaba, no se vuelve a copiar
+        h = hashlib.sha256()
+        with open(ruta_origen, "rb") as f:
+            for bloque in iter(lambda: f.read(BLOQUE), b""):
+                h.update(bloque)
+        ext = os.path.splitext(ruta_origen)[1].lower() or ".jpg"
+        destino = os.path.join(self.raiz, h.hexdigest() + ext)
+        if not os.path.exists(destino):
+            temporal = destino + ".tmp"
+            shutil.copyfile(ruta_origen, temporal)
+            os.replace(temporal, destino)
+        self.preparar_miniatura(destino)
+        return destino
+
+    def _ruta_miniatura(self, ruta):
+        nombre = os.path.splitext(os.path.basename(ruta))[0] + ".jpg"
+        return os.path.join(self.dir_miniaturas, nombre)
+
+    def miniatura(self, ruta):
+        # Ruta de la miniatura si ya existe; si no, se encarga y de momento devuelve None
+        if not self.es_propia(ruta): return None
+        if Image is None: return ruta if os.path.exists(ruta) else None
+        destino = self._ruta_miniatura(ruta)
+        if os.path.exists(destino): return destino
+        self.preparar_miniatura(ruta)
+        return None
+
+    def preparar_miniatura(self, ruta):
+        if Image is None or os.path.exists(self._ruta_miniatura(ruta)): return None
+        with self.lock:
+            futuro = self.pendientes.get(ruta)
+            if futuro is None:
+                futuro = self.pendientes[ruta] = self.trabajador.submit(self._generar, ruta)
+        return futuro
+
+    def _generar(self, ruta):
+        destino = self._ruta_miniatura(ruta)
+        try:
+            with Image.open(ruta) as img:
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((TAM_MINIATURA, TAM_MINIATURA))
+                temporal = destino + ".tmp"
+                img.convert("RGB").save(temporal, "JPEG", quality=80)
+                os.replace(temporal, destino)
+            return destino
+        except Exception:
+            return None
+        finally:
+            with self.lock:
+                self.pendientes.pop(ruta, None)
+
+
+_almacen = [None]
+_almacen_lock = threading.Lock()
+
+def obtener_almacen(raiz=DIR_IMAGENES):
+    with _almacen_lock:
+        if _almacen[0] is None:
+            _almacen[0] = AlmacenImagenes(raiz)
+        return _almacen[0]
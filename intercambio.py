@@ -0,0 +1,263 @@
+import argparse
+import csv
+import datetime
+import itertools
+import re
+import sys
+
+from repositorio import obtener_repositorio, costo_a_centavos, RUTA_BD
+from recurrencia import Recurrencias
+from tiempo import iso_a_fecha, rango_minutos, minutos_a_hora
+
+# --- IMPORTAR / EXPORTAR (CSV e iCalendar) ---
+# Todo va en streaming: la importación lee por lotes, detecta choques por día en bloque
+# (dentro del lote y contra lo ya guardado) e inserta cada lote con executemany en una
+# sola transacción (Repositorio.insertar_lote). La exportación recorre la tabla con
+# fetchmany directo al archivo.
+#
+#   python intercambio.py importar citas_viejas.csv
+#   python intercambio.py exportar respaldo.ics
+
+LOTE = 50_000
+CAMPOS = ["id", "cliente", "costo", "fecha", "hora_inicio", "hora_fin", "imagen"]
+
+# La exportación (respaldo) incluye lo archivado
+SQL_EXPORTAR = """SELECT id, cliente, costo, fecha, hora_inicio, hora_fin, imagen, dia, min_ini, min_fin FROM citas
+                  UNION ALL
+                  SELECT id, cliente, costo, fecha, hora_inicio, hora_fin, imagen, dia, min_ini, min_fin FROM archivo.citas
+                  ORDER BY dia, min_ini"""
+SQL_TEMP = "CREATE TEMP TABLE IF NOT EXISTS _importacion (n INTEGER PRIMARY KEY, dia TEXT, min_ini INTEGER, min_fin INTEGER)"
+SQL_CHOQUES_LOTE = """SELECT i.n FROM _importacion i WHERE EXISTS (
+                          SELECT 1 FROM citas c WHERE c.dia = i.dia AND c.min_ini < i.min_fin AND c.min_fin > i.min_ini)"""
+# Si el lote llega a días ya archivados, también contra archivo.citas (si no, reimportar un respaldo las duplicaría)
+SQL_CHOQUES_LOTE_AMBAS = SQL_CHOQUES_LOTE + """ OR EXISTS (
+                          SELECT 1 FROM archivo.citas c WHERE c.dia = i.dia AND c.min_ini < i.min_fin AND c.min_fin > i.min_ini)"""
+
+
+# --- IMPORTAR ---
+def _fecha_iso(fecha):
+    # 'dd/mm/yyyy' o 'yyyy-mm-dd' a ISO, validada contra el calendario: None para 31/02/2025,
+    # 05-03-2025 o 2025.03.05 (antes se guardaban tal cual o cortaban la importación a medias)
+    try:
+        d, m, a = fecha.split("/") if "/" in fecha else reversed(fecha.split("-"))
+        if len(a.strip()) != 4: return None
+        return datetime.date(int(a), int(m), int(d)).isoformat()
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _normalizar(cliente, costo, fecha, ini, fin, imagen=""):
+    # Acepta fecha 'dd/mm/yyyy' o ISO; devuelve la fila lista para insertar_lote o None
+    iso = _fecha_iso(fecha)
+    m_ini, m_fin = rango_minutos(ini, fin)
+    if not iso or m_ini is None: return None
+    return (cliente, costo or "", iso_a_fecha(iso), minutos_a_hora(m_ini), minutos_a_hora(m_fin),
+            imagen or "", iso, m_ini, m_fin, costo_a_centavos(costo))
+
+
+def importar_filas(repo, filas, lote=LOTE, choques="omitir", rechazos=None):
+    # filas: iterable de (cliente, costo, fecha, hora_inicio, hora_fin, imagen).
+    # choques='omitir' descarta las que pisan otra cita; 'permitir' las guarda igual.
+    resultado = {"importadas": 0, "choques": 0, "invalidas": 0}
+    numeradas = enumerate(filas, start=1)
+    with repo.lock:
+        repo.conn.execute(SQL_TEMP)
+    while True:
+        bloque = list(itertools.islice(numeradas, lote))
+        if not bloque: break
+        validas = []
+        for n, fila in bloque:
+            norm = _normalizar(*fila) if len(fila) >= 5 else None
+            if norm is None:
+                resultado["invalidas"] += 1
+                if rechazos: rechazos.writerow(["invalida", n, *fila])
+            else:
+                validas.append((n, norm))
+
+        with repo.transaccion() as conn:
+            if choques == "omitir":
+                validas = _sin_choques(repo, conn, validas, resultado, rechazos)
+            repo.insertar_lote(norm for _, norm in validas)
+        resultado["importadas"] += len(validas)
+    repo.notificar_recarga()
+    return resultado
+
+
+def _sin_choques(repo, conn, validas, resultado, rechazos):
+    # 1) Dentro del lote: barrido por día en orden de inicio
+    aceptadas = []
+    dia_actual, fin_max = None, -1
+    for n, norm in sorted(validas, key=lambda v: (v[1][6], v[1][7])):
+        if norm[6] != dia_actual: dia_actual, fin_max = norm[6], -1
+        if norm[7] < fin_max:
+            resultado["choques"] += 1
+            if rechazos: rechazos.writerow(["choque", n, *norm[:6]])
+            continue
+        fin_max = max(fin_max, norm[8])
+        aceptadas.append((n, norm))
+    # 2) Contra lo ya guardado: una sola consulta con el índice (dia, min_ini)
+    conn.executemany("INSERT INTO _importacion VALUES (?, ?, ?, ?)", ((n, v[6], v[7], v[8]) for n, v in aceptadas))
+    archivadas = aceptadas and repo._toca_archivo(min(v[6] for _, v in aceptadas))
+    chocan = {f[0] for f in conn.execute(SQL_CHOQUES_LOTE_AMBAS if archivadas else SQL_CHOQUES_LOTE)}
+    conn.execute("DELETE FROM _importacion")
+    # 3) Contra las series: sus ocurrencias no están en la tabla (solo si hay alguna)
+    recurrencias = Recurrencias(repo)
+    if recurrencias.reglas():
+        chocan |= {n for n, v in aceptadas if n not in chocan and recurrencias.choca(v[2], v[3], v[4])}
+    if chocan:
+        resultado["choques"] += len(chocan)
+        if rechazos:
+            for n, v in aceptadas:
+                if n in chocan: rechazos.writerow(["choque", n, *v[:6]])
+        aceptadas = [a for a in aceptadas if a[0] not in chocan]
+    return aceptadas
+
+
+def leer_csv(archivo):
+    # Encabezados como los de exportar_csv; 'id' y columnas extra se ignoran
+    for fila in csv.DictReader(archivo):
+        yield tuple(fila.get(c) or "" for c in CAMPOS[1:])
+
+
+def _lineas_ics(archivo):
+    # Junta las líneas plegadas (RFC 5545: la continuación empieza con espacio o tab)
+    previa = None
+    for linea in archivo:
+        linea = linea.rstrip("\r\n")
+        if linea[:1] in (" ", "\t") and previa is not None:
+            previa += linea[1:]
+            continue
+        if previa is not None: yield previa
+        previa = linea
+    if previa is not None: yield previa
+
+
+def _desescapar(texto):
+    # En una sola pasada: con replace en cadena, un '\\n' del archivo (barra + n literales) salía como salto de línea
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), texto)
+
+
+def _fecha_hora_ics(valor):
+    # '20250305T100000' (local) o '...Z' (UTC, se pasa a hora local). Los eventos de día completo se descartan
+    if "T" not in valor: return None
+    utc = valor.endswith("Z")
+    dt = datetime.datetime.strptime(valor.rstrip("Z")[:15], "%Y%m%dT%H%M%S")
+    if utc: dt = dt.replace(tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None)
+    return dt
+
+
+def leer_ics(archivo):
+    evento = None
+    for linea in _lineas_ics(archivo):
+        if linea == "BEGIN:VEVENT":
+            evento = {}
+        elif linea == "END:VEVENT" and evento is not None:
+            ini, fin = evento.get("DTSTART"), evento.get("DTEND")
+            if ini and fin:
+                yield (evento.get("SUMMARY", ""), evento.get("X-AGENDA-COSTO", ""), ini.strftime("%d/%m/%Y"),
+                       ini.strftime("%I:%M %p"), fin.strftime("%I:%M %p"), "")
+            else:
+                yield ()  # Se cuenta como inválida
+            evento = None
+        elif evento is not None and ":" in linea:
+            nombre, valor = linea.split(":", 1)
+            nombre = nombre.split(";", 1)[0].upper()
+            if nombre in ("DTSTART", "DTEND"):
+                try: evento[nombre] = _fecha_hora_ics(valor)
+                except ValueError: evento[nombre] = None
+            else:
+                evento[nombre] = _desescapar(valor)
+
+
+def importar(repo, ruta, lote=LOTE, choques="omitir", ruta_rechazos=None):
+    lector = leer_ics if ruta.lower().endswith(".ics") else leer_csv
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        if ruta_rechazos:
+            with open(ruta_rechazos, "w", newline="", encoding="utf-8") as f:
+                return importar_filas(repo, lector(archivo), lote, choques, csv.writer(f))
+        return importar_filas(repo, lector(archivo), lote, choques)
+
+
+# --- EXPORTAR ---
+def _filas(repo, tam=5_000):
+    conn = repo.conexion_lectura()
+    try:
+        cur = conn.execute(SQL_EXPORTAR)
+        while True:
+            filas = cur.fetchmany(tam)
+            if not filas: break
+            yield from filas
+    finally:
+        conn.close()
+
+
+def exportar_csv(repo, ruta):
+    n = 0
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(CAMPOS)
+        for fila in _filas(repo):
+            escritor.writerow(fila[:7]); n += 1
+    return n
+
+
+def _escapar(texto):
+    return str(texto).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _plegar(linea):
+    # Líneas de máximo 75 octetos; la continuación empieza con un espacio
+    datos = linea.encode("utf-8")
+    if len(datos) <= 75: return linea + "\r\n"
+    partes, actual = [], b""
+    for ch in linea:
+        b = ch.encode("utf-8")
+        if len(actual) + len(b) > (75 if not partes else 74):
+            partes.append(actual.decode("utf-8")); actual = b""
+        actual += b
+    partes.append(actual.decode("utf-8"))
+    return "\r\n ".join(partes) + "\r\n"
+
+
+def exportar_ics(repo, ruta):
+    n = 0
+    sello = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        f.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Agenda Liz//ES\r\n")
+        for id_cita, cliente, costo, fecha, ini, fin, imagen, dia, m_ini, m_fin in _filas(repo):
+            if dia is None or m_ini is None: continue
+            base = datetime.datetime.fromisoformat(dia)
+            dt_ini = base + datetime.timedelta(minutes=m_ini)
+            dt_fin = base + datetime.timedelta(minutes=m_fin)
+            f.write("BEGIN:VEVENT\r\n")
+            f.write(f"UID:cita-{id_cita}@agenda-liz\r\nDTSTAMP:{sello}\r\n")
+            f.write(f"DTSTART:{dt_ini:%Y%m%dT%H%M%S}\r\nDTEND:{dt_fin:%Y%m%dT%H%M%S}\r\n")
+            f.write(_plegar(f"SUMMARY:{_escapar(cliente)}"))
+            if costo: f.write(_plegar(f"X-AGENDA-COSTO:{_escapar(costo)}"))
+            f.write("END:VEVENT\r\n")
+            n += 1
+        f.write("END:VCALENDAR\r\n")
+    return n
+
+
+def principal(argv=None):
+    parser = argparse.ArgumentParser(description="Importar / exportar citas (CSV o .ics)")
+    parser.add_argument("accion", choices=["importar", "exportar"])
+    parser.add_argument("archivo")
+    parser.add_argument("--bd", default=RUTA_BD)
+    parser.add_argument("--lote", type=int, default=LOTE)
+    parser.add_argument("--permitir-choques", action="store_true", help="Importa también las citas que se pisan")
+    parser.add_argument("--rechazos", help="CSV donde anotar las filas no importadas")
+    args = parser.parse_args(argv)
+
+    repo = obtener_repositorio(args.bd)
+    if args.accion == "importar":
+        r = importar(repo, args.archivo, args.lote, "permitir" if args.permitir_choques else "omitir", args.rechazos)
+        print(f"Importadas: {r['importadas']}  Choques: {r['choques']}  Inválidas: {r['invalidas']}")
+    else:
+        exportar = exportar_ics if args.archivo.lower().endswith(".ics") else exportar_csv
+        print(f"Exportadas: {exportar(repo, args.archivo)}")
+
+
+if __name__ == "__main__":
+    sys.exit(principal())
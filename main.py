@@ -1,699 +1,1356 @@
-import flet as ft
-import sqlite3
-import datetime
-import calendar
-import os
-
-# --- CONFIGURACIÓN DE COLORES ---
-TEMAS = {
-    "oscuro": {
-        "fondo": "#121212", "superficie": "#1E1E1E", "acento": "#D4AF37", 
-        "texto": "#FFFFFF", "texto_sec": "#AAAAAA", "borde": "#333333", 
-        "icono": "light_mode", "modo": ft.ThemeMode.DARK,
-        "rojo": "#c62828", "verde": "#2e7d32", "amarillo": "#fbc02d",
-        "celda_cal": "#2C2C2C"
-    },
-    "claro": {
-        "fondo": "#F5F5F5", "superficie": "#FFFFFF", "acento": "#607D8B", 
-        "texto": "#212121", "texto_sec": "#757575", "borde": "#E0E0E0", 
-        "icono": "dark_mode", "modo": ft.ThemeMode.LIGHT,
-        "rojo": "#ff5252", "verde": "#4caf50", "amarillo": "#ffeb3b",
-        "celda_cal": "#FFFFFF"
-    }
-}
-
-estado_tema = {"actual": "oscuro"}
-
-def main(page: ft.Page):
-    # --- 1. CONFIGURACIÓN PÁGINA ---
-    page.title = "Agenda Liz"
-    page.window_width = 450
-    page.window_height = 800
-    page.padding = 0 
-    
-# --- 2. BASE DE DATOS (MODIFICADA PARA ANDROID) ---
-    def inicializar_bd():
-        # Definir ruta de la BD según el dispositivo
-        nombre_bd = "citas.db"
-        
-        try:
-            # Intentamos obtener la ruta de documentos (Android/iOS)
-            path = page.client_storage.get("path_documents") # Flet a veces guarda esto
-            if not path:
-                # Si falla o estamos en PC, usamos ruta local
-                db_path = nombre_bd
-            else:
-                db_path = os.path.join(path, nombre_bd)
-        except:
-            # Fallback seguro para PC
-            db_path = nombre_bd
-
-        # NOTA: Para Flet en Android, usamos una ruta absoluta segura
-        # Sin embargo, la forma más robusta en Flet puro sin plugins externos 
-        # es confiar en que sqlite3 creará el archivo en el 'app_doc_dir' 
-        # que Flet asigna automáticamente al compilar.
-        
-        # Simplemente usaremos el nombre directo, pero nos aseguramos 
-        # que la compilación maneje los permisos.
-        
-        conn = sqlite3.connect(nombre_bd) 
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS citas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente TEXT, costo TEXT, fecha TEXT, 
-                hora_inicio TEXT, hora_fin TEXT, imagen TEXT
-            )
-        """)
-        conn.commit()
-        conn.close()
-    inicializar_bd()
-
-    # --- 3. VARIABLES DE ESTADO ---
-    id_en_edicion = [None] 
-    fecha_elegida = [datetime.datetime.now().strftime('%d/%m/%Y')]
-    hora_inicio = [None]
-    hora_fin = [None]
-    ruta_imagen = [None]
-    filtro_fecha = [None]
-    
-    # ESTADO DE LOS SERVICIOS (Chips)
-    sel_diseno = [False]
-    sel_pedi = [False]
-    sel_cejas = [False]
-    
-    hoy = datetime.datetime.now()
-    cal_estado = {"mes": hoy.month, "anio": hoy.year}
-    cal_grande_estado = {"mes": hoy.month, "anio": hoy.year}
-
-    # --- 4. CONTROLES UI ---
-    
-    # LOGO (Busca 'logo.png' en la carpeta assets)
-    # Nota: Si falla la carga, muestra un icono por defecto para no romper la app
-    logo_img = ft.Image(src="logo.png", width=50, height=50, fit=ft.ImageFit.CONTAIN, error_content=ft.Icon(name="broken_image"))
-
-    titulo_app = ft.Text("L I Z   M A N I C U R I S T A", weight="bold", size=20)
-    btn_tema = ft.IconButton(icon="light_mode", tooltip="Cambiar Tema")
-
-    # Formulario Inputs
-    txt_cliente = ft.TextField(label="Cliente", prefix_icon="person", border_radius=10, content_padding=15)
-    txt_costo = ft.TextField(label="Costo", prefix_icon="attach_money", keyboard_type=ft.KeyboardType.NUMBER, border_radius=10, content_padding=15)
-    
-    # --- CHIPS DE SERVICIOS ---
-    ref_chip_diseno = ft.Ref[ft.Container]()
-    ref_chip_pedi = ft.Ref[ft.Container]()
-    ref_chip_cejas = ft.Ref[ft.Container]()
-
-    # Función auxiliar para crear la estructura del chip
-    def crear_chip(ref, texto, estado_var):
-         return ft.Container(
-            ref=ref,
-            content=ft.Text(texto, size=12, weight="bold", text_align="center"),
-            padding=ft.padding.symmetric(horizontal=15, vertical=10),
-            border_radius=20,
-            animate=ft.Animation(200, ft.AnimationCurve.EASE_IN_OUT),
-            on_click=lambda _: toggle_servicio(estado_var),
-        )
-
-    chip_diseno = crear_chip(ref_chip_diseno, "Diseño Dificil", sel_diseno)
-    chip_pedi = crear_chip(ref_chip_pedi, "PediSpa", sel_pedi)
-    chip_cejas = crear_chip(ref_chip_cejas, "Cejas", sel_cejas)
-
-    # Resto del formulario
-    txt_hora_display = ft.Text("Selecciona hora...", size=14)
-    lbl_imagen = ft.Text("Sin diseño", size=12)
-    icono_img = ft.Icon(name="image")
-    
-    # Lista y Calendarios
-    txt_titulo_lista = ft.Text("CITAS AGENDADAS", size=12, weight="bold")
-    btn_ver_todas = ft.TextButton("Ver Todas", icon="list", visible=False, height=30)
-    grid_citas = ft.GridView(expand=1, runs_count=5, max_extent=180, child_aspect_ratio=0.85, spacing=10, run_spacing=10, padding=15)
-    txt_mes_anio_grande = ft.Text(size=18, weight="bold", text_align="center")
-    grid_cal_grande = ft.GridView(expand=1, runs_count=7, spacing=2, run_spacing=2, padding=5, child_aspect_ratio=0.6) 
-    cont_dias_cal = ft.GridView(runs_count=7, spacing=2, run_spacing=2, padding=10)
-    txt_mes_anio = ft.Text(size=16, weight="bold", text_align="center")
-
-    # --- 5. LÓGICA PRINCIPAL ---
-    
-    def obtener_tema():
-        return TEMAS[estado_tema["actual"]]
-
-    def mostrar_alerta(titulo, msg, es_error=False):
-        c = obtener_tema()
-        icon = "error" if es_error else "check_circle"
-        color = "red" if es_error else c["acento"]
-        dlg = ft.AlertDialog(
-            bgcolor=c["fondo"],
-            title=ft.Row([ft.Icon(icon, color=color), ft.Text(titulo, color=c["texto"])]),
-            content=ft.Text(msg, color=c["texto_sec"]),
-            actions=[ft.TextButton("OK", on_click=lambda e: page.close(dlg))]
-        )
-        page.open(dlg)
-
-    def limpiar_formulario():
-        c = obtener_tema()
-        txt_cliente.value = ""
-        txt_costo.value = ""
-        sel_diseno[0] = False; sel_pedi[0] = False; sel_cejas[0] = False
-        
-        txt_hora_display.value = "Selecciona hora..."
-        txt_hora_display.color = c["texto_sec"]
-        lbl_imagen.value = "Sin diseño"
-        lbl_imagen.color = c["texto_sec"]
-        icono_img.color = c["acento"]
-        id_en_edicion[0] = None
-        ruta_imagen[0] = None
-        hora_inicio[0] = None
-        btn_guardar.text = "AGENDAR"
-        btn_guardar.icon = "check"
-        btn_cancelar.visible = False
-        btn_sugerencia.visible = False 
-        page.update()
-        actualizar_estilos() 
-        actualizar_sugerencia()
-
-    def refrescar_todo():
-        cargar_citas_en_grid()
-        construir_cal_grande()
-        actualizar_sugerencia()
-
-    def verificar_choque(fecha, ini, fin, id_actual=None):
-        fmt = "%I:%M %p"
-        try:
-            n_ini = datetime.datetime.strptime(ini, fmt)
-            n_fin = datetime.datetime.strptime(fin, fmt)
-            conn = sqlite3.connect("citas.db")
-            cur = conn.cursor()
-            cur.execute("SELECT id, hora_inicio, hora_fin FROM citas WHERE fecha=?", (fecha,))
-            for cita in cur.fetchall():
-                if id_actual is not None and cita[0] == id_actual: continue
-                c_ini = datetime.datetime.strptime(cita[1], fmt)
-                c_fin = datetime.datetime.strptime(cita[2], fmt)
-                if n_ini < c_fin and n_fin > c_ini: return True
-            return False
-        except: return False
-
-    # --- LÓGICA DE TIEMPO Y SERVICIOS ---
-    
-    def recalcular_finalizacion():
-        if not hora_inicio[0]: return
-        fmt = "%I:%M %p"
-        try:
-            dt_ini = datetime.datetime.strptime(hora_inicio[0], fmt)
-            ahora = datetime.datetime.now()
-            dt_ini = dt_ini.replace(year=ahora.year, month=ahora.month, day=ahora.day)
-            
-            duracion = 90
-            if sel_diseno[0]: duracion += 60
-            if sel_pedi[0]: duracion += 45
-            if sel_cejas[0]: duracion += 60
-            
-            dt_fin = dt_ini + datetime.timedelta(minutes=duracion)
-            hora_fin[0] = dt_fin.strftime(fmt)
-            
-            c = obtener_tema()
-            txt_hora_display.value = f"{hora_inicio[0]} - {hora_fin[0]}"
-            txt_hora_display.color = c["acento"]
-            txt_hora_display.update()
-        except: pass
-
-    def toggle_servicio(estado_var):
-        # 1. Cambiar estado
-        estado_var[0] = not estado_var[0]
-        
-        # 2. Actualizar visualmente INMEDIATAMENTE
-        actualizar_estilos() 
-        page.update() # Forzar pintado antes de calcular
-        
-        # 3. Lógica de tiempo
-        if hora_inicio[0]:
-            recalcular_finalizacion()
-        else:
-            actualizar_sugerencia()
-
-    def buscar_hueco(fecha):
-        fmt = "%I:%M %p"
-        try:
-            conn = sqlite3.connect("citas.db")
-            cur = conn.cursor()
-            cur.execute("SELECT hora_inicio, hora_fin FROM citas WHERE fecha=?", (fecha,))
-            citas = cur.fetchall()
-            conn.close()
-            
-            duracion = 90
-            if sel_diseno[0]: duracion += 60
-            if sel_pedi[0]: duracion += 45
-            if sel_cejas[0]: duracion += 60
-
-            hora_test = datetime.datetime.strptime("07:00 AM", fmt)
-            fin = datetime.datetime.strptime("10:00 PM", fmt)
-            
-            while hora_test + datetime.timedelta(minutes=duracion) <= fin:
-                p_ini = hora_test
-                p_fin = hora_test + datetime.timedelta(minutes=duracion)
-                choca = False
-                for c_ini, c_fin in citas:
-                    try:
-                        ci = datetime.datetime.strptime(c_ini, fmt)
-                        cf = datetime.datetime.strptime(c_fin, fmt)
-                        if p_ini < cf and p_fin > ci: choca = True; break
-                    except: continue
-                if not choca: return p_ini, p_fin
-                hora_test += datetime.timedelta(minutes=30)
-        except: pass
-        return None, None
-
-    def actualizar_sugerencia():
-        if hora_inicio[0] is not None: 
-            btn_sugerencia.visible = False
-            btn_sugerencia.update()
-            return
-
-        ini, fin = buscar_hueco(fecha_elegida[0])
-        c = obtener_tema()
-        if ini:
-            s_ini = ini.strftime("%I:%M %p")
-            s_fin = fin.strftime("%I:%M %p")
-            btn_sugerencia.text = f"✨ Recomendado: {s_ini}"
-            btn_sugerencia.data = (s_ini, s_fin)
-            btn_sugerencia.visible = True
-            btn_sugerencia.style = ft.ButtonStyle(side=ft.BorderSide(1, c["acento"]))
-            btn_sugerencia.color = c["acento"]
-        else:
-            btn_sugerencia.visible = False
-        btn_sugerencia.update()
-
-    def aplicar_sugerencia(e):
-        ini, fin = e.control.data
-        c = obtener_tema()
-        hora_inicio[0] = ini
-        hora_fin[0] = fin
-        txt_hora_display.value = f"{ini} - {fin}"
-        txt_hora_display.color = c["acento"]
-        btn_sugerencia.visible = False 
-        page.update()
-
-    # --- CRUD ---
-    def guardar_accion(e):
-        if not txt_cliente.value: mostrar_alerta("Error", "Falta nombre", True); return
-        if not hora_inicio[0]: mostrar_alerta("Error", "Falta hora", True); return
-        if verificar_choque(fecha_elegida[0], hora_inicio[0], hora_fin[0], id_en_edicion[0]):
-            mostrar_alerta("Ocupado", "Horario no disponible", True); return
-
-        try:
-            conn = sqlite3.connect("citas.db")
-            cur = conn.cursor()
-            img = ruta_imagen[0] if ruta_imagen[0] else ""
-            if id_en_edicion[0] is None:
-                cur.execute("INSERT INTO citas (cliente, costo, fecha, hora_inicio, hora_fin, imagen) VALUES (?, ?, ?, ?, ?, ?)",
-                           (txt_cliente.value, txt_costo.value, fecha_elegida[0], hora_inicio[0], hora_fin[0], img))
-                msg = "Agendado"
-            else:
-                cur.execute("UPDATE citas SET cliente=?, costo=?, fecha=?, hora_inicio=?, hora_fin=?, imagen=? WHERE id=?", 
-                           (txt_cliente.value, txt_costo.value, fecha_elegida[0], hora_inicio[0], hora_fin[0], img, id_en_edicion[0]))
-                msg = "Actualizado"
-            conn.commit(); conn.close()
-            
-            limpiar_formulario()
-            filtro_fecha[0] = fecha_elegida[0]
-            refrescar_todo()
-            mostrar_alerta("Éxito", msg, False)
-        except Exception as ex: mostrar_alerta("Error", str(ex), True)
-
-    def eliminar_accion(e):
-        conn = sqlite3.connect("citas.db")
-        cur = conn.cursor()
-        cur.execute("DELETE FROM citas WHERE id=?", (e.control.data,))
-        conn.commit(); conn.close()
-        refrescar_todo()
-        mostrar_alerta("Listo", "Cita eliminada", False)
-
-    def editar_accion(e):
-        datos = e.control.data
-        c = obtener_tema()
-        id_en_edicion[0] = datos[0]
-        txt_cliente.value = datos[1]
-        txt_costo.value = datos[2]
-        fecha_elegida[0] = datos[3]
-        btn_fecha.text = datos[3]
-        hora_inicio[0] = datos[4]; hora_fin[0] = datos[5]
-        txt_hora_display.value = f"{datos[4]} - {datos[5]}"
-        txt_hora_display.color = c["acento"]
-        ruta_imagen[0] = datos[6]
-        if datos[6]: lbl_imagen.value = "Diseño OK"; lbl_imagen.color = c["acento"]
-        
-        sel_diseno[0] = False; sel_pedi[0] = False; sel_cejas[0] = False
-        
-        btn_guardar.text = "ACTUALIZAR"; btn_guardar.icon = "update"
-        btn_cancelar.visible = True
-        btn_sugerencia.visible = False
-        tabs_control.selected_index = 0
-        tabs_control.update()
-        page.update()
-        actualizar_estilos()
-
-    def ver_detalle(e):
-        datos = e.control.data
-        c = obtener_tema()
-        img_w = ft.Icon("image_not_supported", size=50, color=c["texto_sec"])
-        if datos[6] and os.path.exists(datos[6]):
-            img_w = ft.Image(src=datos[6], width=300, height=300, fit=ft.ImageFit.CONTAIN)
-        dlg = ft.AlertDialog(
-            bgcolor=c["superficie"],
-            title=ft.Text(datos[1], color=c["texto"], weight="bold", text_align="center"),
-            content=ft.Column([
-                ft.Container(img_w, alignment=ft.alignment.center),
-                ft.Text(f"📅 {datos[3]}", color=c["texto_sec"]),
-                ft.Text(f"⏰ {datos[4]} - {datos[5]}", color=c["texto_sec"]),
-                ft.Text(f"💰 ${datos[2]}", color=c["acento"], weight="bold", size=20)
-            ], height=350, width=300, scroll=ft.ScrollMode.AUTO),
-            actions=[ft.TextButton("Cerrar", on_click=lambda e: page.close(dlg))]
-        )
-        page.open(dlg)
-
-    def cargar_citas_en_grid():
-        grid_citas.controls.clear()
-        c = obtener_tema()
-        conn = sqlite3.connect("citas.db")
-        cur = conn.cursor()
-        if filtro_fecha[0]:
-            cur.execute("SELECT * FROM citas WHERE fecha=? ORDER BY id DESC", (filtro_fecha[0],))
-            txt_titulo_lista.value = f"CITAS DEL {filtro_fecha[0]}"
-            btn_ver_todas.visible = True
-        else:
-            cur.execute("SELECT * FROM citas ORDER BY id DESC")
-            txt_titulo_lista.value = "TODAS LAS CITAS"
-            btn_ver_todas.visible = False
-        datos = cur.fetchall()
-        if not datos and filtro_fecha[0]:
-             grid_citas.controls.append(ft.Text("Sin citas este día", color=c["texto_sec"], italic=True))
-        for fila in datos:
-            tarjeta = ft.Container(
-                bgcolor=c["superficie"], padding=12, border_radius=10,
-                border=ft.border.all(1, c["borde"]),
-                content=ft.Column([
-                    ft.Container(
-                        data=fila, on_click=ver_detalle,
-                        content=ft.Column([
-                            ft.Text(fila[1], weight="bold", color=c["texto"]),
-                            ft.Text(f"📅 {fila[3]}", size=11, color=c["texto_sec"]),
-                            ft.Text(f"⏰ {fila[4]} - {fila[5]}", size=11, color=c["acento"])
-                        ])
-                    ),
-                    ft.Divider(height=5, color=c["borde"]),
-                    ft.Row([
-                        ft.IconButton("edit", icon_color=c["texto_sec"], icon_size=18, data=fila, on_click=editar_accion),
-                        ft.IconButton("delete", icon_color="red", icon_size=18, data=fila[0], on_click=eliminar_accion)
-                    ], alignment="spaceBetween")
-                ])
-            )
-            grid_citas.controls.append(tarjeta)
-        conn.close()
-        txt_titulo_lista.color = c["texto_sec"]
-        btn_ver_todas.style = ft.ButtonStyle(color=c["acento"])
-        grid_citas.update()
-
-    def resetear_filtro(e):
-        filtro_fecha[0] = None
-        cargar_citas_en_grid()
-        page.update()
-
-    # --- CALENDARIO GRANDE ---
-    def construir_cal_grande():
-        c = obtener_tema()
-        grid_cal_grande.controls.clear()
-        citas_mes = {}
-        try:
-            conn = sqlite3.connect("citas.db")
-            cur = conn.cursor()
-            patron = f"%/{cal_grande_estado['mes']:02d}/{cal_grande_estado['anio']}"
-            cur.execute("SELECT fecha, cliente FROM citas WHERE fecha LIKE ?", (patron,))
-            for f, nombre in cur.fetchall():
-                if f not in citas_mes: citas_mes[f] = []
-                citas_mes[f].append(nombre)
-            conn.close()
-        except: pass
-
-        for d in ["L", "M", "M", "J", "V", "S", "D"]:
-            grid_cal_grande.controls.append(ft.Container(content=ft.Text(d, color=c["acento"], weight="bold"), alignment=ft.alignment.center))
-
-        cal = calendar.monthcalendar(cal_grande_estado['anio'], cal_grande_estado['mes'])
-        for semana in cal:
-            for dia in semana:
-                if dia == 0:
-                    grid_cal_grande.controls.append(ft.Container())
-                else:
-                    fecha_str = f"{dia:02d}/{cal_grande_estado['mes']:02d}/{cal_grande_estado['anio']}"
-                    lista_nombres = citas_mes.get(fecha_str, [])
-                    contenido_celda = ft.Column(spacing=2)
-                    contenido_celda.controls.append(ft.Container(content=ft.Text(str(dia), weight="bold", color=c["texto"]), alignment=ft.alignment.center))
-                    for nombre in lista_nombres:
-                        nombre_corto = (nombre[:8] + '..') if len(nombre) > 8 else nombre
-                        etiqueta = ft.Container(content=ft.Text(nombre_corto, size=10, color="black", no_wrap=True), bgcolor=c["acento"], border_radius=3, padding=2, alignment=ft.alignment.center)
-                        contenido_celda.controls.append(etiqueta)
-                    borde_celda = ft.border.all(1, c["borde"])
-                    if fecha_str == datetime.datetime.now().strftime('%d/%m/%Y'):
-                        borde_celda = ft.border.all(2, c["acento"])
-                    celda = ft.Container(content=contenido_celda, bgcolor=c["celda_cal"], border=borde_celda, border_radius=5, padding=2, on_click=lambda e, f=fecha_str: ir_a_agenda_dia(f))
-                    grid_cal_grande.controls.append(celda)
-        
-        nombres_mes = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
-        txt_mes_anio_grande.value = f"{nombres_mes[cal_grande_estado['mes']]} {cal_grande_estado['anio']}"
-        txt_mes_anio_grande.color = c["texto"]
-        grid_cal_grande.update(); txt_mes_anio_grande.update()
-
-    def mover_cal_grande(delta):
-        cal_grande_estado['mes'] += delta
-        if cal_grande_estado['mes'] > 12: cal_grande_estado['mes']=1; cal_grande_estado['anio']+=1
-        elif cal_grande_estado['mes'] < 1: cal_grande_estado['mes']=12; cal_grande_estado['anio']-=1
-        construir_cal_grande()
-
-    def ir_a_agenda_dia(fecha):
-        filtro_fecha[0] = fecha
-        cargar_citas_en_grid()
-        tabs_control.selected_index = 0
-        tabs_control.update()
-        page.update()
-
-    # --- CALENDARIO PEQUEÑO ---
-    def construir_cal_peque():
-        c = obtener_tema()
-        cont_dias_cal.controls.clear()
-        conteos = {}
-        try:
-            conn = sqlite3.connect("citas.db")
-            cur = conn.cursor()
-            patron = f"%/{cal_estado['mes']:02d}/{cal_estado['anio']}"
-            cur.execute("SELECT fecha, COUNT(*) FROM citas WHERE fecha LIKE ? GROUP BY fecha", (patron,))
-            conteos = {f[0]: f[1] for f in cur.fetchall()}
-            conn.close()
-        except: pass
-
-        for d in ["L","M","M","J","V","S","D"]:
-            cont_dias_cal.controls.append(ft.Container(content=ft.Text(d, color=c["texto_sec"], size=12, weight="bold"), alignment=ft.alignment.center))
-        
-        cal = calendar.monthcalendar(cal_estado['anio'], cal_estado['mes'])
-        for sem in cal:
-            for dia in sem:
-                if dia == 0:
-                    cont_dias_cal.controls.append(ft.Container())
-                else:
-                    f_str = f"{dia:02d}/{cal_estado['mes']:02d}/{cal_estado['anio']}"
-                    cant = conteos.get(f_str, 0)
-                    bg, tc = c["superficie"], c["texto"]
-                    if cant >= 6: bg, tc = c["rojo"], "white"
-                    elif cant >= 4: bg, tc = c["amarillo"], "black"
-                    elif cant >= 1: bg, tc = c["verde"], "white"
-                    bord = ft.border.all(2, c["acento"]) if f_str == fecha_elegida[0] else None
-                    contenido_celda = ft.Column([ft.Text(str(dia), color=tc, weight="bold")], alignment="center", spacing=0)
-                    if cant > 0: contenido_celda.controls.append(ft.Text(f"{cant} citas", color=tc, size=8))
-                    cont_dias_cal.controls.append(ft.Container(content=contenido_celda, bgcolor=bg, border_radius=10, alignment=ft.alignment.center, height=45, width=45, border=bord, on_click=lambda e, f=f_str: seleccionar_fecha(f)))
-        
-        nom = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
-        txt_mes_anio.value = f"{nom[cal_estado['mes']]} {cal_estado['anio']}"
-        txt_mes_anio.color = c["acento"]
-    
-    def mover_cal_peque(delta):
-        cal_estado['mes'] += delta
-        if cal_estado['mes'] > 12: cal_estado['mes']=1; cal_estado['anio']+=1
-        elif cal_estado['mes'] < 1: cal_estado['mes']=12; cal_estado['anio']-=1
-        construir_cal_peque()
-        page.dialog.update()
-
-    def seleccionar_fecha(f):
-        fecha_elegida[0] = f
-        btn_fecha.text = f
-        filtro_fecha[0] = f
-        cargar_citas_en_grid()
-        page.dialog.open = False
-        actualizar_sugerencia()
-        page.update()
-
-    def abrir_cal_peque(e):
-        c = obtener_tema()
-        construir_cal_peque()
-        dlg = ft.AlertDialog(
-            bgcolor=c["fondo"], content_padding=10,
-            title=ft.Row([
-                ft.IconButton("arrow_back_ios", icon_color=c["acento"], icon_size=15, on_click=lambda _: mover_cal_peque(-1)),
-                txt_mes_anio,
-                ft.IconButton("arrow_forward_ios", icon_color=c["acento"], icon_size=15, on_click=lambda _: mover_cal_peque(1))
-            ], alignment="spaceBetween"),
-            content=ft.Container(width=320, height=350, content=cont_dias_cal)
-        )
-        page.dialog = dlg
-        page.open(dlg)
-
-    # --- TIEMPO ---
-    def calcular_horas(hora_obj):
-        ahora = datetime.datetime.now()
-        dt_inicio = datetime.datetime.combine(ahora.date(), hora_obj)
-        
-        duracion = 90
-        if sel_diseno[0]: duracion += 60
-        if sel_pedi[0]: duracion += 45
-        if sel_cejas[0]: duracion += 60
-        
-        dt_fin = dt_inicio + datetime.timedelta(minutes=duracion)
-        return dt_inicio.strftime("%I:%M %p"), dt_fin.strftime("%I:%M %p")
-
-    def al_cambiar_hora(e):
-        if time_picker.value:
-            c = obtener_tema(); i, f = calcular_horas(time_picker.value)
-            hora_inicio[0] = i; hora_fin[0] = f
-            txt_hora_display.value = f"{i} - {f}"; txt_hora_display.color = c["acento"]
-            page.update()
-            
-    def al_cambiar_opciones(e):
-        if time_picker.value: al_cambiar_hora(None)
-        if hora_inicio[0] is None: actualizar_sugerencia()
-
-    def al_cargar_imagen(e):
-        if e.files:
-            c = obtener_tema(); ruta_imagen[0] = e.files[0].path
-            lbl_imagen.value = "Diseño OK"; lbl_imagen.color = c["acento"]
-            icono_img.color = c["acento"]; page.update()
-
-    # --- BOTONES ---
-    time_picker = ft.TimePicker(on_change=al_cambiar_hora, time_picker_entry_mode="dial")
-    file_picker = ft.FilePicker(on_result=al_cargar_imagen)
-    page.overlay.extend([time_picker, file_picker])
-
-    btn_sugerencia = ft.ElevatedButton(text="Sugerir Hora", icon="auto_awesome", visible=False, on_click=aplicar_sugerencia)
-    btn_fecha = ft.ElevatedButton(text=fecha_elegida[0], icon="calendar_month", height=45, on_click=abrir_cal_peque)
-    btn_hora = ft.ElevatedButton("Hora", icon="access_time", height=45, on_click=lambda _: page.open(time_picker))
-    btn_imagen = ft.Container(content=ft.Row([icono_img, lbl_imagen], alignment="center"), padding=10, border_radius=10, on_click=lambda _: file_picker.pick_files())
-    btn_guardar = ft.ElevatedButton("AGENDAR", icon="check", height=50, on_click=guardar_accion)
-    btn_cancelar = ft.TextButton("Cancelar", visible=False, icon="close", on_click=lambda _: limpiar_formulario())
-    
-    btn_ver_todas.on_click = resetear_filtro
-
-    # --- TABS ---
-    tabs_control = ft.Tabs(
-        selected_index=0, animation_duration=300,
-        tabs=[
-            ft.Tab(
-                text="AGENDAR", icon="edit_calendar",
-                content=ft.Container(
-                    padding=10,
-                    content=ft.Column([
-                        ft.Container(padding=20, content=ft.Column([
-                            txt_cliente, txt_costo,
-                            # Chips en Fila con ajuste automático y centrado
-                            ft.Row([chip_diseno, chip_pedi, chip_cejas], wrap=True, spacing=10, alignment=ft.MainAxisAlignment.CENTER),
-                            
-                            ft.Row([btn_fecha, btn_hora], alignment="spaceBetween"),
-                            ft.Container(txt_hora_display, alignment=ft.alignment.center),
-                            ft.Container(btn_sugerencia, alignment=ft.alignment.center),
-                            ft.Divider(height=5, color="transparent"),
-                            btn_imagen,
-                            ft.Divider(height=10, color="transparent"),
-                            ft.Column([btn_guardar, btn_cancelar], horizontal_alignment="stretch")
-                        ])),
-                        ft.Container(padding=ft.padding.symmetric(horizontal=25), content=ft.Row([txt_titulo_lista, btn_ver_todas], alignment="spaceBetween")),
-                        grid_citas
-                    ], scroll=ft.ScrollMode.AUTO)
-                )
-            ),
-            ft.Tab(
-                text="CALENDARIO", icon="calendar_month",
-                content=ft.Container(
-                    padding=10,
-                    content=ft.Column([
-                        ft.Row([
-                            ft.IconButton("arrow_back_ios", on_click=lambda _: mover_cal_grande(-1)),
-                            txt_mes_anio_grande,
-                            ft.IconButton("arrow_forward_ios", on_click=lambda _: mover_cal_grande(1)),
-                        ], alignment="center"),
-                        grid_cal_grande
-                    ])
-                )
-            ),
-        ], expand=1
-    )
-
-    # --- ESTILOS ---
-    def actualizar_estilos():
-        c = obtener_tema()
-        page.bgcolor = c["fondo"]; page.theme_mode = c["modo"]
-        titulo_app.color = c["acento"]; btn_tema.icon = c["icono"]; btn_tema.icon_color = c["texto"]
-        
-        for t in [txt_cliente, txt_costo]:
-            t.bgcolor = c["superficie"]; t.color = c["texto"]
-            t.cursor_color = c["acento"]; t.focused_border_color = c["acento"]
-            t.label_style = ft.TextStyle(color=c["texto_sec"]); t.prefix_icon_color = c["texto"]
-            t.border_color = "transparent"
-        
-        # Estilos Chips Interactivos
-        chips = [(ref_chip_diseno.current, sel_diseno[0]), (ref_chip_pedi.current, sel_pedi[0]), (ref_chip_cejas.current, sel_cejas[0])]
-        for container, seleccionado in chips:
-            if container:
-                if seleccionado:
-                    container.bgcolor = c["acento"]
-                    container.content.color = "black" if estado_tema["actual"] == "oscuro" else "white"
-                    container.border = None
-                else:
-                    container.bgcolor = "transparent"
-                    container.content.color = c["texto"]
-                    container.border = ft.border.all(1, c["acento"])
-
-        txt_hora_display.color = c["acento"] if hora_inicio[0] else c["texto_sec"]
-        lbl_imagen.color = c["acento"] if ruta_imagen[0] else c["texto_sec"]; icono_img.color = c["acento"]
-        
-        estilo_sec = ft.ButtonStyle(bgcolor=c["superficie"], color=c["acento"], shape=ft.RoundedRectangleBorder(radius=10))
-        btn_fecha.style = estilo_sec; btn_hora.style = estilo_sec; btn_imagen.bgcolor = c["superficie"]
-        btn_sugerencia.style = ft.ButtonStyle(side=ft.BorderSide(1, c["acento"])); btn_sugerencia.color = c["acento"]; btn_sugerencia.bgcolor = c["superficie"]
-        btn_guardar.bgcolor = c["acento"]; btn_guardar.color = "black" if estado_tema["actual"] == "oscuro" else "white"
-        btn_cancelar.style = ft.ButtonStyle(color=c["texto"])
-        
-        tabs_control.label_color = c["acento"]; tabs_control.unselected_label_color = c["texto_sec"]
-        tabs_control.indicator_color = c["acento"]; tabs_control.divider_color = "transparent"
-        page.theme = ft.Theme(color_scheme=ft.ColorScheme(primary=c["acento"], surface=c["superficie"], background=c["fondo"]), use_material3=True)
-
-    def cambiar_tema_accion(e):
-        estado_tema["actual"] = "claro" if estado_tema["actual"] == "oscuro" else "oscuro"
-        actualizar_estilos(); refrescar_todo(); page.update()
-
-    btn_tema.on_click = cambiar_tema_accion
-
-    # --- MONTAJE ---
-    actualizar_estilos()
-    page.add(ft.Column([
-        ft.Container(
-            padding=ft.padding.symmetric(horizontal=20, vertical=10),
-            content=ft.Row([
-                logo_img, 
-                titulo_app, 
-                btn_tema
-            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN, vertical_alignment=ft.CrossAxisAlignment.CENTER)
-        ),
-        tabs_control
-    ], expand=True))
-
-    # Importante: llamar a actualizar_estilos DESPUÉS de añadir a la página para que las referencias funcionen
-    actualizar_estilos()
-    refrescar_todo()
-
-# --- FIX FINAL PARA THREADS ---
-if __name__ == "__main__":
+import flet as ft
+import datetime
+import calendar
+import logging
+import os
+import time
+from repositorio import obtener_repositorio, costo_a_centavos, HorarioOcupado, TAM_PAGINA
+from disponibilidad import obtener_disponibilidad
+from cache_meses import obtener_cache_meses, obtener_cache_dias
+from imagenes import obtener_almacen, DIR_IMAGENES
+from tareas import Tareas
+from render import Render
+from sincronizacion import configurar_desde_entorno
+import archivo
+from servicios import obtener_catalogo
+from recursos import obtener_recursos
+from recordatorios import obtener_recordatorios, inicio_de
+from recurrencia import obtener_recurrencias, es_ocurrencia, partir_id
+import metricas
+from metricas import cronometrar
+from tiempo import rango_minutos, minutos_a_hora
+
+# --- CONFIGURACIÓN DE COLORES ---
+TEMAS = {
+    "oscuro": {
+        "fondo": "#121212", "superficie": "#1E1E1E", "acento": "#D4AF37", 
+        "texto": "#FFFFFF", "texto_sec": "#AAAAAA", "borde": "#333333", 
+        "icono": "light_mode", "modo": ft.ThemeMode.DARK,
+        "rojo": "#c62828", "verde": "#2e7d32", "amarillo": "#fbc02d",
+        "celda_cal": "#2C2C2C"
+    },
+    "claro": {
+        "fondo": "#F5F5F5", "superficie": "#FFFFFF", "acento": "#607D8B", 
+        "texto": "#212121", "texto_sec": "#757575", "borde": "#E0E0E0", 
+        "icono": "dark_mode", "modo": ft.ThemeMode.LIGHT,
+        "rojo": "#ff5252", "verde": "#4caf50", "amarillo": "#ffeb3b",
+        "celda_cal": "#FFFFFF"
+    }
+}
+
+MESES = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+DIAS_SEMANA = ["L", "M", "M", "J", "V", "S", "D"]
+CELDAS_MES = 42  # 6 semanas: el máximo que ocupa un mes en la cuadrícula
+
+log_arranque = logging.getLogger("agenda.arranque")
+log_ui = logging.getLogger("agenda.ui")
+
+def formato_dinero(centavos):
+    return f"${centavos / 100:,.2f}"
+
+# Opciones de "Repetir": clave del Dropdown -> (frecuencia, intervalo) de la serie
+REPETIR = {"no": ("No se repite", None), "s1": ("Cada semana", ("semanal", 1)), "s2": ("Cada 2 semanas", ("semanal", 2)),
+           "s4": ("Cada 4 semanas", ("semanal", 4)), "m1": ("Cada mes", ("mensual", 1))}
+
+def main(page: ft.Page):
+    # --- 1. CONFIGURACIÓN PÁGINA ---
+    page.title = "Agenda Liz"
+    page.window_width = 450
+    page.window_height = 800
+    page.padding = 0 
+    metricas.instrumentar_pagina(page)
+    inicio_arranque = time.perf_counter()
+    
+# --- 2. BASE DE DATOS (MODIFICADA PARA ANDROID) ---
+    def inicializar_bd():
+        # NOTA: Para Flet en Android, la forma más robusta sin plugins externos es confiar en
+        # que sqlite3 creará el archivo en el 'app_doc_dir' que Flet asigna al compilar.
+        # Una única conexión (WAL) compartida; el repositorio crea la tabla
+        return obtener_repositorio("citas.db")
+
+    tareas = Tareas()  # Consultas y cálculos fuera del hilo del evento
+    # Abrir la BD y migrar el esquema corre en paralelo con el armado de la interfaz;
+    # repo, motor, catalogo... se asignan en la sección 7, después del primer frame
+    bd_lista = tareas.pool.submit(inicializar_bd)
+
+    # page.update() / control.update() solo marcan: lo de cada manejador sale en un mensaje al
+    # terminar. El envío toma lock_ui (los callbacks de tareas modifican controles con él tomado)
+    # para no mandar un árbol a medio cambiar
+    render = Render(page, tareas.lock_ui)
+    render.instalar()
+
+    # --- 3. VARIABLES DE ESTADO ---
+    id_en_edicion = [None] 
+    fecha_elegida = [datetime.datetime.now().strftime('%d/%m/%Y')]
+    hora_inicio = [None]
+    hora_fin = [None]
+    ruta_imagen = [None]
+    filtro_fecha = [datetime.datetime.now().strftime('%d/%m/%Y')]  # Al abrir: las citas de hoy
+    busqueda = [""]        # Texto del buscador de clientes ("" = sin búsqueda)
+    ultimo_id = [None]     # Cursor de la paginación de la lista
+    tarjetas = {}          # id -> tarjeta visible en grid_citas
+    celdas_cal = {}        # 'dd/mm/yyyy' -> celda visible en grid_cal_grande
+    hay_mas = [False]
+    cargando = [False]
+    
+    # ESTADO DE LOS SERVICIOS (Chips)
+    seleccion = set()                       # ids de servicios elegidos
+    duracion_actual = [0]                   # Minutos de la selección (se recalcula solo al cambiarla)
+    
+    hoy = datetime.datetime.now()
+    cal_estado = {"mes": hoy.month, "anio": hoy.year}
+    cal_grande_estado = {"mes": hoy.month, "anio": hoy.year}
+    reporte_estado = {"mes": hoy.month, "anio": hoy.year}
+    estado_tema = {"actual": "oscuro"}  # Por sesión: cada navegador elige su tema
+    recurso_cal = [None]       # Filtro del calendario grande (None = todos)
+    recurso_sugerido = [None]  # Recurso de la sugerencia aplicada: se prueba primero
+    dlg_cal_peque = [None]     # Diálogo del calendario pequeño (se crea al abrirlo la primera vez)
+    cal_construido = [False]   # El calendario grande se arma la primera vez que se abre su pestaña
+    arranque_pendiente = [True]
+    datos_listos = [False]     # repo, motor, catalogo, cache_*... asignados (sección 7)
+
+    # --- 4. CONTROLES UI ---
+    
+    # LOGO (Busca 'logo.png' en la carpeta assets)
+    # Nota: Si falla la carga, muestra un icono por defecto para no romper la app
+    logo_img = ft.Image(src="logo.png", width=50, height=50, fit=ft.ImageFit.CONTAIN, error_content=ft.Icon(name="broken_image"))
+
+    titulo_app = ft.Text("L I Z   M A N I C U R I S T A", weight="bold", size=20)
+    btn_tema = ft.IconButton(icon="light_mode", tooltip="Cambiar Tema")
+
+    # Formulario Inputs
+    txt_cliente = ft.TextField(label="Cliente", prefix_icon="person", border_radius=10, content_padding=15)
+    sugerencias_cliente = ft.Row(wrap=True, spacing=5, run_spacing=5, visible=False)  # Autocompletar de txt_cliente
+    txt_costo = ft.TextField(label="Costo", prefix_icon="attach_money", keyboard_type=ft.KeyboardType.NUMBER, border_radius=10, content_padding=15)
+    
+    # --- CHIPS DE SERVICIOS (salen del catálogo) ---
+    def crear_chip(servicio):
+         id_s, nombre, minutos = servicio[:3]
+         return ft.Container(
+            data=id_s, tooltip=f"+{minutos} min",
+            content=ft.Text(nombre, size=12, weight="bold", text_align="center"),
+            padding=ft.padding.symmetric(horizontal=15, vertical=10),
+            border_radius=20,
+            animate=ft.Animation(200, ft.AnimationCurve.EASE_IN_OUT),
+            on_click=lambda e: toggle_servicio(e.control.data),
+        )
+
+    fila_chips = ft.Row([], wrap=True, spacing=10, alignment=ft.MainAxisAlignment.CENTER)
+
+    # Resto del formulario
+    txt_hora_display = ft.Text("Selecciona hora...", size=14)
+    dd_repetir = ft.Dropdown(label="Repetir", value="no", dense=True, border_radius=10, content_padding=10,
+                             options=[ft.dropdown.Option(k, texto) for k, (texto, _) in REPETIR.items()])
+    # Quién la atiende: "*" = cualquiera libre. Ocultos mientras no haya personal ni sillas cargados
+    dd_recurso = ft.Dropdown(label="Atiende", value="*", dense=True, border_radius=10, content_padding=10, expand=True, visible=False)
+    lbl_imagen = ft.Text("Sin diseño", size=12)
+    icono_img = ft.Icon(name="image")
+    
+    # Lista y Calendarios
+    txt_titulo_lista = ft.Text("CITAS AGENDADAS", size=12, weight="bold")
+    btn_ver_todas = ft.TextButton("Ver Todas", icon="list", visible=False, height=30)
+    txt_buscar = ft.TextField(hint_text="Buscar cliente...", prefix_icon="search", border_radius=10, content_padding=10, dense=True)
+    grid_citas = ft.GridView(expand=1, runs_count=5, max_extent=180, child_aspect_ratio=0.85, spacing=10, run_spacing=10, padding=15, on_scroll_interval=100)
+    txt_mes_anio_grande = ft.Text(size=18, weight="bold", text_align="center")
+    dd_recurso_cal = ft.Dropdown(value="*", dense=True, border_radius=10, content_padding=10, width=220, visible=False)
+    grid_cal_grande = ft.GridView(expand=1, runs_count=7, spacing=2, run_spacing=2, padding=5, child_aspect_ratio=0.6) 
+    cont_dias_cal = ft.GridView(runs_count=7, spacing=2, run_spacing=2, padding=10)
+    txt_mes_anio = ft.Text(size=16, weight="bold", text_align="center")
+    # Reportes
+    txt_mes_reporte = ft.Text(size=18, weight="bold", text_align="center")
+    txt_total_mes = ft.Text(size=30, weight="bold")
+    txt_resumen_mes = ft.Text(size=12)
+    txt_titulo_anio = ft.Text(size=12, weight="bold")
+    lista_anio = ft.Column(spacing=4)
+    txt_titulo_dias = ft.Text("POR DÍA", size=12, weight="bold")
+    lista_dias = ft.Column(spacing=4)
+
+    # --- 5. LÓGICA PRINCIPAL ---
+    
+    def obtener_tema():
+        return TEMAS[estado_tema["actual"]]
+
+    def mostrar_alerta(titulo, msg, es_error=False):
+        c = obtener_tema()
+        icon = "error" if es_error else "check_circle"
+        color = "red" if es_error else c["acento"]
+        dlg = ft.AlertDialog(
+            bgcolor=c["fondo"],
+            title=ft.Row([ft.Icon(icon, color=color), ft.Text(titulo, color=c["texto"])]),
+            content=ft.Text(msg, color=c["texto_sec"]),
+            actions=[ft.TextButton("OK", on_click=lambda e: page.close(dlg))]
+        )
+        page.open(dlg)
+
+    @cronometrar("limpiar_formulario")
+    def limpiar_formulario():
+        c = obtener_tema()
+        txt_cliente.value = ""
+        txt_costo.value = ""
+        tareas.cancelar("autocompletar"); sugerencias_cliente.visible = False
+        tareas.cancelar("imagen")
+        seleccion.clear(); duracion_actual[0] = catalogo.duracion()
+        
+        txt_hora_display.value = "Selecciona hora..."
+        txt_hora_display.color = c["texto_sec"]
+        lbl_imagen.value = "Sin diseño"
+        lbl_imagen.color = c["texto_sec"]
+        icono_img.color = c["acento"]
+        id_en_edicion[0] = None
+        dd_repetir.value = "no"; dd_repetir.visible = True
+        dd_recurso.value = "*"; recurso_sugerido[0] = None
+        ruta_imagen[0] = None
+        hora_inicio[0] = None
+        btn_guardar.text = "AGENDAR"
+        btn_guardar.icon = "check"
+        btn_cancelar.visible = False
+        btn_sugerencia.visible = False 
+        actualizar_estilos() 
+        page.update()
+        actualizar_sugerencia()
+
+    def refrescar_todo():
+        cargar_citas_en_grid()
+        if cal_construido[0]: construir_cal_grande()
+        actualizar_sugerencia()
+
+    def reportar_arranque(etapa):
+        # Tiempo desde que entró main(): 'primer_frame' (interfaz enviada) e 'interactivo' (lista con datos)
+        ms = (time.perf_counter() - inicio_arranque) * 1000
+        metricas.registrar(f"arranque.{etapa}", ms)
+        log_arranque.info("%s %.0f ms", etapa, ms)
+
+    def verificar_choque(fecha, ini, fin, id_actual=None, recurso=None):
+        try:
+            n_ini, n_fin = rango_minutos(ini, fin)
+            if n_ini is None: return False
+            return motor.choca(fecha, n_ini, n_fin, id_actual, recurso)
+        except: return False
+
+    # --- PERSONAL Y SILLAS ---
+    def recurso_elegido():
+        return None if dd_recurso.value in (None, "*") else int(dd_recurso.value)
+
+    def candidatos():
+        # Dónde puede ir la cita: el recurso elegido o cualquiera activo ([None] = el salón entero).
+        # Con "cualquiera", el de la sugerencia va primero; si otra sesión lo toma, sigue el resto
+        elegido = recurso_elegido()
+        if elegido is not None: return [elegido]
+        lista = recursos.ids()
+        if recurso_sugerido[0] in lista: lista = [recurso_sugerido[0]] + [r for r in lista if r != recurso_sugerido[0]]
+        return lista
+
+    def nombre_recurso(fila):
+        return recursos.nombre(fila[7]) if fila[7] is not None else None
+
+    def cargar_recursos():
+        activos = recursos.activos()
+        dd_recurso.options = [ft.dropdown.Option("*", "Cualquiera")] + [ft.dropdown.Option(str(i), n) for i, n in activos]
+        dd_recurso_cal.options = [ft.dropdown.Option("*", "Todos")] + [ft.dropdown.Option(str(i), n) for i, n in activos]
+        for dd in (dd_recurso, dd_recurso_cal):
+            if dd.value not in {o.key for o in dd.options}: dd.value = "*"
+            dd.visible = bool(activos)
+        recurso_cal[0] = None if dd_recurso_cal.value == "*" else int(dd_recurso_cal.value)
+
+    def al_cambiar_recurso(e):
+        recurso_sugerido[0] = None
+        if hora_inicio[0] is None: actualizar_sugerencia()
+
+    def al_filtrar_recurso_cal(e):
+        recurso_cal[0] = None if dd_recurso_cal.value == "*" else int(dd_recurso_cal.value)
+        construir_cal_grande()
+
+    # --- LÓGICA DE TIEMPO Y SERVICIOS ---
+    
+    def recalcular_finalizacion():
+        if not hora_inicio[0]: return
+        fmt = "%I:%M %p"
+        try:
+            dt_ini = datetime.datetime.strptime(hora_inicio[0], fmt)
+            ahora = datetime.datetime.now()
+            dt_ini = dt_ini.replace(year=ahora.year, month=ahora.month, day=ahora.day)
+            dt_fin = dt_ini + datetime.timedelta(minutes=duracion_actual[0])
+            hora_fin[0] = dt_fin.strftime(fmt)
+            
+            c = obtener_tema()
+            txt_hora_display.value = f"{hora_inicio[0]} - {hora_fin[0]}"
+            txt_hora_display.color = c["acento"]
+            txt_hora_display.update()
+        except: pass
+
+    @cronometrar("toggle_servicio")
+    def toggle_servicio(id_servicio):
+        # 1. Cambiar estado (la duración se calcula aquí, una vez por selección)
+        seleccion.symmetric_difference_update({id_servicio})
+        duracion_actual[0] = catalogo.duracion(seleccion)
+        
+        # 2. Estilos, hora y sugerencia salen juntos al terminar el toque (render)
+        actualizar_estilos() 
+        page.update()
+        
+        # 3. Lógica de tiempo
+        if hora_inicio[0]:
+            recalcular_finalizacion()
+        else:
+            actualizar_sugerencia()
+
+    @cronometrar("buscar_hueco")
+    def buscar_hueco(fecha, duracion, lista):
+        # Primer hueco del día en cualquiera de los recursos; si está lleno, el siguiente en los próximos 7 días
+        try:
+            p_ini, p_fin, r = motor.primer_hueco(fecha, duracion, lista)
+            if p_ini is not None: return fecha, minutos_a_hora(p_ini), minutos_a_hora(p_fin), r
+            for f, p_ini, p_fin, r in motor.proximos_huecos(fecha, duracion, n=1, dias=7, recursos=lista):
+                return f, minutos_a_hora(p_ini), minutos_a_hora(p_fin), r
+        except: pass
+        return None, None, None, None
+
+    @cronometrar("actualizar_sugerencia")
+    def actualizar_sugerencia():
+        if hora_inicio[0] is not None: 
+            tareas.cancelar("sugerencia")
+            btn_sugerencia.visible = False
+            btn_sugerencia.update()
+            return
+
+        # Se calcula con los valores de ahora; si llega otro toque antes, este resultado se descarta
+        fecha, duracion, lista = fecha_elegida[0], duracion_actual[0], candidatos()
+        tareas.lanzar("sugerencia", lambda: buscar_hueco(fecha, duracion, lista), mostrar_sugerencia)
+
+    @cronometrar("mostrar_sugerencia")
+    def mostrar_sugerencia(resultado):
+        if hora_inicio[0] is not None: return
+        s_fecha, s_ini, s_fin, s_recurso = resultado
+        c = obtener_tema()
+        if s_ini:
+            if s_fecha == fecha_elegida[0]:
+                btn_sugerencia.text = f"✨ Recomendado: {s_ini}"
+            else:
+                btn_sugerencia.text = f"✨ Recomendado: {s_fecha[:5]} {s_ini}"
+            if s_recurso is not None and recurso_elegido() is None:
+                btn_sugerencia.text += f" · {recursos.nombre(s_recurso)}"
+            btn_sugerencia.data = (s_fecha, s_ini, s_fin, s_recurso)
+            btn_sugerencia.visible = True
+            btn_sugerencia.style = ft.ButtonStyle(side=ft.BorderSide(1, c["acento"]))
+            btn_sugerencia.color = c["acento"]
+        else:
+            btn_sugerencia.visible = False
+        btn_sugerencia.update()
+
+    def aplicar_sugerencia(e):
+        fecha, ini, fin, recurso = e.control.data
+        c = obtener_tema()
+        recurso_sugerido[0] = recurso
+        fecha_elegida[0] = fecha
+        btn_fecha.text = fecha
+        hora_inicio[0] = ini
+        hora_fin[0] = fin
+        txt_hora_display.value = f"{ini} - {fin}"
+        txt_hora_display.color = c["acento"]
+        btn_sugerencia.visible = False 
+        page.update()
+
+    # --- CRUD ---
+    @cronometrar("guardar_accion")
+    def guardar_accion(e):
+        if not txt_cliente.value: mostrar_alerta("Error", "Falta nombre", True); return
+        if not hora_inicio[0]: mostrar_alerta("Error", "Falta hora", True); return
+        if tareas.pendiente("imagen"): mostrar_alerta("Espera", "El diseño aún se está copiando", True); return
+
+        # Foto del formulario: el trabajo corre en otro hilo y el usuario puede seguir tocando
+        id_cita, fecha, ini, fin = id_en_edicion[0], fecha_elegida[0], hora_inicio[0], hora_fin[0]
+        cliente, costo = txt_cliente.value, txt_costo.value
+        img = ruta_imagen[0] if ruta_imagen[0] else ""
+        servicios, duracion = sorted(seleccion), duracion_actual[0]
+        serie = REPETIR[dd_repetir.value][1] if id_cita is None else None
+        lista = candidatos()
+
+        def escribir():
+            # Se prueba cada recurso posible, en orden. El motor en memoria descarta rápido lo
+            # ocupado; la comprobación que vale es la de repo.reserva, en la misma transacción
+            # que la escritura (otra sesión pudo tomar ese recurso recién)
+            choque = None
+            for recurso in lista:
+                if verificar_choque(fecha, ini, fin, id_cita, recurso): continue
+                try:
+                    with repo.reserva(fecha, ini, fin, id_cita, recurso):
+                        if recurrencias.choca(fecha, ini, fin, id_cita, recurso): continue
+                        if serie:
+                            # Una sola fila para toda la serie; el choque se revisa sin expandir fechas futuras
+                            fecha_choque = recurrencias.choque(*serie, fecha, ini, fin, recurso)
+                            if fecha_choque: choque = choque or fecha_choque; continue
+                            repo.crear_regla(cliente, costo, fecha, ini, fin, img, *serie, servicios, duracion, recurso=recurso)
+                            return "Serie agendada"
+                        if id_cita is None:
+                            repo.insertar_cita(cliente, costo, fecha, ini, fin, img, servicios, duracion, recurso)
+                            return "Agendado"
+                        if es_ocurrencia(id_cita):
+                            # Editar una fecha de la serie la vuelve una cita suelta
+                            repo.separar_ocurrencia(*partir_id(id_cita), cliente, costo, fecha, ini, fin, img, servicios,
+                                                    duracion, recurso)
+                            return "Actualizado"
+                        repo.actualizar_cita(id_cita, cliente, costo, fecha, ini, fin, img, servicios, duracion, recurso)
+                        return "Actualizado"
+                except HorarioOcupado:
+                    continue
+            if choque: raise ValueError(f"La serie choca con otra cita el {choque}")
+            return None
+
+        def al_terminar(msg):
+            btn_guardar.disabled = False
+            if msg is None:
+                btn_guardar.update()
+                mostrar_alerta("Ocupado", "Horario no disponible", True); return
+            # La tarjeta nueva ya llegó por al_cambiar_cita; si cambia el filtro, se recarga la lista
+            if filtro_fecha[0] != fecha or busqueda[0]:
+                filtrar_fecha(fecha)
+                cargar_citas_en_grid()
+            limpiar_formulario()
+            mostrar_alerta("Éxito", msg, False)
+
+        def al_error(ex):
+            btn_guardar.disabled = False
+            btn_guardar.update()
+            mostrar_alerta("Error", str(ex), True)
+
+        btn_guardar.disabled = True
+        btn_guardar.update()
+        tareas.lanzar(None, escribir, al_terminar, al_error)
+
+    @cronometrar("eliminar_accion")
+    def eliminar_accion(e):
+        id_cita = e.control.data
+        borrar = (lambda: repo.omitir_ocurrencia(*partir_id(id_cita))) if es_ocurrencia(id_cita) else (lambda: repo.eliminar_cita(id_cita))
+        tareas.lanzar(None, borrar,
+                      lambda _: mostrar_alerta("Listo", "Cita eliminada", False),
+                      lambda ex: mostrar_alerta("Error", str(ex), True))
+
+    @cronometrar("editar_accion")
+    def editar_accion(e):
+        datos = e.control.data
+        c = obtener_tema()
+        id_en_edicion[0] = datos[0]
+        tareas.cancelar("imagen")  # Una foto que se estaba copiando era para el formulario anterior
+        txt_cliente.value = datos[1]
+        txt_costo.value = datos[2]
+        fecha_elegida[0] = datos[3]
+        btn_fecha.text = datos[3]
+        hora_inicio[0] = datos[4]; hora_fin[0] = datos[5]
+        txt_hora_display.value = f"{datos[4]} - {datos[5]}"
+        txt_hora_display.color = c["acento"]
+        ruta_imagen[0] = datos[6]
+        if datos[6]: lbl_imagen.value = "Diseño OK"; lbl_imagen.color = c["acento"]
+        dd_recurso.value = str(datos[7]) if str(datos[7]) in {o.key for o in dd_recurso.options} else "*"
+        
+        # Servicios y duración tal como se guardaron (no se vuelven a derivar)
+        if es_ocurrencia(datos[0]):
+            regla = recurrencias.regla(partir_id(datos[0])[0])
+            ids, duracion = (regla.servicios, regla.duracion) if regla else ([], None)
+        else:
+            ids, duracion = repo.servicios_de_cita(datos[0])
+        dd_repetir.visible = False
+        seleccion.clear(); seleccion.update(ids)
+        duracion_actual[0] = duracion or catalogo.duracion(seleccion)
+        
+        btn_guardar.text = "ACTUALIZAR"; btn_guardar.icon = "update"
+        btn_cancelar.visible = True
+        btn_sugerencia.visible = False
+        tabs_control.selected_index = 0
+        actualizar_estilos()
+        page.update()
+
+    @cronometrar("ver_detalle")
+    def ver_detalle(e):
+        datos = e.control.data
+        c = obtener_tema()
+        marco = ft.Container(ft.Icon("image_not_supported", size=50, color=c["texto_sec"]), alignment=ft.alignment.center)
+        acciones = [ft.TextButton("Cerrar", on_click=lambda e: page.close(dlg))]
+        if datos[6] and os.path.exists(datos[6]):
+            # Primero la miniatura; la foto completa solo si se pide. Si la miniatura aún no existe,
+            # un ícono de espera hasta que se genere (nunca el original de varios MB)
+            miniatura = almacen.miniatura(datos[6])
+            imagen = lambda src: ft.Image(src=src, width=300, height=300, fit=ft.ImageFit.CONTAIN)
+            marco.content = imagen(miniatura) if miniatura else ft.Icon("hourglass_empty", size=50, color=c["texto_sec"])
+            if miniatura != datos[6]:
+                def ver_original(e):
+                    marco.content = imagen(datos[6]); e.control.visible = False
+                    dlg.update()
+                acciones.insert(0, ft.TextButton("Ver original", on_click=ver_original))
+            futuro = None if miniatura else almacen.preparar_miniatura(datos[6])
+            if futuro is not None:
+                def mostrar_miniatura(ruta):
+                    if not ruta or not isinstance(marco.content, ft.Icon): return  # Falló, o ya pidió el original
+                    marco.content = imagen(ruta)
+                    page.update(marco)
+                tareas.lanzar("detalle_miniatura", futuro.result, mostrar_miniatura)
+        serie = []
+        if es_ocurrencia(datos[0]):
+            regla_id, iso = partir_id(datos[0])
+            regla = recurrencias.regla(regla_id)
+            if regla: serie.append(ft.Text(f"🔁 {regla.descripcion()}", color=c["texto_sec"]))
+            def terminar_serie(e):
+                # La serie queda hasta el día anterior a esta fecha
+                page.close(dlg)
+                ultimo = (datetime.date.fromisoformat(iso) - datetime.timedelta(days=1)).isoformat()
+                tareas.lanzar(None, lambda: repo.terminar_regla(regla_id, ultimo),
+                              lambda _: mostrar_alerta("Listo", "Serie terminada", False),
+                              lambda ex: mostrar_alerta("Error", str(ex), True))
+            acciones.insert(0, ft.TextButton("Terminar serie", on_click=terminar_serie))
+        dlg = ft.AlertDialog(
+            bgcolor=c["superficie"],
+            title=ft.Text(datos[1], color=c["texto"], weight="bold", text_align="center"),
+            content=ft.Column([
+                marco,
+                ft.Text(f"📅 {datos[3]}", color=c["texto_sec"]),
+                ft.Text(f"⏰ {datos[4]} - {datos[5]}", color=c["texto_sec"]),
+                *([ft.Text(f"👤 {nombre_recurso(datos)}", color=c["texto_sec"])] if nombre_recurso(datos) else []),
+                *serie,
+                ft.Text(f"💰 ${datos[2]}", color=c["acento"], weight="bold", size=20)
+            ], height=350, width=300, scroll=ft.ScrollMode.AUTO),
+            actions=acciones
+        )
+        page.open(dlg)
+
+    # Los colores se aplican en pintar_*: así un cambio de tema solo repinta lo existente
+    def crear_tarjeta(fila):
+        cabecera = ft.Text(fila[1], weight="bold")
+        miniatura = almacen.miniatura(fila[6]) if fila[6] else None
+        if miniatura:
+            cabecera = ft.Row([ft.Image(src=miniatura, width=32, height=32, fit=ft.ImageFit.COVER, border_radius=6), cabecera], spacing=6)
+        if es_ocurrencia(fila[0]):
+            cabecera = ft.Row([ft.Icon("repeat", size=14), *(cabecera.controls if isinstance(cabecera, ft.Row) else [cabecera])], spacing=6)
+        tarjeta = ft.Container(
+            padding=12, border_radius=10,
+            content=ft.Column([
+                ft.Container(
+                    data=fila, on_click=ver_detalle,
+                    content=ft.Column([
+                        cabecera,
+                        ft.Text(f"📅 {fila[3]}", size=11),
+                        ft.Text(f"⏰ {fila[4]} - {fila[5]}" + (f" · {nombre_recurso(fila)}" if nombre_recurso(fila) else ""), size=11)
+                    ])
+                ),
+                ft.Divider(height=5),
+                ft.Row([
+                    ft.IconButton("edit", icon_size=18, data=fila, on_click=editar_accion),
+                    ft.IconButton("delete", icon_color="red", icon_size=18, data=fila[0], on_click=eliminar_accion)
+                ], alignment="spaceBetween")
+            ])
+        )
+        tarjetas[fila[0]] = tarjeta
+        return pintar_tarjeta(tarjeta)
+
+    def pintar_tarjeta(tarjeta):
+        c = obtener_tema()
+        info, divisor, botones = tarjeta.content.controls
+        cabecera, fecha, hora = info.content.controls
+        nombre = cabecera.controls[-1] if isinstance(cabecera, ft.Row) else cabecera
+        if isinstance(cabecera, ft.Row) and isinstance(cabecera.controls[0], ft.Icon): cabecera.controls[0].color = c["acento"]
+        tarjeta.bgcolor = c["superficie"]; tarjeta.border = ft.border.all(1, c["borde"])
+        nombre.color = c["texto"]; fecha.color = c["texto_sec"]; hora.color = c["acento"]
+        divisor.color = c["borde"]; botones.controls[0].icon_color = c["texto_sec"]
+        return tarjeta
+
+    def pintar_lista():
+        c = obtener_tema()
+        for control in grid_citas.controls:
+            if isinstance(control, ft.Text): control.color = c["texto_sec"]
+            else: pintar_tarjeta(control)
+        txt_titulo_lista.color = c["texto_sec"]
+        btn_ver_todas.style = ft.ButtonStyle(color=c["acento"])
+
+    @cronometrar("cargar_citas_en_grid")
+    def cargar_citas_en_grid(retardo=0):
+        filtro, texto = filtro_fecha[0], busqueda[0]
+        tareas.cancelar("pagina")
+        cargando[0] = False
+        if texto:
+            consulta = lambda: repo.buscar_citas(texto)
+        elif filtro:
+            # Primera página del día (con sus series), compartida entre sesiones
+            consulta = lambda: cache_dias.primera_pagina(filtro)
+        else:
+            # Sin filtro solo se trae la primera página; el resto llega al hacer scroll
+            consulta = lambda: repo.pagina_citas()
+        if retardo: tareas.diferir("lista", retardo, consulta, lambda datos: mostrar_citas(filtro, texto, datos))
+        else: tareas.lanzar("lista", consulta, lambda datos: mostrar_citas(filtro, texto, datos))
+
+    @cronometrar("mostrar_citas")
+    def mostrar_citas(filtro, texto, datos):
+        grid_citas.controls.clear()
+        tarjetas.clear()
+        c = obtener_tema()
+        ultimo_id[0] = None
+        if texto:
+            # La búsqueda pagina igual que la lista completa
+            txt_titulo_lista.value = f"RESULTADOS: {texto.upper()}"
+            btn_ver_todas.visible = True
+            hay_mas[0] = len(datos) == TAM_PAGINA
+            if datos: ultimo_id[0] = datos[-1][0]
+        elif filtro:
+            # El día también pagina; las ocurrencias de series van completas en la primera página
+            txt_titulo_lista.value = f"CITAS DEL {filtro}"
+            btn_ver_todas.visible = True
+            guardadas = [f for f in datos if not es_ocurrencia(f[0])]
+            hay_mas[0] = len(guardadas) == TAM_PAGINA
+            if guardadas: ultimo_id[0] = guardadas[-1][0]
+        else:
+            txt_titulo_lista.value = "TODAS LAS CITAS"
+            btn_ver_todas.visible = False
+            hay_mas[0] = len(datos) == TAM_PAGINA
+            if datos: ultimo_id[0] = datos[-1][0]
+        if not datos and (filtro or texto):
+             grid_citas.controls.append(ft.Text("Sin resultados" if texto else "Sin citas este día", color=c["texto_sec"], italic=True))
+        grid_citas.controls.extend(crear_tarjeta(fila) for fila in datos)
+        pintar_lista()
+        metricas.contar_controles("controles.mostrar_citas", grid_citas)
+        grid_citas.update(); txt_titulo_lista.update(); btn_ver_todas.update()
+        if arranque_pendiente[0]:
+            arranque_pendiente[0] = False
+            reportar_arranque("interactivo")
+
+    def cargar_mas_citas():
+        if not hay_mas[0] or cargando[0] or tareas.pendiente("lista"): return
+        cargando[0] = True
+        texto, filtro, desde = busqueda[0], filtro_fecha[0], ultimo_id[0]
+        if texto: consulta = lambda: repo.buscar_citas(texto, desde)
+        elif filtro: consulta = lambda: repo.citas_del_dia(filtro, desde, TAM_PAGINA)
+        else: consulta = lambda: repo.pagina_citas(desde)
+        tareas.lanzar("pagina", consulta, agregar_pagina,
+                      lambda ex: cargando.__setitem__(0, False))
+
+    @cronometrar("agregar_pagina")
+    def agregar_pagina(datos):
+        cargando[0] = False
+        hay_mas[0] = len(datos) == TAM_PAGINA
+        if datos:
+            ultimo_id[0] = datos[-1][0]
+            nuevas = [crear_tarjeta(fila) for fila in datos]
+            grid_citas.controls.extend(nuevas)
+            metricas.contar_controles("controles.agregar_pagina", *nuevas)
+            grid_citas.update()
+
+    # --- ACTUALIZACIÓN INCREMENTAL ---
+    # Cada escritura del repositorio parchea solo la tarjeta y la celda afectadas
+    def visible_en_lista(fila):
+        return filtro_fecha[0] is None or fila[3] == filtro_fecha[0]
+
+    def va_arriba(cambio):
+        # Sin tarjeta previa, solo entra arriba si respeta el orden id DESC: una cita nueva o más
+        # nueva que la primera cargada. Las demás aún no se cargaron y llegan con la paginación
+        cargados = [i for i in tarjetas if isinstance(i, int)]
+        return cambio.accion == "insertar" or not cargados or (isinstance(cambio.id, int) and cambio.id > max(cargados))
+
+    def parchear_lista(cambio):
+        vieja = tarjetas.pop(cambio.id, None)
+        entra = cambio.despues and visible_en_lista(cambio.despues) and (vieja is not None or va_arriba(cambio))
+        nueva = crear_tarjeta(cambio.despues) if entra else None
+        if vieja is None and nueva is None: return
+        if vieja is not None and nueva is not None:
+            grid_citas.controls[grid_citas.controls.index(vieja)] = nueva
+        elif vieja is not None:
+            grid_citas.controls.remove(vieja)
+        else:
+            if grid_citas.controls and isinstance(grid_citas.controls[0], ft.Text):
+                grid_citas.controls.pop(0)  # Quitar "Sin citas este día"
+            grid_citas.controls.insert(0, nueva)
+        grid_citas.update()
+
+    def parchear_celda(fecha):
+        celda = celdas_cal.get(fecha)
+        if celda is None: return
+        dia = int(fecha[:2])
+        recurso = recurso_cal[0]
+        llenar_celda_grande(celda, dia, cache_dias.nombres(fecha, recurso))
+        pintar_celda_grande(celda, fecha)
+        page.update(celda)  # Sin el assert de celda.update(): si el mes aún no se envió, sale con él
+
+    @render.accion  # Lista, celdas, sugerencia y reporte de una escritura: un solo mensaje
+    @cronometrar("al_cambiar_cita")
+    def al_cambiar_cita(cambio):
+        if cambio.choques: avisar_choque(cambio)
+        if cambio.accion == "recargar":
+            refrescar_todo()
+            if reporte_visible(): construir_reporte()
+            return
+        try:
+            # Si hay una recarga de la lista en vuelo, puede haber leído antes de esta escritura.
+            # Con búsqueda activa se repite la consulta (el índice decide qué coincide)
+            if tareas.pendiente("lista") or busqueda[0]: cargar_citas_en_grid()
+            else:
+                with tareas.lock_ui: parchear_lista(cambio)
+            fechas = {f[3] for f in (cambio.antes, cambio.despues) if f}
+            for f in fechas: parchear_celda(f)
+            if fecha_elegida[0] in fechas and hora_inicio[0] is None: actualizar_sugerencia()
+        except Exception:
+            # Un parche que falla no debe dejar la lista o el calendario viejos: se recarga todo
+            log_ui.exception("no se pudo parchear la cita %s; se recarga todo", cambio.id)
+            refrescar_todo()
+        if reporte_visible(): construir_reporte()
+
+    def avisar_choque(cambio):
+        # Una cita sincronizada desde otro equipo quedó encima de otra (se guarda igual para que
+        # ambos coincidan): aviso no modal, hay que moverla a mano
+        c = obtener_tema()
+        fila = cambio.despues
+        aviso = ft.SnackBar(ft.Text(f"Sincronización: {cambio.choques} cita(s) pisan otras del mismo horario", color=c["texto"]),
+                            bgcolor=c["superficie"], duration=8000)
+        if fila:
+            def ver(e):
+                filtrar_fecha(fila[3])
+                cargar_citas_en_grid()
+            aviso.content.value = f"Sincronización: {fila[1]} ({fila[3]} {fila[4]}) pisa otra cita del mismo horario"
+            aviso.action, aviso.on_action = "Ver", ver
+        with tareas.lock_ui: page.open(aviso)
+
+    @render.accion
+    def mostrar_recordatorio(fila):
+        # Llega desde el hilo de recordatorios: banner arriba con la cita que se acerca
+        c = obtener_tema()
+        faltan = max(0, round((inicio_de(fila) - time.time()) / 60))
+        def ver(e):
+            page.close(banner)
+            filtrar_fecha(fila[3])
+            cargar_citas_en_grid()
+        banner = ft.Banner(
+            bgcolor=c["superficie"],
+            leading=ft.Icon("alarm", color=c["acento"]),
+            content=ft.Text(f"{fila[1]} a las {fila[4]} (en {faltan} min)", color=c["texto"]),
+            actions=[ft.TextButton("Ver", on_click=ver), ft.TextButton("OK", on_click=lambda e: page.close(banner))]
+        )
+        with tareas.lock_ui: page.open(banner)
+
+    def al_desplazar(e):
+        # Cerca del final de la lista pedimos la siguiente página
+        if e.max_scroll_extent is not None and e.pixels >= e.max_scroll_extent - 300:
+            cargar_mas_citas()
+
+    def resetear_filtro(e):
+        filtro_fecha[0] = None
+        busqueda[0] = ""; txt_buscar.value = ""
+        cargar_citas_en_grid()
+        page.update()
+
+    def filtrar_fecha(fecha):
+        # Elegir un día sustituye a la búsqueda por cliente
+        filtro_fecha[0] = fecha
+        busqueda[0] = ""; txt_buscar.value = ""
+
+    # --- BÚSQUEDA Y AUTOCOMPLETAR ---
+    def al_buscar(e):
+        texto = txt_buscar.value.strip()
+        if texto == busqueda[0]: return
+        busqueda[0] = texto
+        if texto: filtro_fecha[0] = None
+        # Debounce: solo la última tecla de una ráfaga llega a SQLite
+        cargar_citas_en_grid(retardo=0.25 if texto else 0)
+
+    def al_escribir_cliente(e):
+        texto = txt_cliente.value or ""
+        if len(texto.strip()) < 2:
+            tareas.cancelar("autocompletar")
+            if sugerencias_cliente.visible: sugerencias_cliente.visible = False; sugerencias_cliente.update()
+            return
+        tareas.diferir("autocompletar", 0.2, lambda: repo.sugerir_clientes(texto),
+                       lambda nombres: mostrar_sugerencias_cliente(texto, nombres))
+
+    def mostrar_sugerencias_cliente(texto, nombres):
+        # Si el nombre ya está completo no hace falta sugerir nada
+        nombres = [n for n in nombres if n.casefold() != texto.strip().casefold()]
+        c = obtener_tema()
+        sugerencias_cliente.controls = [
+            ft.TextButton(n, data=n, height=30, on_click=elegir_sugerencia_cliente,
+                          style=ft.ButtonStyle(color=c["acento"], side=ft.BorderSide(1, c["borde"])))
+            for n in nombres]
+        sugerencias_cliente.visible = bool(nombres)
+        sugerencias_cliente.update()
+
+    def elegir_sugerencia_cliente(e):
+        tareas.cancelar("autocompletar")
+        txt_cliente.value = e.control.data
+        sugerencias_cliente.visible = False
+        txt_cliente.update(); sugerencias_cliente.update()
+
+    # --- CALENDARIO GRANDE ---
+    # Las 7 cabeceras y las 42 celdas (6 semanas) se crean una vez; al cambiar de mes solo
+    # cambian textos, colores, bordes y etiquetas, y Flet envía únicamente esas propiedades
+    def crear_celda_grande():
+        numero = ft.Container(content=ft.Text(weight="bold"), alignment=ft.alignment.center)
+        return ft.Container(content=ft.Column([numero], spacing=2), border_radius=5, padding=2)
+
+    def llenar_celda_grande(celda, dia, lista_nombres):
+        # Reusa las etiquetas que ya tiene la celda (las que sobran se ocultan); solo se crean las que falten
+        numero, *etiquetas = celda.content.controls
+        numero.content.value = str(dia)
+        for i, nombre in enumerate(lista_nombres):
+            if i == len(etiquetas):
+                etiquetas.append(ft.Container(content=ft.Text(size=10, color="black", no_wrap=True), border_radius=3, padding=2, alignment=ft.alignment.center))
+                celda.content.controls.append(etiquetas[i])
+            etiquetas[i].content.value = (nombre[:8] + '..') if len(nombre) > 8 else nombre
+            etiquetas[i].visible = True
+        for etiqueta in etiquetas[len(lista_nombres):]: etiqueta.visible = False
+
+    def al_tocar_celda_grande(e):
+        ir_a_agenda_dia(e.control.data)
+
+    def pintar_celda_grande(celda, fecha_str):
+        c = obtener_tema()
+        celda.bgcolor = c["celda_cal"]
+        if fecha_str == datetime.datetime.now().strftime('%d/%m/%Y'):
+            celda.border = ft.border.all(2, c["acento"])
+        else:
+            celda.border = ft.border.all(1, c["borde"])
+        numero, *etiquetas = celda.content.controls
+        numero.content.color = c["texto"]
+        for etiqueta in etiquetas: etiqueta.bgcolor = c["acento"]
+
+    def pintar_cal_grande():
+        c = obtener_tema()
+        for cabecera in grid_cal_grande.controls[:7]:
+            cabecera.content.color = c["acento"]
+        for fecha_str, celda in celdas_cal.items():
+            pintar_celda_grande(celda, fecha_str)
+        txt_mes_anio_grande.color = c["texto"]
+
+    @cronometrar("construir_cal_grande")
+    def construir_cal_grande():
+        cal_construido[0] = True
+        mes, anio, recurso = cal_grande_estado['mes'], cal_grande_estado['anio'], recurso_cal[0]
+        tareas.lanzar("cal_grande", lambda: cache_meses.nombres(mes, anio, recurso),
+                      lambda citas_mes: mostrar_cal_grande(mes, anio, citas_mes),
+                      lambda ex: mostrar_cal_grande(mes, anio, {}))
+
+    @cronometrar("mostrar_cal_grande")
+    def mostrar_cal_grande(mes, anio, citas_mes):
+        if not grid_cal_grande.controls:
+            grid_cal_grande.controls = [ft.Container(content=ft.Text(d, weight="bold"), alignment=ft.alignment.center) for d in DIAS_SEMANA]
+            grid_cal_grande.controls += [crear_celda_grande() for _ in range(CELDAS_MES)]
+        celdas_cal.clear()
+
+        # Días del mes por posición (0 = hueco antes del 1 o después del último); la 6ª semana se oculta si sobra
+        dias = [dia for semana in calendar.monthcalendar(anio, mes) for dia in semana]
+        for i, celda in enumerate(grid_cal_grande.controls[7:]):
+            dia = dias[i] if i < len(dias) else 0
+            celda.visible = i < len(dias)
+            celda.content.visible = bool(dia)
+            if not dia:
+                celda.data = None; celda.on_click = None; celda.bgcolor = None; celda.border = None
+                continue
+            fecha_str = f"{dia:02d}/{mes:02d}/{anio}"
+            celda.data = fecha_str; celda.on_click = al_tocar_celda_grande
+            llenar_celda_grande(celda, dia, citas_mes.get(fecha_str, []))
+            celdas_cal[fecha_str] = celda
+        
+        txt_mes_anio_grande.value = f"{MESES[mes]} {anio}"
+        pintar_cal_grande()
+        metricas.contar_controles("controles.mostrar_cal_grande", grid_cal_grande)
+        grid_cal_grande.update(); txt_mes_anio_grande.update()
+
+    def mover_cal_grande(delta):
+        cal_grande_estado['mes'] += delta
+        if cal_grande_estado['mes'] > 12: cal_grande_estado['mes']=1; cal_grande_estado['anio']+=1
+        elif cal_grande_estado['mes'] < 1: cal_grande_estado['mes']=12; cal_grande_estado['anio']-=1
+        construir_cal_grande()
+
+    def ir_a_agenda_dia(fecha):
+        filtrar_fecha(fecha)
+        cargar_citas_en_grid()
+        tabs_control.selected_index = 0
+        tabs_control.update()
+        page.update()
+
+    # --- CALENDARIO PEQUEÑO ---
+    @cronometrar("construir_cal_peque")
+    def construir_cal_peque():
+        # Con un recurso elegido en el formulario, cuenta solo lo suyo
+        mes, anio, recurso = cal_estado['mes'], cal_estado['anio'], recurso_elegido()
+        tareas.lanzar("cal_peque", lambda: cache_meses.conteos(mes, anio, recurso),
+                      lambda conteos: mostrar_cal_peque(mes, anio, conteos),
+                      lambda ex: mostrar_cal_peque(mes, anio, {}))
+
+    # Igual que el grande: cuadrícula fija de cabeceras y 42 celdas (número y "N citas")
+    def crear_celda_peque():
+        contenido = ft.Column([ft.Text(weight="bold"), ft.Text(size=8)], alignment="center", spacing=0)
+        return ft.Container(content=contenido, border_radius=10, alignment=ft.alignment.center, height=45, width=45)
+
+    def al_tocar_celda_peque(e):
+        seleccionar_fecha(e.control.data)
+
+    @cronometrar("mostrar_cal_peque")
+    def mostrar_cal_peque(mes, anio, conteos):
+        c = obtener_tema()
+        if not cont_dias_cal.controls:
+            cont_dias_cal.controls = [ft.Container(content=ft.Text(d, size=12, weight="bold"), alignment=ft.alignment.center) for d in DIAS_SEMANA]
+            cont_dias_cal.controls += [crear_celda_peque() for _ in range(CELDAS_MES)]
+        for cabecera in cont_dias_cal.controls[:7]:
+            cabecera.content.color = c["texto_sec"]
+
+        dias = [dia for sem in calendar.monthcalendar(anio, mes) for dia in sem]
+        for i, celda in enumerate(cont_dias_cal.controls[7:]):
+            dia = dias[i] if i < len(dias) else 0
+            celda.visible = i < len(dias)
+            celda.content.visible = bool(dia)
+            if not dia:
+                celda.data = None; celda.on_click = None; celda.bgcolor = None; celda.border = None
+                continue
+            f_str = f"{dia:02d}/{mes:02d}/{anio}"
+            cant = conteos.get(f_str, 0)
+            bg, tc = c["superficie"], c["texto"]
+            if cant >= 6: bg, tc = c["rojo"], "white"
+            elif cant >= 4: bg, tc = c["amarillo"], "black"
+            elif cant >= 1: bg, tc = c["verde"], "white"
+            numero, citas = celda.content.controls
+            numero.value = str(dia); numero.color = tc
+            citas.value = f"{cant} citas"; citas.color = tc; citas.visible = cant > 0
+            celda.bgcolor = bg
+            celda.border = ft.border.all(2, c["acento"]) if f_str == fecha_elegida[0] else None
+            celda.data = f_str; celda.on_click = al_tocar_celda_peque
+        
+        txt_mes_anio.value = f"{MESES[mes]} {anio}"
+        txt_mes_anio.color = c["acento"]
+        metricas.contar_controles("controles.mostrar_cal_peque", cont_dias_cal)
+        if dlg_cal_peque[0] and dlg_cal_peque[0].open: page.update(cont_dias_cal, txt_mes_anio)
+
+    def mover_cal_peque(delta):
+        cal_estado['mes'] += delta
+        if cal_estado['mes'] > 12: cal_estado['mes']=1; cal_estado['anio']+=1
+        elif cal_estado['mes'] < 1: cal_estado['mes']=12; cal_estado['anio']-=1
+        construir_cal_peque()
+
+    @cronometrar("seleccionar_fecha")
+    def seleccionar_fecha(f):
+        fecha_elegida[0] = f
+        btn_fecha.text = f
+        filtrar_fecha(f)
+        cargar_citas_en_grid()
+        dlg_cal_peque[0].open = False
+        actualizar_sugerencia()
+        page.update()
+
+    def abrir_cal_peque(e):
+        # El diálogo también se reusa: al volver a abrirlo solo cambian sus colores
+        c = obtener_tema()
+        construir_cal_peque()
+        if dlg_cal_peque[0] is None:
+            dlg_cal_peque[0] = ft.AlertDialog(
+                content_padding=10,
+                title=ft.Row([
+                    ft.IconButton("arrow_back_ios", icon_size=15, on_click=lambda _: mover_cal_peque(-1)),
+                    txt_mes_anio,
+                    ft.IconButton("arrow_forward_ios", icon_size=15, on_click=lambda _: mover_cal_peque(1))
+                ], alignment="spaceBetween"),
+                content=ft.Container(width=320, height=350, content=cont_dias_cal)
+            )
+        dlg = dlg_cal_peque[0]
+        dlg.bgcolor = c["fondo"]
+        for flecha in (dlg.title.controls[0], dlg.title.controls[2]): flecha.icon_color = c["acento"]
+        page.open(dlg)
+
+    # --- REPORTES ---
+    # Solo leen ingresos_dia / ingresos_mes: unas decenas de filas sin importar el historial
+    def fila_reporte(etiqueta, citas, centavos, maximo, on_click=None):
+        ancho = 0 if not maximo else max(2, int(120 * max(centavos, 0) / maximo))
+        return ft.Container(
+            on_click=on_click, padding=ft.padding.symmetric(vertical=2),
+            content=ft.Row([
+                ft.Text(etiqueta, size=12, width=90),
+                ft.Container(width=ancho, height=10, border_radius=3),
+                ft.Text(f"{citas}", size=11, width=30, text_align="right"),
+                ft.Text(formato_dinero(centavos), size=12, weight="bold", expand=True, text_align="right"),
+            ], spacing=8)
+        )
+
+    def pintar_reporte():
+        c = obtener_tema()
+        txt_mes_reporte.color = c["texto"]; txt_total_mes.color = c["acento"]; txt_resumen_mes.color = c["texto_sec"]
+        txt_titulo_anio.color = c["texto_sec"]; txt_titulo_dias.color = c["texto_sec"]
+        for fila in lista_anio.controls + lista_dias.controls:
+            etiqueta, barra, citas, monto = fila.content.controls
+            etiqueta.color = c["texto"]; barra.bgcolor = c["acento"]
+            citas.color = c["texto_sec"]; monto.color = c["texto"]
+
+    @cronometrar("construir_reporte")
+    def construir_reporte():
+        mes, anio = reporte_estado["mes"], reporte_estado["anio"]
+        tareas.lanzar("reporte", lambda: cache_meses.ingresos(mes, anio),
+                      lambda datos: mostrar_reporte(mes, anio, *datos))
+
+    @cronometrar("mostrar_reporte")
+    def mostrar_reporte(mes, anio, por_dia, por_mes):
+        citas_mes, total_mes = por_mes.get(mes, (0, 0))
+        txt_mes_reporte.value = f"{MESES[mes]} {anio}"
+        txt_total_mes.value = formato_dinero(total_mes)
+        promedio = formato_dinero(total_mes // citas_mes) if citas_mes else formato_dinero(0)
+        txt_resumen_mes.value = f"{citas_mes} citas · promedio {promedio}"
+        txt_titulo_anio.value = f"AÑO {anio}  ·  {formato_dinero(sum(v[1] for v in por_mes.values()))}"
+
+        maximo = max((v[1] for v in por_mes.values()), default=0)
+        lista_anio.controls = [
+            fila_reporte(MESES[m][:3], *por_mes.get(m, (0, 0)), maximo, on_click=lambda e, m=m: ir_a_mes_reporte(m))
+            for m in range(1, 13)]
+        maximo = max((v[1] for v in por_dia.values()), default=0)
+        lista_dias.controls = [
+            fila_reporte(f"{dia[8:]}/{dia[5:7]}", citas, centavos, maximo)
+            for dia, (citas, centavos) in sorted(por_dia.items())]
+        pintar_reporte()
+        metricas.contar_controles("controles.mostrar_reporte", lista_anio, lista_dias)
+        tab_reportes.update()
+
+    def mover_reporte(delta):
+        reporte_estado['mes'] += delta
+        if reporte_estado['mes'] > 12: reporte_estado['mes']=1; reporte_estado['anio']+=1
+        elif reporte_estado['mes'] < 1: reporte_estado['mes']=12; reporte_estado['anio']-=1
+        construir_reporte()
+
+    def ir_a_mes_reporte(mes):
+        reporte_estado['mes'] = mes
+        construir_reporte()
+
+    def reporte_visible():
+        return tabs_control.selected_index == 2
+
+    def al_cambiar_tab(e):
+        if not datos_listos[0]: return  # La sección 7 arma la pestaña visible al terminar
+        if tabs_control.selected_index == 1 and not cal_construido[0]: construir_cal_grande()
+        if reporte_visible(): construir_reporte()
+
+    # --- CATÁLOGO DE SERVICIOS ---
+    def abrir_catalogo(e):
+        c = obtener_tema()
+        filas = ft.Column(spacing=5, scroll=ft.ScrollMode.AUTO, height=320)
+
+        def quitar(e):
+            e.control.data["activo"] = 0
+            e.control.data["fila"].visible = False
+            filas.update()
+
+        def fila_servicio(id_s=None, nombre="", minutos="", centavos=0, base=0):
+            datos = {"id": id_s, "base": base, "activo": 1}
+            fila = ft.Row([
+                ft.TextField(value=nombre, label="Base" if base else "Servicio", expand=True, dense=True),
+                ft.TextField(value=str(minutos), label="Min", width=65, dense=True, keyboard_type=ft.KeyboardType.NUMBER),
+                ft.TextField(value=f"{centavos / 100:g}" if centavos else "", label="$", width=80, dense=True, keyboard_type=ft.KeyboardType.NUMBER),
+                ft.IconButton("delete", icon_size=18, icon_color=c["texto_sec"], visible=not base, data=datos, on_click=quitar),
+            ], data=datos)
+            datos["fila"] = fila
+            return fila
+
+        def agregar(e):
+            filas.controls.append(fila_servicio()); filas.update()
+
+        def guardar(e):
+            nuevas = []
+            for orden, fila in enumerate(filas.controls):
+                d = fila.data
+                nombre, minutos, precio = (t.value.strip() for t in fila.controls[:3])
+                if not d["activo"]:
+                    if d["id"] is not None: nuevas.append((d["id"], nombre, int(minutos or 0), 0, d["base"], orden, 0))
+                    continue
+                if not nombre or not minutos.isdigit():
+                    mostrar_alerta("Error", "Cada servicio necesita nombre y minutos", True); return
+                nuevas.append((d["id"], nombre, int(minutos), costo_a_centavos(precio) or 0, d["base"], orden, 1))
+            try: catalogo.guardar(nuevas)
+            except Exception as ex: mostrar_alerta("Error", str(ex), True); return
+            page.close(dlg)
+            # Chips nuevos; la selección conserva solo lo que sigue en el catálogo
+            opcionales = catalogo.opcionales()
+            seleccion.intersection_update(s[0] for s in opcionales)
+            duracion_actual[0] = catalogo.duracion(seleccion)
+            fila_chips.controls = [crear_chip(s) for s in opcionales]
+            actualizar_estilos()
+            if hora_inicio[0]: recalcular_finalizacion()
+            else: actualizar_sugerencia()
+            page.update()
+
+        filas.controls = [fila_servicio(*s) for s in catalogo.servicios()]
+        dlg = ft.AlertDialog(
+            bgcolor=c["fondo"],
+            title=ft.Text("Servicios", color=c["texto"]),
+            content=ft.Container(width=380, content=filas),
+            actions=[ft.TextButton("Agregar", icon="add", on_click=agregar),
+                     ft.TextButton("Cancelar", on_click=lambda e: page.close(dlg)),
+                     ft.TextButton("Guardar", on_click=guardar)],
+        )
+        page.open(dlg)
+
+    def abrir_recursos(e):
+        # Mismo esquema que el catálogo: quitar desactiva (las citas viejas siguen mostrando el nombre)
+        c = obtener_tema()
+        filas = ft.Column(spacing=5, scroll=ft.ScrollMode.AUTO, height=260)
+
+        def quitar(e):
+            e.control.data["activo"] = 0
+            e.control.data["fila"].visible = False
+            filas.update()
+
+        def fila_recurso(id_r=None, nombre=""):
+            datos = {"id": id_r, "activo": 1}
+            fila = ft.Row([
+                ft.TextField(value=nombre, label="Persona o silla", expand=True, dense=True),
+                ft.IconButton("delete", icon_size=18, icon_color=c["texto_sec"], data=datos, on_click=quitar),
+            ], data=datos)
+            datos["fila"] = fila
+            return fila
+
+        def agregar(e):
+            filas.controls.append(fila_recurso()); filas.update()
+
+        def guardar(e):
+            nuevas = []
+            for orden, fila in enumerate(filas.controls):
+                d = fila.data
+                nombre = fila.controls[0].value.strip()
+                if not d["activo"]:
+                    if d["id"] is not None: nuevas.append((d["id"], nombre, orden, 0))
+                    continue
+                if not nombre: mostrar_alerta("Error", "Cada recurso necesita un nombre", True); return
+                nuevas.append((d["id"], nombre, orden, 1))
+            try: recursos.guardar(nuevas)
+            except Exception as ex: mostrar_alerta("Error", str(ex), True); return
+            page.close(dlg)
+            cargar_recursos()
+            if hora_inicio[0] is None: actualizar_sugerencia()
+            if cal_construido[0]: construir_cal_grande()
+            cargar_citas_en_grid()  # Las tarjetas muestran el nombre
+            page.update()
+
+        filas.controls = [fila_recurso(*r) for r in recursos.activos()]
+        dlg = ft.AlertDialog(
+            bgcolor=c["fondo"],
+            title=ft.Text("Personal y sillas", color=c["texto"]),
+            content=ft.Container(width=340, content=filas),
+            actions=[ft.TextButton("Agregar", icon="add", on_click=agregar),
+                     ft.TextButton("Cancelar", on_click=lambda e: page.close(dlg)),
+                     ft.TextButton("Guardar", on_click=guardar)],
+        )
+        page.open(dlg)
+
+    # --- TIEMPO ---
+    def calcular_horas(hora_obj):
+        ahora = datetime.datetime.now()
+        dt_inicio = datetime.datetime.combine(ahora.date(), hora_obj)
+        dt_fin = dt_inicio + datetime.timedelta(minutes=duracion_actual[0])
+        return dt_inicio.strftime("%I:%M %p"), dt_fin.strftime("%I:%M %p")
+
+    def al_cambiar_hora(e):
+        if time_picker.value:
+            c = obtener_tema(); i, f = calcular_horas(time_picker.value)
+            hora_inicio[0] = i; hora_fin[0] = f
+            txt_hora_display.value = f"{i} - {f}"; txt_hora_display.color = c["acento"]
+            page.update()
+            
+    def al_cambiar_opciones(e):
+        if time_picker.value: al_cambiar_hora(None)
+        if hora_inicio[0] is None: actualizar_sugerencia()
+
+    def al_cargar_imagen(e):
+        if e.files:
+            # Copia propia (por hash) para no depender de que el archivo original siga ahí. Una foto
+            # de varios MB tarda: se hashea y copia en el pool, y la etiqueta cambia al terminar
+            origen = e.files[0].path
+            lbl_imagen.value = "Copiando diseño..."; lbl_imagen.color = obtener_tema()["texto_sec"]
+            lbl_imagen.update()
+            tareas.lanzar("imagen", lambda: almacen.guardar(origen), mostrar_imagen_cargada, imagen_fallida)
+
+    def mostrar_imagen_cargada(ruta):
+        c = obtener_tema()
+        ruta_imagen[0] = ruta
+        lbl_imagen.value = "Diseño OK"; lbl_imagen.color = c["acento"]
+        icono_img.color = c["acento"]; page.update()
+
+    def imagen_fallida(ex):
+        # Vuelve a lo que había antes de elegir la foto
+        lbl_imagen.value = "Diseño OK" if ruta_imagen[0] else "Sin diseño"
+        lbl_imagen.color = obtener_tema()["acento" if ruta_imagen[0] else "texto_sec"]
+        mostrar_alerta("Error", str(ex), True)
+
+    # --- BOTONES ---
+    time_picker = ft.TimePicker(on_change=al_cambiar_hora, time_picker_entry_mode="dial")
+    file_picker = ft.FilePicker(on_result=al_cargar_imagen)
+    page.overlay.extend([time_picker, file_picker])
+
+    btn_catalogo = ft.IconButton("tune", icon_size=18, tooltip="Editar servicios", on_click=abrir_catalogo)
+    btn_recursos = ft.IconButton("groups", icon_size=18, tooltip="Personal y sillas", on_click=abrir_recursos)
+    btn_sugerencia = ft.ElevatedButton(text="Sugerir Hora", icon="auto_awesome", visible=False, on_click=aplicar_sugerencia)
+    btn_fecha = ft.ElevatedButton(text=fecha_elegida[0], icon="calendar_month", height=45, on_click=abrir_cal_peque)
+    btn_hora = ft.ElevatedButton("Hora", icon="access_time", height=45, on_click=lambda _: page.open(time_picker))
+    btn_imagen = ft.Container(content=ft.Row([icono_img, lbl_imagen], alignment="center"), padding=10, border_radius=10, on_click=lambda _: file_picker.pick_files())
+    btn_guardar = ft.ElevatedButton("AGENDAR", icon="check", height=50, on_click=guardar_accion)
+    btn_cancelar = ft.TextButton("Cancelar", visible=False, icon="close", on_click=lambda _: limpiar_formulario())
+    btn_cal_ant = ft.IconButton("arrow_back_ios", on_click=lambda _: mover_cal_grande(-1))
+    btn_cal_sig = ft.IconButton("arrow_forward_ios", on_click=lambda _: mover_cal_grande(1))
+    btn_rep_ant = ft.IconButton("arrow_back_ios", on_click=lambda _: mover_reporte(-1))
+    btn_rep_sig = ft.IconButton("arrow_forward_ios", on_click=lambda _: mover_reporte(1))
+    # Todo lo que consulta la BD, el catálogo o las cachés queda deshabilitado hasta la sección 7
+    # (la BD se abre en paralelo con el primer frame; antes daban NameError dentro del pool)
+    esperan_datos = [txt_cliente, txt_buscar, btn_fecha, btn_hora, btn_imagen, btn_guardar, btn_catalogo,
+                     btn_recursos, btn_cal_ant, btn_cal_sig, btn_rep_ant, btn_rep_sig]
+    for control in esperan_datos: control.disabled = True
+    
+    btn_ver_todas.on_click = resetear_filtro
+    txt_buscar.on_change = al_buscar
+    txt_cliente.on_change = al_escribir_cliente
+    grid_citas.on_scroll = al_desplazar
+    dd_recurso.on_change = al_cambiar_recurso
+    dd_recurso_cal.on_change = al_filtrar_recurso_cal
+
+    tab_reportes = ft.Container(
+        padding=10,
+        content=ft.Column([
+            ft.Row([btn_rep_ant, txt_mes_reporte, btn_rep_sig], alignment="center"),
+            ft.Container(ft.Column([txt_total_mes, txt_resumen_mes], spacing=0, horizontal_alignment="center"), alignment=ft.alignment.center),
+            ft.Divider(height=10, color="transparent"),
+            ft.Container(padding=ft.padding.symmetric(horizontal=15), content=ft.Column([
+                txt_titulo_anio, lista_anio,
+                ft.Divider(height=10, color="transparent"),
+                txt_titulo_dias, lista_dias,
+            ])),
+        ], scroll=ft.ScrollMode.AUTO)
+    )
+
+    # --- TABS ---
+    tabs_control = ft.Tabs(
+        selected_index=0, animation_duration=300, on_change=al_cambiar_tab,
+        tabs=[
+            ft.Tab(
+                text="AGENDAR", icon="edit_calendar",
+                content=ft.Container(
+                    padding=10,
+                    content=ft.Column([
+                        ft.Container(padding=20, content=ft.Column([
+                            txt_cliente, sugerencias_cliente, txt_costo,
+                            # Chips en Fila con ajuste automático y centrado
+                            ft.Row([ft.Container(fila_chips, expand=True), btn_catalogo], vertical_alignment=ft.CrossAxisAlignment.CENTER),
+                            
+                            ft.Row([btn_fecha, btn_hora], alignment="spaceBetween"),
+                            ft.Container(txt_hora_display, alignment=ft.alignment.center),
+                            ft.Row([dd_recurso, btn_recursos], alignment="end", vertical_alignment=ft.CrossAxisAlignment.CENTER),
+                            dd_repetir,
+                            ft.Container(btn_sugerencia, alignment=ft.alignment.center),
+                            ft.Divider(height=5, color="transparent"),
+                            btn_imagen,
+                            ft.Divider(height=10, color="transparent"),
+                            ft.Column([btn_guardar, btn_cancelar], horizontal_alignment="stretch")
+                        ])),
+                        ft.Container(padding=ft.padding.symmetric(horizontal=25), content=ft.Row([txt_titulo_lista, btn_ver_todas], alignment="spaceBetween")),
+                        ft.Container(padding=ft.padding.symmetric(horizontal=25), content=txt_buscar),
+                        grid_citas
+                    ], scroll=ft.ScrollMode.AUTO, on_scroll=al_desplazar, on_scroll_interval=100)
+                )
+            ),
+            ft.Tab(
+                text="CALENDARIO", icon="calendar_month",
+                content=ft.Container(
+                    padding=10,
+                    content=ft.Column([
+                        ft.Row([btn_cal_ant, txt_mes_anio_grande, btn_cal_sig], alignment="center"),
+                        ft.Row([dd_recurso_cal], alignment="center"),
+                        grid_cal_grande
+                    ])
+                )
+            ),
+            ft.Tab(text="REPORTES", icon="insights", content=tab_reportes),
+        ], expand=1
+    )
+
+    # --- ESTILOS ---
+    @cronometrar("actualizar_estilos")
+    def actualizar_estilos():
+        c = obtener_tema()
+        page.bgcolor = c["fondo"]; page.theme_mode = c["modo"]
+        titulo_app.color = c["acento"]; btn_tema.icon = c["icono"]; btn_tema.icon_color = c["texto"]
+        
+        for t in [txt_cliente, txt_costo, txt_buscar]:
+            t.bgcolor = c["superficie"]; t.color = c["texto"]
+            t.cursor_color = c["acento"]; t.focused_border_color = c["acento"]
+            t.label_style = ft.TextStyle(color=c["texto_sec"]); t.prefix_icon_color = c["texto"]
+            t.border_color = "transparent"
+        for dd in (dd_repetir, dd_recurso, dd_recurso_cal):
+            dd.bgcolor = c["superficie"]; dd.color = c["texto"]; dd.border_color = "transparent"
+            dd.focused_border_color = c["acento"]; dd.label_style = ft.TextStyle(color=c["texto_sec"])
+        for b in sugerencias_cliente.controls:
+            b.style = ft.ButtonStyle(color=c["acento"], side=ft.BorderSide(1, c["borde"]))
+        
+        # Estilos Chips Interactivos
+        for container in fila_chips.controls:
+            if container.data in seleccion:
+                container.bgcolor = c["acento"]
+                container.content.color = "black" if estado_tema["actual"] == "oscuro" else "white"
+                container.border = None
+            else:
+                container.bgcolor = "transparent"
+                container.content.color = c["texto"]
+                container.border = ft.border.all(1, c["acento"])
+        btn_catalogo.icon_color = c["texto_sec"]; btn_recursos.icon_color = c["texto_sec"]
+
+        txt_hora_display.color = c["acento"] if hora_inicio[0] else c["texto_sec"]
+        lbl_imagen.color = c["acento"] if ruta_imagen[0] else c["texto_sec"]; icono_img.color = c["acento"]
+        
+        estilo_sec = ft.ButtonStyle(bgcolor=c["superficie"], color=c["acento"], shape=ft.RoundedRectangleBorder(radius=10))
+        btn_fecha.style = estilo_sec; btn_hora.style = estilo_sec; btn_imagen.bgcolor = c["superficie"]
+        btn_sugerencia.style = ft.ButtonStyle(side=ft.BorderSide(1, c["acento"])); btn_sugerencia.color = c["acento"]; btn_sugerencia.bgcolor = c["superficie"]
+        btn_guardar.bgcolor = c["acento"]; btn_guardar.color = "black" if estado_tema["actual"] == "oscuro" else "white"
+        btn_cancelar.style = ft.ButtonStyle(color=c["texto"])
+        
+        tabs_control.label_color = c["acento"]; tabs_control.unselected_label_color = c["texto_sec"]
+        tabs_control.indicator_color = c["acento"]; tabs_control.divider_color = "transparent"
+        page.theme = ft.Theme(color_scheme=ft.ColorScheme(primary=c["acento"], surface=c["superficie"], background=c["fondo"]), use_material3=True)
+
+    @cronometrar("cambiar_tema_accion")
+    def cambiar_tema_accion(e):
+        estado_tema["actual"] = "claro" if estado_tema["actual"] == "oscuro" else "oscuro"
+        # Solo se repintan los controles existentes: sin consultas ni controles nuevos
+        actualizar_estilos(); pintar_lista(); pintar_cal_grande(); pintar_reporte(); page.update()
+
+    btn_tema.on_click = cambiar_tema_accion
+
+    # --- 6. MONTAJE (primer frame: todavía sin datos) ---
+    actualizar_estilos()
+    page.add(ft.Column([
+        ft.Container(
+            padding=ft.padding.symmetric(horizontal=20, vertical=10),
+            content=ft.Row([
+                logo_img, 
+                titulo_app, 
+                btn_tema
+            ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN, vertical_alignment=ft.CrossAxisAlignment.CENTER)
+        ),
+        tabs_control
+    ], expand=True))
+    reportar_arranque("primer_frame")
+
+    # --- 7. DATOS ---
+    repo = bd_lista.result()
+    motor = obtener_disponibilidad(repo)
+    cache_meses = obtener_cache_meses(repo)
+    cache_dias = obtener_cache_dias(repo)
+    catalogo = obtener_catalogo(repo)
+    recurrencias = obtener_recurrencias(repo)
+    recursos = obtener_recursos(repo)
+    almacen = obtener_almacen(os.path.join(os.path.dirname(repo.ruta), DIR_IMAGENES))
+    configurar_desde_entorno(repo)  # Servidor y/o cliente de sincronización (AGENDA_SYNC_*)
+    archivo.configurar_desde_entorno(repo)  # Citas viejas a citas_archivo.db, solo con AGENDA_ARCHIVO_DIAS
+
+    # Avisos de escritura del repositorio (de esta y de otras sesiones) y recordatorios
+    repo.suscribir(al_cambiar_cita)
+    recordatorios = obtener_recordatorios(repo)
+    if recordatorios: recordatorios.suscribir(mostrar_recordatorio)
+    def al_cerrar(e):
+        repo.desuscribir(al_cambiar_cita)
+        if recordatorios: recordatorios.desuscribir(mostrar_recordatorio)
+    page.on_close = al_cerrar
+
+    fila_chips.controls = [crear_chip(s) for s in catalogo.opcionales()]
+    duracion_actual[0] = catalogo.duracion(seleccion)
+    cargar_recursos()
+    for control in esperan_datos: control.disabled = False
+    datos_listos[0] = True
+    actualizar_estilos()
+    page.update()
+    # Solo la primera página de hoy; el calendario grande espera a que se abra su pestaña
+    refrescar_todo()
+    al_cambiar_tab(None)  # Si cambiaron de pestaña mientras cargaba
+
+# --- FIX FINAL PARA THREADS ---
+if __name__ == "__main__":
     ft.app(target=main, assets_dir="assets")
\ No newline at end of file
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# --- INSTRUMENTACIÓN (OPCIONAL) ---
+# Tiempos por consulta SQL, por manejador y por page.update(), más el número de
+# controles creados en cada reconstrucción. Desactivada no hace más que mirar un flag.
+#
+#   AGENDA_METRICAS=1                       activa al arrancar
+#   AGENDA_METRICAS_UMBRAL_MS=50            umbral del log de operaciones lentas
+#   AGENDA_METRICAS_LOG=operaciones_lentas.log
+
+VENTANA = 500  # Últimas muestras por serie (para percentiles)
+
+estado = {"activo": False, "umbral_ms": 100.0, "archivo": "operaciones_lentas.log"}
+
+_series = {}
+_lock = threading.Lock()
+_etiquetas_sql = {}
+log_lento = logging.getLogger("agenda.lento")
+log_lento.propagate = False
+
+
+class _Serie:
+    __slots__ = ("n", "total", "maximo", "ultimos")
+
+    def __init__(self):
+        self.n = 0; self.total = 0.0; self.maximo = 0.0
+        self.ultimos = deque(maxlen=VENTANA)
+
+    def agregar(self, valor):
+        self.n += 1; self.total += valor
+        if valor > self.maximo: self.maximo = valor
+        self.ultimos.append(valor)
+
+
+class _Nulo:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+NULO = _Nulo()
+
+
+class _Medidor:
+    __slots__ = ("nombre", "inicio")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registrar(self.nombre, (time.perf_counter() - self.inicio) * 1000)
+        return False
+
+
+def activar(umbral_ms=None, archivo=None):
+    if umbral_ms is not None: estado["umbral_ms"] = float(umbral_ms)
+    if archivo is not None: estado["archivo"] = archivo
+    for h in list(log_lento.handlers):
+        log_lento.removeHandler(h); h.close()
+    manejador = logging.FileHandler(estado["archivo"], encoding="utf-8", delay=True)
+    manejador.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    log_lento.addHandler(manejador)
+    log_lento.setLevel(logging.INFO)
+    estado["activo"] = True
+
+
+def desactivar():
+    estado["activo"] = False
+
+
+def reiniciar():
+    with _lock: _series.clear()
+
+
+# --- REGISTRO ---
+def registrar(nombre, ms):
+    if not estado["activo"]: return
+    with _lock:
+        serie = _series.get(nombre)
+        if serie is None: serie = _series[nombre] = _Serie()
+        serie.agregar(ms)
+    if ms >= estado["umbral_ms"]:
+        log_lento.info("%s %.1f ms", nombre, ms)
+
+
+def contar(nombre, cantidad):
+    if not estado["activo"]: return
+    with _lock:
+        serie = _series.get(nombre)
+        if serie is None: serie = _series[nombre] = _Serie()
+        serie.agregar(cantidad)
+
+
+def _contar_arbol(control):
+    return 1 + sum(_contar_arbol(h) for h in control._get_children())
+
+
+def contar_controles(nombre, *raices):
+    # Solo recorre el árbol si la instrumentación está activa
+    if estado["activo"]: contar(nombre, sum(_contar_arbol(r) for r in raices))
+
+
+def medir(nombre):
+    return _Medidor(nombre) if estado["activo"] else NULO
+
+
+def medir_sql(sql):
+    if not estado["activo"]: return NULO
+    etiqueta = _etiquetas_sql.get(sql)
+    if etiqueta is None:
+        etiqueta = _etiquetas_sql[sql] = "sql:" + " ".join(sql.split())[:80]
+    return _Medidor(etiqueta)
+
+
+def cronometrar(nombre):
+    def decorador(funcion):
+        @wraps(funcion)
+        def envuelta(*args, **kwargs):
+            if not estado["activo"]: return funcion(*args, **kwargs)
+            with _Medidor(nombre): return funcion(*args, **kwargs)
+        return envuelta
+    return decorador
+
+
+def instrumentar_pagina(page):
+    # page.update() también recibe los control.update(); se mide todo el envío al cliente.
+    # Se instala siempre y mira estado["activo"] en cada llamada, como cronometrar
+    original = page.update
+    def update(*controls):
+        if not estado["activo"]: return original(*controls)
+        with _Medidor("page.update"): return original(*controls)
+    page.update = update
+
+
+# --- CONSULTA ---
+def resumen():
+    # {nombre: {n, media, p50, p95, max}} (ms, o controles para las series 'controles.*')
+    salida = {}
+    with _lock:
+        copia = {k: (s.n, s.total, s.maximo, sorted(s.ultimos)) for k, s in _series.items()}
+    for nombre, (n, total, maximo, ultimos) in sorted(copia.items()):
+        salida[nombre] = {
+            "n": n, "media": round(total / n, 3),
+            "p50": round(ultimos[len(ultimos) // 2], 3),
+            "p95": round(ultimos[min(len(ultimos) - 1, int(len(ultimos) * 0.95))], 3),
+            "max": round(maximo, 3),
+        }
+    return salida
+
+
+def tabla():
+    filas = [f"{'operación':<84} {'n':>7} {'media':>9} {'p95':>9} {'max':>9}"]
+    for nombre, s in resumen().items():
+        filas.append(f"{nombre:<84} {s['n']:>7} {s['media']:>9} {s['p95']:>9} {s['max']:>9}")
+    return "\n".join(filas)
+
+
+if os.environ.get("AGENDA_METRICAS") == "1":
+    activar(os.environ.get("AGENDA_METRICAS_UMBRAL_MS"), os.environ.get("AGENDA_METRICAS_LOG"))
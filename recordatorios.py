@@ -0,0 +1,172 @@
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import shlex
+import subprocess
+import threading
+import time
+
+from recurrencia import Recurrencias
+from tiempo import fecha_a_iso, hora_a_minutos
+
+# --- RECORDATORIOS ---
+# Aviso N minutos antes de cada cita. Solo los de la ventana próxima (unos días) viven en
+# un min-heap ordenado por momento de aviso, y un único hilo duerme hasta el primero: entre
+# avisos no hay sondeo ni lecturas. Cada escritura (de esta sesión, de otra o de la
+# sincronización) llega por Repositorio.suscribir y mete o saca solo esa cita; al cerrar la
+# ventana se lee la siguiente con una consulta por rango (índice dia, min_ini).
+#
+# AGENDA_RECORDATORIO_MIN=30 (0 = sin recordatorios).
+# AGENDA_RECORDATORIO_CMD="notify-send Agenda": además, se ejecuta con el texto del aviso
+# como último argumento (notificación del sistema).
+
+MINUTOS = 30
+VENTANA_DIAS = 7
+MAX_ESPERA = 300  # Tope de cada espera: tras suspender el equipo, el reloj monótono se atrasa
+
+log = logging.getLogger("agenda.recordatorios")
+
+
+def inicio_de(fila):
+    # Hora de inicio de la cita (segundos epoch, hora local) o None
+    iso, minutos = fecha_a_iso(fila[3]), hora_a_minutos(fila[4])
+    if iso is None or minutos is None: return None
+    return (datetime.datetime.fromisoformat(iso) + datetime.timedelta(minutes=minutos)).timestamp()
+
+
+def _epoch(d):
+    return datetime.datetime.combine(d, datetime.time()).timestamp()
+
+
+def mensaje(fila):
+    return f"{fila[1]} a las {fila[4]}"
+
+
+class Recordatorios:
+    def __init__(self, repo, minutos=MINUTOS, ventana=VENTANA_DIAS, comando=None):
+        self.repo = repo
+        self.recurrencias = Recurrencias(repo)
+        self.minutos = minutos
+        self.ventana = datetime.timedelta(days=ventana)
+        self.comando = comando
+        self.cond = threading.Condition()
+        self.heap = []         # (momento, n, id); las entradas que quedaron viejas se saltan al salir
+        self.vigentes = {}     # id -> (momento, fila)
+        self.hasta = None      # Fin (exclusivo) de la ventana cargada, como fecha
+        self.version = 0       # Sube con cada aviso del repositorio (una carga que se cruzó se repite)
+        self.recargar = False  # Una serie o carga masiva cambió: el hilo relee la ventana
+        self.orden = itertools.count()
+        self.oyentes = []
+        self.despertares = 0   # Veces que el hilo despertó (benchmark)
+        self._hilo = None
+
+    # --- CICLO DE VIDA ---
+    def iniciar(self):
+        with self.cond:
+            if self._hilo is not None: return
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="recordatorios")
+        self.repo.suscribir(self.al_cambiar)
+        self._cargar(datetime.date.today(), reemplazar=True)
+        self._hilo.start()
+
+    def suscribir(self, oyente):
+        self.oyentes.append(oyente)
+
+    def desuscribir(self, oyente):
+        if oyente in self.oyentes: self.oyentes.remove(oyente)
+
+    def pendientes(self):
+        with self.cond:
+            return len(self.vigentes)
+
+    # --- HEAP ---
+    def _cargar(self, desde, reemplazar):
+        # Lee [desde, desde + ventana) y un día más: una cita temprana del día siguiente avisa
+        # antes de medianoche. Si entre la lectura y el armado llegó una escritura, se relee
+        while True:
+            with self.cond: version = self.version
+            hasta = desde + self.ventana
+            iso_desde, iso_hasta = desde.isoformat(), (hasta + datetime.timedelta(days=1)).isoformat()
+            filas = self.repo.citas_rango(iso_desde, iso_hasta) + self.recurrencias.filas_rango(iso_desde, iso_hasta)
+            with self.cond:
+                if self.version != version: continue
+                if reemplazar: self.heap, self.vigentes = [], {}
+                self.hasta = hasta
+                for fila in filas: self._agregar(fila)
+                self.cond.notify()
+                return
+
+    def _agregar(self, fila):
+        # Con self.cond tomado. Solo entra si su aviso cae dentro de la ventana
+        if self.hasta is None: return  # Aún sin ventana: la carga en curso se repite y la incluye
+        inicio = inicio_de(fila)
+        ahora = time.time()
+        if inicio is None or inicio <= ahora: return
+        momento = max(inicio - self.minutos * 60, ahora)  # Abierta tarde: avisa ya
+        if momento >= _epoch(self.hasta): return
+        self.vigentes[fila[0]] = (momento, fila)
+        heapq.heappush(self.heap, (momento, next(self.orden), fila[0]))
+
+    def al_cambiar(self, cambio):
+        # Corre en el hilo de quien escribió: solo toca el heap; una recarga la hace nuestro hilo
+        with self.cond:
+            self.version += 1
+            if cambio.accion == "recargar": self.recargar = True
+            else:
+                self.vigentes.pop(cambio.id, None)
+                if cambio.despues: self._agregar(cambio.despues)
+            self.cond.notify()
+
+    # --- HILO ---
+    def _bucle(self):
+        while True:
+            vencidos, extender = [], None
+            with self.cond:
+                recargar, self.recargar = self.recargar, False
+                ahora = time.time()
+                while self.heap and self.heap[0][0] <= ahora:
+                    momento, _, id_cita = heapq.heappop(self.heap)
+                    actual = self.vigentes.get(id_cita)
+                    if actual is not None and actual[0] == momento:
+                        del self.vigentes[id_cita]
+                        vencidos.append(actual[1])
+                fin = _epoch(self.hasta)
+                if ahora >= fin:
+                    extender = self.hasta
+                elif not vencidos and not recargar:
+                    siguiente = self.heap[0][0] if self.heap else fin
+                    self.cond.wait(min(siguiente - ahora, MAX_ESPERA))
+                    self.despertares += 1
+                    continue
+            for fila in vencidos: self._avisar(fila)
+            if recargar or extender is not None:
+                try:
+                    if recargar: self._cargar(datetime.date.today(), reemplazar=True)
+                    else: self._cargar(extender, reemplazar=False)
+                except Exception as ex:
+                    log.warning("no se pudo leer la ventana siguiente: %s", ex)
+                    time.sleep(MAX_ESPERA)
+
+    def _avisar(self, fila):
+        for oyente in list(self.oyentes):
+            try: oyente(fila)
+            except: pass  # Una sesión cerrada o rota no frena a las demás
+        if self.comando:
+            try: subprocess.Popen([*shlex.split(self.comando), mensaje(fila)])
+            except Exception as ex: log.warning("notificación local falló: %s", ex)
+
+
+_recordatorios = [None]
+_recordatorios_lock = threading.Lock()
+
+def obtener_recordatorios(repo):
+    # Uno por proceso: cada sesión se suscribe para mostrar su aviso. None si están apagados
+    with _recordatorios_lock:
+        if _recordatorios[0] is None:
+            minutos = int(os.environ.get("AGENDA_RECORDATORIO_MIN", MINUTOS))
+            if minutos <= 0: return None
+            _recordatorios[0] = Recordatorios(repo, minutos, comando=os.environ.get("AGENDA_RECORDATORIO_CMD"))
+            _recordatorios[0].iniciar()
+        return _recordatorios[0]
@@ -0,0 +1,200 @@
+import calendar
+import datetime
+import json
+import threading
+from tiempo import fecha_a_iso, iso_a_fecha, rango_minutos
+
+# --- CITAS RECURRENTES ---
+# Una serie es una sola fila en 'reglas' (cada N semanas o cada N meses desde 'inicio').
+# Las ocurrencias no se guardan: se calculan solo para la ventana que se está mirando
+# (un día, un mes). Saber si una fecha cae en la serie es aritmética, así que los choques
+# se revisan sin recorrer años de fechas futuras.
+
+HORIZONTE_SERIES = 366  # Días en los que se buscan choques entre dos series
+
+
+def id_ocurrencia(regla_id, iso):
+    # Las ocurrencias no tienen fila propia: su id es texto y nunca coincide con el de una cita
+    return f"r{regla_id}@{iso}"
+
+
+def es_ocurrencia(id_cita):
+    return isinstance(id_cita, str)
+
+
+def partir_id(id_cita):
+    # 'r12@2025-03-05' -> (12, '2025-03-05')
+    regla, iso = id_cita[1:].split("@")
+    return int(regla), iso
+
+
+def _meses(d):
+    return d.year * 12 + d.month - 1
+
+
+def comparten(recurso_a, recurso_b):
+    # Dos citas compiten por el horario si usan el mismo recurso o si alguna no tiene
+    # (sin recurso = todo el salón)
+    return recurso_a is None or recurso_b is None or recurso_a == recurso_b
+
+
+def _dia_del_mes(dia, anio, mes):
+    # Mensual: mismo número de día; en los meses más cortos, el último
+    return datetime.date(anio, mes, min(dia, calendar.monthrange(anio, mes)[1]))
+
+
+class Regla:
+    __slots__ = ("id", "cliente", "costo", "hora_inicio", "hora_fin", "imagen", "min_ini", "min_fin",
+                 "duracion", "servicios", "frecuencia", "intervalo", "inicio", "fin", "recurso_id", "omitidas")
+
+    def __init__(self, fila, omitidas=()):
+        (self.id, self.cliente, self.costo, self.hora_inicio, self.hora_fin, self.imagen, self.min_ini, self.min_fin,
+         self.duracion, servicios, self.frecuencia, self.intervalo, inicio, fin, self.recurso_id) = fila
+        self.servicios = json.loads(servicios or "[]")
+        self.inicio = datetime.date.fromisoformat(inicio)
+        self.fin = datetime.date.fromisoformat(fin) if fin else None
+        self.omitidas = set(omitidas)
+
+    def cae_en(self, d):
+        # O(1): no depende de cuántas ocurrencias hubo antes de 'd'
+        if d < self.inicio or (self.fin is not None and d > self.fin): return False
+        if self.frecuencia == "semanal":
+            if (d - self.inicio).days % (7 * self.intervalo): return False
+        else:
+            if (_meses(d) - _meses(self.inicio)) % self.intervalo: return False
+            if d != _dia_del_mes(self.inicio.day, d.year, d.month): return False
+        return d.isoformat() not in self.omitidas
+
+    def fechas(self, desde, hasta):
+        # Ocurrencias en [desde, hasta): salta directo a la primera de la ventana
+        desde = max(desde, self.inicio)
+        if self.fin is not None: hasta = min(hasta, self.fin + datetime.timedelta(days=1))
+        if desde >= hasta: return
+        if self.frecuencia == "semanal":
+            paso = 7 * self.intervalo
+            d = self.inicio + datetime.timedelta(days=-(-(desde - self.inicio).days // paso) * paso)
+            while d < hasta:
+                if d.isoformat() not in self.omitidas: yield d
+                d += datetime.timedelta(days=paso)
+            return
+        m = _meses(desde) - _meses(self.inicio)
+        m += -m % self.intervalo
+        while True:
+            anio, mes = divmod(_meses(self.inicio) + m, 12)
+            d = _dia_del_mes(self.inicio.day, anio, mes + 1)
+            if d >= hasta: return
+            if d >= desde and d.isoformat() not in self.omitidas: yield d
+            m += self.intervalo
+
+    def fila(self, d):
+        # Misma forma que COLUMNAS, para que la lista la muestre como cualquier cita
+        iso = d.isoformat()
+        return (id_ocurrencia(self.id, iso), self.cliente, self.costo, iso_a_fecha(iso),
+                self.hora_inicio, self.hora_fin, self.imagen, self.recurso_id)
+
+    def descripcion(self):
+        if self.frecuencia == "semanal":
+            return "Cada semana" if self.intervalo == 1 else f"Cada {self.intervalo} semanas"
+        return "Cada mes" if self.intervalo == 1 else f"Cada {self.intervalo} meses"
+
+
+class Recurrencias:
+    def __init__(self, repo):
+        self.repo = repo
+        self.lock = threading.Lock()
+        self._reglas = {}
+        self._version = None
+
+    def reglas(self):
+        # {id: Regla}. Son pocas: se leen enteras y se vuelven a leer solo si alguna cambió
+        version = self.repo.version_reglas
+        with self.lock:
+            if self._version == version: return self._reglas
+        filas, omitidas = self.repo.reglas()
+        reglas = {f[0]: Regla(f, omitidas.get(f[0], ())) for f in filas}
+        with self.lock:
+            self._reglas, self._version = reglas, version
+        return reglas
+
+    def regla(self, regla_id):
+        return self.reglas().get(regla_id)
+
+    def _de(self, recurso):
+        # Filtro de los calendarios: con recurso, solo las series asignadas a él
+        reglas = self.reglas().values()
+        return reglas if recurso is None else [r for r in reglas if r.recurso_id == recurso]
+
+    def _del_dia(self, iso, recurso=None):
+        d = datetime.date.fromisoformat(iso)
+        return sorted((r for r in self._de(recurso) if r.cae_en(d)), key=lambda r: r.min_ini), d
+
+    def _rango(self, iso_desde, iso_hasta, recurso=None):
+        # [(fecha, Regla)] en [desde, hasta), por día y hora de inicio
+        desde, hasta = datetime.date.fromisoformat(iso_desde), datetime.date.fromisoformat(iso_hasta)
+        ocurrencias = [(d, r) for r in self._de(recurso) for d in r.fechas(desde, hasta)]
+        ocurrencias.sort(key=lambda o: (o[0], o[1].min_ini))
+        return ocurrencias
+
+    # --- VENTANAS (lista del día, calendarios, motor) ---
+    def filas_del_dia(self, fecha):
+        reglas, d = self._del_dia(fecha_a_iso(fecha))
+        return [r.fila(d) for r in reglas]
+
+    def filas_rango(self, iso_desde, iso_hasta):
+        return [r.fila(d) for d, r in self._rango(iso_desde, iso_hasta)]
+
+    def nombres_del_dia(self, fecha, recurso=None):
+        return [r.cliente for r in self._del_dia(fecha_a_iso(fecha), recurso)[0]]
+
+    def agregar_nombres(self, citas_mes, iso_desde, iso_hasta, recurso=None):
+        # Suma las ocurrencias del mes a {'dd/mm/yyyy': [clientes]}
+        for d, r in self._rango(iso_desde, iso_hasta, recurso):
+            citas_mes.setdefault(iso_a_fecha(d.isoformat()), []).append(r.cliente)
+        return citas_mes
+
+    def horarios_del_dia(self, iso):
+        # [(id, min_ini, min_fin, recurso_id)] como Repositorio.horarios_del_dia
+        reglas, d = self._del_dia(iso)
+        return [(id_ocurrencia(r.id, iso), r.min_ini, r.min_fin, r.recurso_id) for r in reglas]
+
+    def horarios_rango(self, iso_desde, iso_hasta):
+        return [(d.isoformat(), id_ocurrencia(r.id, d.isoformat()), r.min_ini, r.min_fin, r.recurso_id)
+                for d, r in self._rango(iso_desde, iso_hasta)]
+
+    def choca(self, fecha, ini, fin, excluir=None, recurso=None):
+        # ¿La cita pisa una ocurrencia de ese día? (dentro de Repositorio.reserva)
+        m_ini, m_fin = rango_minutos(ini, fin)
+        if m_ini is None: return False
+        reglas, d = self._del_dia(fecha_a_iso(fecha))
+        return any(r.min_ini < m_fin and r.min_fin > m_ini and comparten(r.recurso_id, recurso)
+                   and id_ocurrencia(r.id, d.isoformat()) != excluir for r in reglas)
+
+    # --- CHOQUES DE UNA SERIE NUEVA ---
+    def choque(self, frecuencia, intervalo, fecha, ini, fin, recurso=None):
+        # Primera fecha ('dd/mm/yyyy') en la que la serie pisaría algo, o None.
+        # Contra las citas sueltas: solo los días futuros que ya tienen algo a esa hora
+        # (una consulta) filtrados con cae_en. Contra otras series: ventana acotada
+        iso = fecha_a_iso(fecha)
+        m_ini, m_fin = rango_minutos(ini, fin)
+        if iso is None or m_ini is None: return None
+        nueva = Regla((None, None, None, ini, fin, None, m_ini, m_fin, None, None, frecuencia, intervalo, iso, None, recurso))
+        primera = None
+        for dia in self.repo.dias_ocupados_desde(iso, m_ini, m_fin, recurso):
+            d = datetime.date.fromisoformat(dia)
+            if nueva.cae_en(d): primera = d; break
+        hasta = nueva.inicio + datetime.timedelta(days=HORIZONTE_SERIES)
+        for r in self.reglas().values():
+            if not (r.min_ini < m_fin and r.min_fin > m_ini and comparten(r.recurso_id, recurso)): continue
+            for d in nueva.fechas(nueva.inicio, min(hasta, primera) if primera else hasta):
+                if r.cae_en(d): primera = d; break
+        return iso_a_fecha(primera.isoformat()) if primera else None
+
+
+_recurrencias = [None]
+_recurrencias_lock = threading.Lock()
+
+def obtener_recurrencias(repo):
+    with _recurrencias_lock:
+        if _recurrencias[0] is None:
+            _recurrencias[0] = Recurrencias(repo)
+        return _recurrencias[0]
@@ -0,0 +1,50 @@
+import threading
+
+# --- PERSONAL Y SILLAS ---
+# Los recursos que pueden atender una cita (una manicurista, una silla). Como el catálogo
+# de servicios: se leen una vez y quedan en memoria hasta que se guardan.
+# Sin recursos cargados la agenda funciona como antes: un solo salón.
+
+
+class Recursos:
+    def __init__(self, repo):
+        self.repo = repo
+        self.lock = threading.Lock()
+        self._todos = None
+
+    def todos(self):
+        # [(id, nombre, activo)], también los desactivados
+        with self.lock:
+            if self._todos is None:
+                self._todos = self.repo.recursos()
+            return self._todos
+
+    def activos(self):
+        return [(i, nombre) for i, nombre, activo in self.todos() if activo]
+
+    def ids(self):
+        # Los que puede proponer una sugerencia; [None] = el salón entero
+        return [i for i, _ in self.activos()] or [None]
+
+    def nombre(self, recurso_id):
+        for i, nombre, _ in self.todos():
+            if i == recurso_id: return nombre
+        return None
+
+    def guardar(self, filas):
+        self.repo.guardar_recursos(filas)
+        self.invalidar()
+
+    def invalidar(self):
+        with self.lock:
+            self._todos = None
+
+
+_recursos = [None]
+_recursos_lock = threading.Lock()
+
+def obtener_recursos(repo):
+    with _recursos_lock:
+        if _recursos[0] is None:
+            _recursos[0] = Recursos(repo)
+        return _recursos[0]
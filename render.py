@@ -0,0 +1,118 @@
+import os
+import threading
+
+import metricas
+
+# --- ENVÍO AGRUPADO AL CLIENTE ---
+# Cada page.update() / control.update() viaja al cliente como un mensaje con el diff, y un
+# solo toque mandaba varios seguidos (estilos, hora, sugerencia...). Aquí update() solo marca
+# el control como sucio; lo marcado sale junto en un único page.update(*controles):
+#   - al terminar el manejador del evento (o la función envuelta con Render.accion), o
+#   - fuera de una acción (callbacks de tareas, avisos de otras sesiones), en el siguiente
+#     tick del loop; espera lock_ui, así un callback entero sale en un mensaje.
+# Un page.update() sin controles marca la página entera (Flet igual solo envía lo que cambió).
+#
+# AGENDA_RENDER_AGRUPADO=0 vuelve al envío inmediato (para comparar).
+# Con AGENDA_METRICAS=1, la serie 'mensajes:<manejador>' cuenta los mensajes de cada interacción.
+
+
+def _raices(controles):
+    # Sin los que ya salieron de la página ni los que van dentro de otro marcado (su diff ya los incluye)
+    marcados = {id(c) for c in controles}
+    salida = []
+    for control in controles:
+        if control.page is None: continue
+        padre = control.parent
+        while padre is not None and id(padre) not in marcados: padre = padre.parent
+        if padre is None: salida.append(control)
+    return salida
+
+
+def _nombre(funcion, args):
+    nombre = getattr(funcion, "__qualname__", "?").replace("<locals>.", "").removeprefix("main.")
+    evento = args[0] if args else None
+    if nombre.endswith("<lambda>") and getattr(evento, "control", None) is not None:
+        nombre += f"@{type(evento.control).__name__}"
+    return nombre
+
+
+class Render:
+    def __init__(self, page, lock_ui, agrupado=None):
+        self.page = page
+        self.lock_ui = lock_ui
+        self.enviar = page.update       # El original (o el de metricas): un mensaje por llamada
+        self.correr = page.run_thread   # Ejecuta en el executor de Flet, vía el loop
+        self.abrir = page.open
+        self.agrupado = os.environ.get("AGENDA_RENDER_AGRUPADO", "1") != "0" if agrupado is None else agrupado
+        self.lock = threading.Lock()
+        self.sucios = {}            # id -> control, en orden de marca
+        self.todo = False
+        self.programado = False
+        self.hilo = threading.local()  # nivel de acción y mensajes enviados, por hilo
+        self.mensajes = 0
+
+    def instalar(self):
+        self.page.update = self.update
+        self.page.run_thread = self.run_thread
+        self.page.open = self.open
+
+    # --- MARCAR ---
+    def update(self, *controls):
+        if not self.agrupado:
+            self._enviar(*controls); return
+        with self.lock:
+            if controls:
+                for control in controls: self.sucios[id(control)] = control
+            else:
+                self.todo = True
+            directo = getattr(self.hilo, "directos", 0)
+            if directo: self.hilo.directos = directo - 1
+            elif getattr(self.hilo, "nivel", 0) or self.programado: return
+            else: self.programado = True
+        if directo: self.vaciar()
+        else: self.correr(self.vaciar)
+
+    def open(self, control):
+        # Page.open agrega el diálogo y enseguida llama a su update(), que exige que ya esté
+        # en la página: ese primer envío sale en el momento (con lo que estuviera marcado) y ya
+        # lleva el diálogo, así que su marca posterior sobra
+        self.hilo.directos = 1
+        try: self.abrir(control)
+        finally: self.hilo.directos = 0
+        with self.lock: self.sucios.pop(id(control), None)
+
+    def run_thread(self, handler, *args):
+        # Así llegan los eventos de los controles: cada manejador es una acción
+        self.correr(self.accion(handler), *args)
+
+    def accion(self, funcion):
+        def envuelta(*args):
+            nivel = getattr(self.hilo, "nivel", 0)
+            if nivel == 0: self.hilo.enviados = 0
+            self.hilo.nivel = nivel + 1
+            try:
+                return funcion(*args)
+            finally:
+                self.hilo.nivel = nivel
+                if nivel == 0:
+                    self.vaciar()
+                    metricas.contar(f"mensajes:{_nombre(funcion, args)}", self.hilo.enviados)
+        return envuelta
+
+    # --- ENVIAR ---
+    def vaciar(self):
+        # lock_ui primero: si un callback sigue cambiando controles, se espera a que termine
+        with self.lock_ui:
+            with self.lock:
+                todo, sucios = self.todo, list(self.sucios.values())
+                self.todo, self.sucios, self.programado = False, {}, False
+            if todo: self._enviar()
+            elif sucios:
+                raices = _raices(sucios)
+                if raices: self._enviar(*raices)
+
+    def _enviar(self, *controls):
+        with self.lock_ui:
+            self.mensajes += 1
+            self.hilo.enviados = getattr(self.hilo, "enviados", 0) + 1
+            self.enviar(*controls)
@@ -0,0 +1,912 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import metricas
+from tiempo import fecha_a_iso, rango_minutos, limites_mes
+
+# --- ACCESO A DATOS ---
+# Una sola conexión por proceso, compartida por todos los manejadores de main().
+# sqlite3 reutiliza las sentencias preparadas mientras el texto SQL sea idéntico,
+# por eso todas las consultas viven aquí como constantes.
+
+RUTA_BD = "citas.db"
+TAM_PAGINA = 30
+MAX_SUGERENCIAS = 6
+MAX_AVISOS_SYNC = 200
+REINTENTOS_OCUPADA = 5  # BEGIN IMMEDIATE que sigue encontrando la BD bloqueada tras el busy_timeout
+
+COLUMNAS = "id, cliente, costo, fecha, hora_inicio, hora_fin, imagen, recurso_id"
+
+# 'fecha', 'hora_inicio' y 'hora_fin' se conservan solo para mostrar.
+# Las búsquedas usan 'dia' (ISO) y 'min_ini'/'min_fin' (minutos desde medianoche).
+# 'costo' (texto tal como se escribió) va acompañado de 'centavos' (entero) para sumar.
+# SQL_INSERTAR recibe 10 parámetros; (uid, reloj, origen) los agrega el repositorio, así
+# quien arma filas para insertar_lote no sabe nada de sincronización.
+SQL_INSERTAR = """INSERT INTO citas (cliente, costo, fecha, hora_inicio, hora_fin, imagen, dia, min_ini, min_fin, centavos)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+# 'duracion' (minutos de los servicios) se guarda; sin ella vale lo que ocupa el horario.
+# 'recurso_id' (quién o qué silla la atiende) es opcional: sin recurso la cita ocupa todo el salón.
+SQL_INSERTAR_MARCADO = """INSERT INTO citas (cliente, costo, fecha, hora_inicio, hora_fin, imagen, dia, min_ini, min_fin, centavos,
+                                             uid, reloj, origen, duracion, recurso_id)
+                          VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, coalesce(?14, ?9 - ?8), ?15)"""
+SQL_ACTUALIZAR = """UPDATE citas SET cliente=?1, costo=?2, fecha=?3, hora_inicio=?4, hora_fin=?5, imagen=?6,
+                    dia=?7, min_ini=?8, min_fin=?9, centavos=?10, reloj=?11, origen=?12, duracion=coalesce(?13, ?9 - ?8),
+                    recurso_id=?15
+                    WHERE id=?14"""
+SQL_ELIMINAR = "DELETE FROM citas WHERE id=?"
+SQL_POR_ID = f"SELECT {COLUMNAS} FROM citas WHERE id=?"
+# Choque contra lo guardado (índice dia, min_ini); 'excluir' es la cita que se está editando.
+# Con recurso solo chocan las de ese recurso y las sin asignar; sin recurso, cualquiera
+SQL_CHOQUE = """SELECT 1 FROM citas WHERE dia=?1 AND min_ini < ?2 AND min_fin > ?3 AND id IS NOT ?4
+                AND (?5 IS NULL OR recurso_id IS NULL OR recurso_id = ?5) LIMIT 1"""
+SQL_HORARIOS_DIA = "SELECT id, min_ini, min_fin, recurso_id FROM citas WHERE dia=? AND min_ini IS NOT NULL ORDER BY min_ini"
+SQL_HORARIOS_RANGO = """SELECT dia, id, min_ini, min_fin, recurso_id FROM citas
+                        WHERE dia >= ? AND dia < ? AND min_ini IS NOT NULL ORDER BY dia, min_ini"""
+SQL_CITAS_DIA = f"SELECT {COLUMNAS} FROM citas WHERE dia=? ORDER BY id DESC"
+SQL_CITAS_RANGO = f"SELECT {COLUMNAS} FROM citas WHERE dia >= ? AND dia < ? AND min_ini IS NOT NULL ORDER BY dia, min_ini"
+SQL_CITAS_DIA_PRIMERA = f"SELECT {COLUMNAS} FROM citas WHERE dia=? ORDER BY id DESC LIMIT ?"
+SQL_CITAS_DIA_PAGINA = f"SELECT {COLUMNAS} FROM citas WHERE dia=? AND id < ? ORDER BY id DESC LIMIT ?"
+SQL_PRIMERA_PAGINA = f"SELECT {COLUMNAS} FROM citas ORDER BY id DESC LIMIT ?"
+SQL_PAGINA = f"SELECT {COLUMNAS} FROM citas WHERE id < ? ORDER BY id DESC LIMIT ?"
+SQL_NOMBRES_DIA = "SELECT cliente FROM citas WHERE dia=? ORDER BY min_ini"
+SQL_NOMBRES_MES = "SELECT fecha, cliente FROM citas WHERE dia >= ? AND dia < ? ORDER BY dia, min_ini"
+# Calendarios filtrados por recurso (índice recurso_id, dia, min_ini)
+SQL_NOMBRES_DIA_RECURSO = "SELECT cliente FROM citas WHERE recurso_id=? AND dia=? ORDER BY min_ini"
+SQL_NOMBRES_MES_RECURSO = "SELECT fecha, cliente FROM citas WHERE recurso_id=? AND dia >= ? AND dia < ? ORDER BY dia, min_ini"
+SQL_CONTEOS_MES = "SELECT fecha, COUNT(*) FROM citas WHERE dia >= ? AND dia < ? GROUP BY dia"
+# Búsqueda por cliente: FTS5 entrega los rowid ya ordenados, así que cada página es un LIMIT
+SQL_BUSCAR_PRIMERA = f"""SELECT {COLUMNAS} FROM citas WHERE id IN (
+                             SELECT rowid FROM citas_fts WHERE citas_fts MATCH ? ORDER BY rowid DESC LIMIT ?)
+                         ORDER BY id DESC"""
+SQL_BUSCAR_PAGINA = f"""SELECT {COLUMNAS} FROM citas WHERE id IN (
+                            SELECT rowid FROM citas_fts WHERE citas_fts MATCH ? AND rowid < ? ORDER BY rowid DESC LIMIT ?)
+                        ORDER BY id DESC"""
+# Reportes: solo leen los acumulados, nunca la tabla citas
+SQL_INGRESOS_DIAS = "SELECT dia, citas, centavos FROM ingresos_dia WHERE dia >= ? AND dia < ? ORDER BY dia"
+SQL_INGRESOS_MESES = "SELECT mes, citas, centavos FROM ingresos_mes WHERE mes >= ? AND mes < ? ORDER BY mes"
+SQL_TRIGGER_FTS_AI = """CREATE TRIGGER IF NOT EXISTS citas_fts_ai AFTER INSERT ON citas BEGIN
+                           INSERT INTO citas_fts(rowid, cliente) VALUES (new.id, new.cliente);
+                       END"""
+SQL_FTS_DESDE = "INSERT INTO citas_fts(rowid, cliente) SELECT id, cliente FROM citas WHERE id > ?"
+# Registro de cambios (sincronización): 'datos' es la fila visible en JSON, NULL si se borró
+SQL_REGISTRAR_FILAS = """INSERT INTO registro (uid, reloj, origen, datos)
+                         SELECT uid, reloj, origen, json_array(cliente, costo, fecha, hora_inicio, hora_fin, imagen, duracion,
+                             json((SELECT json_group_array(s.nombre) FROM cita_servicios cs
+                                   JOIN servicios s ON s.id = cs.servicio_id WHERE cs.cita_id = citas.id)),
+                             (SELECT r.nombre FROM recursos r WHERE r.id = citas.recurso_id))
+                         FROM citas WHERE id BETWEEN ? AND ?"""
+SQL_REGISTRAR_BORRADO = "INSERT INTO registro (uid, reloj, origen, datos) SELECT uid, ?, ?, NULL FROM citas WHERE id=?"
+SQL_REGISTRAR_TUMBA = "INSERT INTO registro (uid, reloj, origen, datos) VALUES (?, ?, ?, NULL)"
+SQL_REGISTRO_DESDE = "SELECT seq, uid, reloj, origen, datos FROM registro WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_REGISTRO_DESDE_SIN = "SELECT seq, uid, reloj, origen, datos FROM registro WHERE seq > ? AND origen != ? ORDER BY seq LIMIT ?"
+SQL_REGISTRO_PROPIO_DESDE = "SELECT seq, uid, reloj, origen, datos FROM registro WHERE seq > ? AND origen = ? ORDER BY seq LIMIT ?"
+SQL_ULTIMO_RELOJ = "SELECT coalesce(MAX(reloj), 0) FROM registro"
+SQL_VERSION_FILA = "SELECT id, reloj, origen FROM citas WHERE uid=?"
+SQL_VERSION_BORRADO = "SELECT reloj, origen FROM registro WHERE uid=? ORDER BY seq DESC LIMIT 1"
+SQL_ESTADO = "SELECT valor FROM sync_estado WHERE clave=?"
+SQL_GUARDAR_ESTADO = "INSERT INTO sync_estado (clave, valor) VALUES (?, ?) ON CONFLICT(clave) DO UPDATE SET valor=excluded.valor"
+# Catálogo de servicios
+SQL_SERVICIOS = "SELECT id, nombre, minutos, centavos, base FROM servicios WHERE activo = 1 ORDER BY orden, id"
+SQL_GUARDAR_SERVICIO = """INSERT INTO servicios (id, nombre, minutos, centavos, base, orden, activo) VALUES (?, ?, ?, ?, ?, ?, ?)
+                          ON CONFLICT(id) DO UPDATE SET nombre=excluded.nombre, minutos=excluded.minutos, centavos=excluded.centavos,
+                          base=excluded.base, orden=excluded.orden, activo=excluded.activo"""
+SQL_SERVICIOS_DE_CITA = "SELECT servicio_id FROM cita_servicios WHERE cita_id=?"
+SQL_DURACION_CITA = "SELECT duracion FROM citas WHERE id=?"
+SQL_BORRAR_SERVICIOS_CITA = "DELETE FROM cita_servicios WHERE cita_id=?"
+SQL_AGREGAR_SERVICIO_CITA = "INSERT OR IGNORE INTO cita_servicios (cita_id, servicio_id) VALUES (?, ?)"
+SQL_IDS_SERVICIOS = "SELECT id FROM servicios WHERE nombre IN (SELECT value FROM json_each(?))"
+# Personal y sillas
+SQL_RECURSOS = "SELECT id, nombre, activo FROM recursos ORDER BY orden, id"
+# Volver a cargar un nombre que se había quitado lo reactiva (mismo id: las citas viejas siguen apuntando a él)
+SQL_GUARDAR_RECURSO = """INSERT INTO recursos (id, nombre, orden, activo) VALUES (?, ?, ?, ?)
+                         ON CONFLICT(id) DO UPDATE SET nombre=excluded.nombre, orden=excluded.orden, activo=excluded.activo
+                         ON CONFLICT(nombre) DO UPDATE SET orden=excluded.orden, activo=excluded.activo"""
+SQL_ID_RECURSO = "SELECT id FROM recursos WHERE nombre=?"
+SQL_AUTOCOMPLETAR = """SELECT cliente FROM citas WHERE id IN (
+                           SELECT rowid FROM citas_fts WHERE citas_fts MATCH ? ORDER BY rowid DESC LIMIT ?)
+                       ORDER BY id DESC"""
+# Citas recurrentes: una fila por serie; las fechas sueltas que se borran o editan quedan como excepción
+SQL_REGLAS = """SELECT id, cliente, costo, hora_inicio, hora_fin, imagen, min_ini, min_fin, duracion, servicios,
+                       frecuencia, intervalo, inicio, fin, recurso_id FROM reglas"""
+SQL_EXCEPCIONES = "SELECT regla_id, dia FROM reglas_excepciones"
+SQL_INSERTAR_REGLA = """INSERT INTO reglas (cliente, costo, centavos, hora_inicio, hora_fin, imagen, min_ini, min_fin,
+                                            duracion, servicios, frecuencia, intervalo, inicio, fin, recurso_id)
+                        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, coalesce(?9, ?8 - ?7), ?10, ?11, ?12, ?13, ?14, ?15)"""
+SQL_OMITIR_OCURRENCIA = "INSERT OR IGNORE INTO reglas_excepciones (regla_id, dia) VALUES (?, ?)"
+SQL_TERMINAR_REGLA = "UPDATE reglas SET fin=? WHERE id=?"
+SQL_ELIMINAR_REGLA = "DELETE FROM reglas WHERE id=? AND inicio > ?"
+SQL_DIAS_OCUPADOS_DESDE = """SELECT DISTINCT dia FROM citas WHERE dia >= ?1 AND min_ini < ?2 AND min_fin > ?3
+                             AND (?4 IS NULL OR recurso_id IS NULL OR recurso_id = ?4) ORDER BY dia"""
+
+
+# --- ARCHIVO ---
+# Las citas más viejas que el horizonte viven en otro archivo (citas_archivo.db) adjunto
+# como 'archivo'. Lo que usa cada clic (lista sin filtro, calendarios de meses recientes,
+# choques, huecos) lee solo la BD caliente; un día, mes o búsqueda que puede tener citas
+# archivadas consulta las dos con UNION ALL. Los acumulados de ingresos se quedan en la
+# caliente y siguen contando lo archivado.
+COLUMNAS_TODAS = """id, cliente, costo, fecha, hora_inicio, hora_fin, imagen, dia, min_ini, min_fin, centavos,
+                    uid, reloj, origen, duracion, recurso_id"""
+
+
+def _con_archivo(columnas, condicion, orden, limite=""):
+    # La misma consulta sobre las dos BD; ORDER BY + LIMIT se resuelven mezclando ambas ya ordenadas
+    return (f"SELECT {columnas} FROM citas WHERE {condicion} UNION ALL "
+            f"SELECT {columnas} FROM archivo.citas WHERE {condicion} ORDER BY {orden}{limite}")
+
+
+SQL_CITAS_DIA_AMBAS = _con_archivo(COLUMNAS, "dia=?1", "id DESC")
+SQL_CITAS_DIA_PRIMERA_AMBAS = _con_archivo(COLUMNAS, "dia=?1", "id DESC", " LIMIT ?2")
+SQL_CITAS_DIA_PAGINA_AMBAS = _con_archivo(COLUMNAS, "dia=?1 AND id < ?2", "id DESC", " LIMIT ?3")
+SQL_PAGINA_AMBAS = _con_archivo(COLUMNAS, "id < ?1", "id DESC", " LIMIT ?2")
+SQL_NOMBRES_DIA_AMBAS = _con_archivo("cliente, min_ini", "dia=?1", "2")
+SQL_NOMBRES_MES_AMBAS = _con_archivo("fecha, cliente, dia, min_ini", "dia >= ?1 AND dia < ?2", "3, 4")
+SQL_NOMBRES_DIA_RECURSO_AMBAS = _con_archivo("cliente, min_ini", "recurso_id=?1 AND dia=?2", "2")
+SQL_NOMBRES_MES_RECURSO_AMBAS = _con_archivo("fecha, cliente, dia, min_ini", "recurso_id=?1 AND dia >= ?2 AND dia < ?3", "3, 4")
+SQL_CONTEOS_MES_AMBAS = f"SELECT fecha, COUNT(*) FROM ({_con_archivo('fecha, dia', 'dia >= ?1 AND dia < ?2', 'dia')}) GROUP BY dia"
+SQL_BUSCAR_AMBAS = f"""SELECT {COLUMNAS} FROM citas WHERE id IN (
+                           SELECT rowid FROM citas_fts WHERE citas_fts MATCH ?1 AND rowid < ?2 ORDER BY rowid DESC LIMIT ?3)
+                       UNION ALL
+                       SELECT {COLUMNAS} FROM archivo.citas WHERE id IN (
+                           SELECT rowid FROM archivo.citas_fts WHERE citas_fts MATCH ?1 AND rowid < ?2 ORDER BY rowid DESC LIMIT ?3)
+                       ORDER BY id DESC LIMIT ?3"""
+SQL_POR_ID_ARCHIVO = f"SELECT {COLUMNAS} FROM archivo.citas WHERE id=?"
+SQL_SERVICIOS_DE_CITA_ARCHIVO = "SELECT servicio_id FROM archivo.cita_servicios WHERE cita_id=?"
+SQL_DURACION_CITA_ARCHIVO = "SELECT duracion FROM archivo.citas WHERE id=?"
+SQL_ARCHIVO_LIMITES = "SELECT MAX(dia), MAX(id) FROM archivo.citas"
+# Mover un lote (ids en JSON). El DELETE dispara los triggers de la caliente (FTS, servicios,
+# ingresos); los ingresos del lote se vuelven a sumar porque las citas siguen existiendo
+SQL_LOTE_A_ARCHIVAR = "SELECT id FROM citas WHERE dia < ? ORDER BY dia LIMIT ?"
+SQL_ARCHIVAR_CITAS = f"""INSERT OR IGNORE INTO archivo.citas ({COLUMNAS_TODAS})
+                         SELECT {COLUMNAS_TODAS} FROM citas WHERE id IN (SELECT value FROM json_each(?))"""
+SQL_ARCHIVAR_SERVICIOS = """INSERT OR IGNORE INTO archivo.cita_servicios (cita_id, servicio_id)
+                            SELECT cita_id, servicio_id FROM cita_servicios WHERE cita_id IN (SELECT value FROM json_each(?))"""
+SQL_BORRAR_LOTE = "DELETE FROM citas WHERE id IN (SELECT value FROM json_each(?))"
+SQL_DEVOLVER_INGRESOS = """INSERT INTO {tabla} ({clave}, citas, centavos)
+                           SELECT {expr}, COUNT(*), coalesce(SUM(centavos), 0) FROM archivo.citas
+                           WHERE id IN (SELECT value FROM json_each(?)) GROUP BY 1
+                           ON CONFLICT({clave}) DO UPDATE SET citas = citas + excluded.citas, centavos = centavos + excluded.centavos"""
+# Volver a la caliente (una cita archivada que se edita, se borra o llega por sincronización)
+SQL_ARCHIVADA_POR_ID = "SELECT id, dia, centavos FROM archivo.citas WHERE id=?"
+SQL_ARCHIVADA_POR_UID = "SELECT id, dia, centavos FROM archivo.citas WHERE uid=?"
+SQL_DESARCHIVAR_CITA = f"INSERT OR IGNORE INTO citas ({COLUMNAS_TODAS}) SELECT {COLUMNAS_TODAS} FROM archivo.citas WHERE id=?"
+SQL_DESARCHIVAR_SERVICIOS = """INSERT OR IGNORE INTO cita_servicios (cita_id, servicio_id)
+                               SELECT cita_id, servicio_id FROM archivo.cita_servicios WHERE cita_id=?"""
+SQL_BORRAR_ARCHIVADA = "DELETE FROM archivo.citas WHERE id=?"
+# Carga masiva: los ingresos del lote se suman de una vez (GROUP BY) en vez de por trigger y fila
+SQL_SUMAR_INGRESOS_DESDE = """INSERT INTO {tabla} ({clave}, citas, centavos)
+                              SELECT {expr}, COUNT(*), coalesce(SUM(centavos), 0) FROM citas
+                              WHERE id > ? AND dia IS NOT NULL GROUP BY 1
+                              ON CONFLICT({clave}) DO UPDATE SET citas = citas + excluded.citas, centavos = centavos + excluded.centavos"""
+SQL_TRIGGER = "SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?"
+SQL_RESTAR_INGRESOS = "UPDATE {tabla} SET citas = citas - 1, centavos = centavos - coalesce(?2, 0) WHERE {clave} = {expr}"
+INGRESOS = (("ingresos_dia", "dia", "dia", "?1"), ("ingresos_mes", "mes", "substr(dia, 1, 7)", "substr(?1, 1, 7)"))
+
+
+# --- MIGRACIONES ---
+# PRAGMA user_version guarda la última migración aplicada. Solo se añaden al final.
+def _migracion_1(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS citas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente TEXT, costo TEXT, fecha TEXT,
+            hora_inicio TEXT, hora_fin TEXT, imagen TEXT
+        )
+    """)
+
+def _migracion_2(conn):
+    # Fecha ISO + minutos enteros, con índice compuesto para range scans por día/mes
+    existentes = {f[1] for f in conn.execute("PRAGMA table_info(citas)")}
+    for col, tipo in (("dia", "TEXT"), ("min_ini", "INTEGER"), ("min_fin", "INTEGER")):
+        if col not in existentes:
+            conn.execute(f"ALTER TABLE citas ADD COLUMN {col} {tipo}")
+    filas = conn.execute("SELECT id, fecha, hora_inicio, hora_fin FROM citas").fetchall()
+    conn.executemany("UPDATE citas SET dia=?, min_ini=?, min_fin=? WHERE id=?",
+                     [(fecha_a_iso(f), *rango_minutos(ini, fin), i) for i, f, ini, fin in filas])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_citas_dia_ini ON citas(dia, min_ini)")
+
+def _migracion_3(conn):
+    # Índice FTS5 de contenido externo sobre 'cliente' (sin acentos, con prefijos cortos
+    # precalculados); los triggers lo mantienen al día en insert / update / delete
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS citas_fts USING fts5(
+                        cliente, content='citas', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')""")
+    conn.execute(SQL_TRIGGER_FTS_AI)
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS citas_fts_ad AFTER DELETE ON citas BEGIN
+                        INSERT INTO citas_fts(citas_fts, rowid, cliente) VALUES ('delete', old.id, old.cliente);
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS citas_fts_au AFTER UPDATE OF cliente ON citas BEGIN
+                        INSERT INTO citas_fts(citas_fts, rowid, cliente) VALUES ('delete', old.id, old.cliente);
+                        INSERT INTO citas_fts(rowid, cliente) VALUES (new.id, new.cliente);
+                    END""")
+    conn.execute("INSERT INTO citas_fts(citas_fts) VALUES ('rebuild')")
+
+def _migracion_4(conn):
+    # Costo en centavos + acumulados por día y por mes. Los triggers los mantienen en cada
+    # escritura (también en las importaciones masivas), así un reporte lee decenas de filas
+    existentes = {f[1] for f in conn.execute("PRAGMA table_info(citas)")}
+    if "centavos" not in existentes:
+        conn.execute("ALTER TABLE citas ADD COLUMN centavos INTEGER")
+    filas = conn.execute("SELECT id, costo FROM citas").fetchall()
+    conn.executemany("UPDATE citas SET centavos=? WHERE id=?", [(costo_a_centavos(c), i) for i, c in filas])
+    for tabla, clave, expr in (("ingresos_dia", "dia", "{}.dia"), ("ingresos_mes", "mes", "substr({}.dia, 1, 7)")):
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {tabla} (
+                             {clave} TEXT PRIMARY KEY, citas INTEGER NOT NULL, centavos INTEGER NOT NULL)""")
+        sumar = f"""INSERT INTO {tabla} ({clave}, citas, centavos) VALUES ({expr.format("new")}, 1, coalesce(new.centavos, 0))
+                    ON CONFLICT({clave}) DO UPDATE SET citas = citas + 1, centavos = centavos + excluded.centavos;"""
+        restar = f"""UPDATE {tabla} SET citas = citas - 1, centavos = centavos - coalesce(old.centavos, 0)
+                         WHERE {clave} = {expr.format("old")};
+                     DELETE FROM {tabla} WHERE {clave} = {expr.format("old")} AND citas <= 0;"""
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {tabla}_ai AFTER INSERT ON citas WHEN new.dia IS NOT NULL BEGIN {sumar} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {tabla}_ad AFTER DELETE ON citas WHEN old.dia IS NOT NULL BEGIN {restar} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {tabla}_au_old AFTER UPDATE OF dia, centavos ON citas WHEN old.dia IS NOT NULL BEGIN {restar} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {tabla}_au_new AFTER UPDATE OF dia, centavos ON citas WHEN new.dia IS NOT NULL BEGIN {sumar} END")
+        conn.execute(f"DELETE FROM {tabla}")
+        conn.execute(f"""INSERT INTO {tabla} ({clave}, citas, centavos)
+                         SELECT {expr.format("citas")}, COUNT(*), coalesce(SUM(centavos), 0) FROM citas
+                         WHERE dia IS NOT NULL GROUP BY 1""")
+
+def _migracion_5(conn):
+    # Sincronización entre dispositivos: cada cita lleva un uid global y la versión que la
+    # escribió (reloj, origen); 'registro' es el log de cambios append-only con seq monótono
+    existentes = {f[1] for f in conn.execute("PRAGMA table_info(citas)")}
+    for col, tipo in (("uid", "TEXT"), ("reloj", "INTEGER"), ("origen", "TEXT")):
+        if col not in existentes:
+            conn.execute(f"ALTER TABLE citas ADD COLUMN {col} {tipo}")
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_estado (clave TEXT PRIMARY KEY, valor TEXT)")
+    conn.execute("INSERT OR IGNORE INTO sync_estado VALUES ('dispositivo', ?)", (uuid.uuid4().hex[:12],))
+    origen = conn.execute(SQL_ESTADO, ("dispositivo",)).fetchone()[0]
+    conn.execute("""CREATE TABLE IF NOT EXISTS registro (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT, uid TEXT NOT NULL,
+                        reloj INTEGER NOT NULL, origen TEXT NOT NULL, datos TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_uid ON registro(uid, seq)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_origen ON registro(origen, seq)")
+    # Lo que ya había entra al log como altas con reloj 0: cualquier edición posterior gana
+    conn.execute("UPDATE citas SET uid = ? || printf('%018x', id), reloj = 0, origen = ? WHERE uid IS NULL", (origen, origen))
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_citas_uid ON citas(uid)")
+    conn.execute("""INSERT INTO registro (uid, reloj, origen, datos)
+                    SELECT uid, reloj, origen, json_array(cliente, costo, fecha, hora_inicio, hora_fin, imagen) FROM citas""")
+
+def _migracion_6(conn):
+    # Catálogo de servicios (el que tiene base=1 va siempre incluido) y servicios de cada cita.
+    # Los valores iniciales son los que estaban escritos en el código
+    conn.execute("""CREATE TABLE IF NOT EXISTS servicios (
+                        id INTEGER PRIMARY KEY, nombre TEXT NOT NULL UNIQUE, minutos INTEGER NOT NULL,
+                        centavos INTEGER NOT NULL DEFAULT 0, base INTEGER NOT NULL DEFAULT 0,
+                        orden INTEGER NOT NULL DEFAULT 0, activo INTEGER NOT NULL DEFAULT 1)""")
+    conn.executemany("INSERT OR IGNORE INTO servicios (id, nombre, minutos, base, orden) VALUES (?, ?, ?, ?, ?)",
+                     [(1, "Manicura", 90, 1, 0), (2, "Diseño Dificil", 60, 0, 1), (3, "PediSpa", 45, 0, 2), (4, "Cejas", 60, 0, 3)])
+    conn.execute("""CREATE TABLE IF NOT EXISTS cita_servicios (
+                        cita_id INTEGER NOT NULL, servicio_id INTEGER NOT NULL,
+                        PRIMARY KEY (cita_id, servicio_id)) WITHOUT ROWID""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS cita_servicios_ad AFTER DELETE ON citas BEGIN
+                        DELETE FROM cita_servicios WHERE cita_id = old.id;
+                    END""")
+    if "duracion" not in {f[1] for f in conn.execute("PRAGMA table_info(citas)")}:
+        conn.execute("ALTER TABLE citas ADD COLUMN duracion INTEGER")
+    conn.execute("UPDATE citas SET duracion = min_fin - min_ini WHERE duracion IS NULL")
+
+def _migracion_7(conn):
+    # Citas recurrentes: la serie se guarda una vez (frecuencia + intervalo desde 'inicio',
+    # hasta 'fin' si lo hay); las ocurrencias se calculan al mirar un día o un mes
+    conn.execute("""CREATE TABLE IF NOT EXISTS reglas (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT, cliente TEXT, costo TEXT, centavos INTEGER,
+                        hora_inicio TEXT, hora_fin TEXT, imagen TEXT, min_ini INTEGER NOT NULL, min_fin INTEGER NOT NULL,
+                        duracion INTEGER, servicios TEXT NOT NULL DEFAULT '[]',
+                        frecuencia TEXT NOT NULL CHECK (frecuencia IN ('semanal', 'mensual')),
+                        intervalo INTEGER NOT NULL DEFAULT 1 CHECK (intervalo >= 1),
+                        inicio TEXT NOT NULL, fin TEXT)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS reglas_excepciones (
+                        regla_id INTEGER NOT NULL, dia TEXT NOT NULL,
+                        PRIMARY KEY (regla_id, dia)) WITHOUT ROWID""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS reglas_ad AFTER DELETE ON reglas BEGIN
+                        DELETE FROM reglas_excepciones WHERE regla_id = old.id;
+                    END""")
+
+def _migracion_8(conn):
+    # Al abrir, el reloj híbrido parte de MAX(reloj) del registro: con índice es una búsqueda, no un scan
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_reloj ON registro(reloj)")
+
+def _migracion_9(conn):
+    # Personal y sillas. Una cita (o serie) con recurso ocupa solo ese recurso; sin recurso (las
+    # de antes, o mientras no haya recursos cargados) ocupa todo el salón, como hasta ahora
+    conn.execute("""CREATE TABLE IF NOT EXISTS recursos (
+                        id INTEGER PRIMARY KEY, nombre TEXT NOT NULL UNIQUE,
+                        orden INTEGER NOT NULL DEFAULT 0, activo INTEGER NOT NULL DEFAULT 1)""")
+    for tabla in ("citas", "reglas"):
+        if "recurso_id" not in {f[1] for f in conn.execute(f"PRAGMA table_info({tabla})")}:
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN recurso_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_citas_recurso_dia ON citas(recurso_id, dia, min_ini)")
+
+def _preparar_archivo(conn):
+    # El archivo tiene su propio esquema (no pasa por MIGRACIONES; user_version 1 = creado):
+    # misma tabla citas con sus servicios e índice FTS para que la búsqueda también lo recorra
+    conn.execute("""CREATE TABLE IF NOT EXISTS archivo.citas (
+                         id INTEGER PRIMARY KEY, cliente TEXT, costo TEXT, fecha TEXT, hora_inicio TEXT, hora_fin TEXT,
+                         imagen TEXT, dia TEXT, min_ini INTEGER, min_fin INTEGER, centavos INTEGER, uid TEXT,
+                         reloj INTEGER, origen TEXT, duracion INTEGER, recurso_id INTEGER)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS archivo.idx_citas_dia_ini ON citas(dia, min_ini)")
+    conn.execute("CREATE INDEX IF NOT EXISTS archivo.idx_citas_recurso_dia ON citas(recurso_id, dia, min_ini)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS archivo.idx_citas_uid ON citas(uid)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS archivo.cita_servicios (
+                        cita_id INTEGER NOT NULL, servicio_id INTEGER NOT NULL,
+                        PRIMARY KEY (cita_id, servicio_id)) WITHOUT ROWID""")
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS archivo.citas_fts USING fts5(
+                        cliente, content='citas', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS archivo.citas_fts_ai AFTER INSERT ON citas BEGIN
+                        INSERT INTO citas_fts(rowid, cliente) VALUES (new.id, new.cliente);
+                    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS archivo.citas_ad AFTER DELETE ON citas BEGIN
+                        INSERT INTO citas_fts(citas_fts, rowid, cliente) VALUES ('delete', old.id, old.cliente);
+                        DELETE FROM cita_servicios WHERE cita_id = old.id;
+                    END""")
+
+
+def ruta_archivo(ruta):
+    # citas.db -> citas_archivo.db, en la misma carpeta
+    return os.path.splitext(ruta)[0] + "_archivo.db"
+
+
+MIGRACIONES = [_migracion_1, _migracion_2, _migracion_3, _migracion_4, _migracion_5, _migracion_6, _migracion_7,
+               _migracion_8, _migracion_9]
+
+
+def costo_a_centavos(texto):
+    # '$1,250.50' / '1.250,50' / '250' -> entero en centavos; None si no es un número.
+    # Con un solo separador seguido de exactamente 3 dígitos se toma como separador de miles
+    limpio = re.sub(r"[^\d.,-]", "", str(texto or ""))
+    if not re.search(r"\d", limpio): return None
+    negativo = limpio.startswith("-")
+    limpio = limpio.replace("-", "")
+    seps = [i for i, ch in enumerate(limpio) if ch in ".,"]
+    if seps:
+        ultimo = seps[-1]
+        decimales = limpio[ultimo + 1:]
+        mixtos = len({limpio[i] for i in seps}) > 1
+        if not mixtos and (len(decimales) == 3 or len(seps) > 1):
+            entero, decimales = limpio, ""  # Solo separadores de miles
+        else:
+            entero = limpio[:ultimo]
+        entero = re.sub(r"[.,]", "", entero)
+    else:
+        entero, decimales = limpio, ""
+    try:
+        valor = int(entero or "0") * 100 + int((decimales + "00")[:2] or "0")
+    except ValueError:
+        return None
+    return -valor if negativo else valor
+
+
+def expresion_fts(texto):
+    # 'ana lo' -> '"ana" "lo"*': las palabras ya terminadas van exactas (más baratas que un
+    # prefijo) y solo la última, la que se está escribiendo, como prefijo. Todas deben aparecer
+    palabras = re.findall(r"\w+", texto or "")
+    if not palabras: return ""
+    abierta = not texto[-1].isspace()
+    return " ".join(f'"{p}"*' if abierta and k == len(palabras) - 1 else f'"{p}"' for k, p in enumerate(palabras))
+
+
+class HorarioOcupado(Exception):
+    # La cita pisa otra: lo decide Repositorio.reserva dentro de la transacción de la escritura
+    pass
+
+
+class Cambio:
+    # Aviso de escritura: 'antes'/'despues' son filas completas (COLUMNAS) o None.
+    # accion='recargar' (cargas masivas, cambios de una serie): no trae filas; quien escucha
+    # descarta todo lo que tenga. 'choques': citas llegadas por sincronización que pisan otra
+    # del mismo horario y recurso (se aplican igual para converger; la UI lo avisa).
+    def __init__(self, accion, id_cita, antes, despues, choques=0):
+        self.accion = accion
+        self.id = id_cita
+        self.antes = antes
+        self.despues = despues
+        self.choques = choques
+
+
+class _ConexionMedida:
+    # Lo que entrega transaccion(): cada consulta pasa por metricas.medir_sql, igual que consultar(),
+    # así las escrituras también aparecen en el registro de consultas lentas
+    __slots__ = ("conn",)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=()):
+        with metricas.medir_sql(sql): return self.conn.execute(sql, params)
+
+    def executemany(self, sql, filas):
+        with metricas.medir_sql(sql): return self.conn.executemany(sql, filas)
+
+
+class Repositorio:
+    def __init__(self, ruta=RUTA_BD):
+        self.ruta = ruta
+        # isolation_level=None: nosotros abrimos y cerramos cada transacción (BEGIN/COMMIT)
+        self.conn = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, cached_statements=128)
+        self.medida = _ConexionMedida(self.conn)
+        self.lock = threading.RLock()
+        self._profundidad = 0
+        self._pendientes = []
+        self._oyentes = []
+        self.version_reglas = 0  # Sube con cada escritura de series (recurrencia.py relee al verla)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.migrar()
+        self.dispositivo = self.leer_estado("dispositivo")
+        self._reloj = self.consultar(SQL_ULTIMO_RELOJ)[0][0]
+        self.abrir_archivo()
+
+    def abrir_archivo(self):
+        # ATTACH va fuera de toda transacción. 'archivo_hasta' es el último día archivado y
+        # 'archivo_max_id' el mayor id (None = archivo vacío): lo que queda fuera ni lo mira
+        self.conn.execute("ATTACH DATABASE ? AS archivo", (ruta_archivo(self.ruta),))
+        self.conn.execute("PRAGMA archivo.journal_mode=WAL")
+        self.conn.execute("PRAGMA archivo.synchronous=NORMAL")
+        if self.conn.execute("PRAGMA archivo.user_version").fetchone()[0] < 1:
+            with self.transaccion() as conn:
+                _preparar_archivo(conn)
+                conn.execute("PRAGMA archivo.user_version = 1")
+        self.archivo_hasta, self.archivo_max_id = self.consultar(SQL_ARCHIVO_LIMITES)[0]
+
+    def _toca_archivo(self, iso_desde):
+        # ¿El rango que empieza en 'iso_desde' puede tener citas archivadas?
+        return self.archivo_hasta is not None and iso_desde is not None and iso_desde <= self.archivo_hasta
+
+    def _sigue_en_archivo(self, filas, limite):
+        # Una página por id (lista, búsqueda) necesita el archivo solo si alguna archivada puede
+        # caer en ella: la página quedó corta o llegó a ids que el archivo también tiene
+        return self.archivo_max_id is not None and (len(filas) < limite or filas[-1][0] < self.archivo_max_id)
+
+    def migrar(self):
+        with self.transaccion() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for n, migracion in enumerate(MIGRACIONES[version:], start=version + 1):
+                migracion(conn)
+                conn.execute(f"PRAGMA user_version = {n}")
+
+    @contextmanager
+    def transaccion(self):
+        # Las transacciones anidadas se funden en la más externa
+        avisos = []
+        with self.lock:
+            if self._profundidad == 0:
+                inicio = time.perf_counter() if metricas.estado["activo"] else None
+                self._empezar()
+            self._profundidad += 1
+            try:
+                yield self.medida
+            except:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self.conn.execute("ROLLBACK")
+                    self._pendientes.clear()
+                raise
+            else:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self.conn.execute("COMMIT")
+                    avisos, self._pendientes = self._pendientes, []
+                    if inicio is not None: metricas.registrar("sql:transaccion", (time.perf_counter() - inicio) * 1000)
+        # Los oyentes se ejecutan tras el COMMIT y fuera del lock
+        for cambio in avisos:
+            for oyente in list(self._oyentes):
+                try: oyente(cambio)
+                except: pass  # Un oyente roto no debe afectar a la escritura ni a los demás
+
+    def _empezar(self):
+        # IMMEDIATE: el lock de escritura se toma al empezar, así lo leído dentro de la
+        # transacción (p. ej. el choque de reserva) no cambia antes del COMMIT, tampoco desde
+        # otro proceso. Si otro escribe, sqlite espera (busy_timeout) y aquí se reintenta
+        for intento in range(REINTENTOS_OCUPADA):
+            try:
+                self.conn.execute("BEGIN IMMEDIATE"); return
+            except sqlite3.OperationalError as ex:
+                if "locked" not in str(ex) or intento == REINTENTOS_OCUPADA - 1: raise
+                time.sleep(0.05 * 2 ** intento)
+
+    @contextmanager
+    def reserva(self, fecha, ini, fin, excluir=None, recurso=None):
+        # Comprobar y escribir en una sola transacción: ninguna otra sesión (ni proceso)
+        # puede agendar entre la consulta y el INSERT. Lanza HorarioOcupado si choca
+        with self.transaccion() as conn:
+            m_ini, m_fin = rango_minutos(ini, fin)
+            if m_ini is not None and conn.execute(SQL_CHOQUE, (fecha_a_iso(fecha), m_fin, m_ini, excluir, recurso)).fetchone():
+                raise HorarioOcupado(fecha)
+            yield conn
+
+    def suscribir(self, oyente):
+        self._oyentes.append(oyente)
+
+    def desuscribir(self, oyente):
+        if oyente in self._oyentes: self._oyentes.remove(oyente)
+
+    def consultar(self, sql, params=()):
+        with self.lock, metricas.medir_sql(sql):
+            return self.conn.execute(sql, params).fetchall()
+
+    def cerrar(self):
+        with self.lock:
+            self.conn.close()
+
+    def conexion_lectura(self):
+        # Conexión aparte para lecturas largas (exportar): con WAL no bloquea a la principal.
+        # Con el archivo adjunto, igual que la principal
+        conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS archivo", (ruta_archivo(self.ruta),))
+        return conn
+
+    def notificar_recarga(self):
+        # Tras una escritura masiva se avisa una sola vez en vez de fila por fila
+        with self.transaccion():
+            self._pendientes.append(Cambio("recargar", None, None, None))
+
+    # --- CITAS ---
+    def obtener_cita(self, id_cita):
+        filas = self.consultar(SQL_POR_ID, (id_cita,))
+        if not filas and self.archivo_hasta is not None: filas = self.consultar(SQL_POR_ID_ARCHIVO, (id_cita,))
+        return filas[0] if filas else None
+
+    def horarios_del_dia(self, fecha):
+        # [(id, min_ini, min_fin, recurso_id)] ordenado por inicio
+        return self.consultar(SQL_HORARIOS_DIA, (fecha_a_iso(fecha),))
+
+    def horarios_rango(self, iso_desde, iso_hasta):
+        # [(dia, id, min_ini, min_fin, recurso_id)] para varios días en una sola consulta
+        return self.consultar(SQL_HORARIOS_RANGO, (iso_desde, iso_hasta))
+
+    def citas_del_dia(self, fecha, antes_de_id=None, limite=None):
+        # Sin límite, el día entero; con límite, la misma paginación por id que pagina_citas
+        iso = fecha_a_iso(fecha)
+        ambas = self._toca_archivo(iso)
+        if limite is None: return self.consultar(SQL_CITAS_DIA_AMBAS if ambas else SQL_CITAS_DIA, (iso,))
+        if antes_de_id is None: return self.consultar(SQL_CITAS_DIA_PRIMERA_AMBAS if ambas else SQL_CITAS_DIA_PRIMERA, (iso, limite))
+        return self.consultar(SQL_CITAS_DIA_PAGINA_AMBAS if ambas else SQL_CITAS_DIA_PAGINA, (iso, antes_de_id, limite))
+
+    def citas_rango(self, iso_desde, iso_hasta):
+        # Filas completas de varios días (recordatorios); solo días recientes o futuros: sin archivo
+        return self.consultar(SQL_CITAS_RANGO, (iso_desde, iso_hasta))
+
+    def pagina_citas(self, antes_de_id=None, limite=TAM_PAGINA):
+        # Paginación por clave (keyset) sobre id: cada página cuesta lo mismo sin importar el total
+        if antes_de_id is None:
+            filas = self.consultar(SQL_PRIMERA_PAGINA, (limite,))
+        else:
+            filas = self.consultar(SQL_PAGINA, (antes_de_id, limite))
+        if self._sigue_en_archivo(filas, limite):
+            return self.consultar(SQL_PAGINA_AMBAS, (2 ** 62 if antes_de_id is None else antes_de_id, limite))
+        return filas
+
+    def _tic(self):
+        # Reloj híbrido: milisegundos de pared, pero nunca menor que lo último visto, tampoco
+        # por otra conexión al mismo archivo. Se llama dentro de la transacción de escritura
+        # (BEGIN IMMEDIATE): ningún otro puede tomar el mismo valor y repetir un uid
+        with self.lock:
+            ultimo = self.medida.execute(SQL_ULTIMO_RELOJ).fetchone()[0]
+            self._reloj = max(self._reloj + 1, ultimo + 1, int(time.time() * 1000))
+            return self._reloj
+
+    def _uid(self, reloj, k=0):
+        # Único entre dispositivos y creciente dentro de cada uno: el índice único crece por
+        # el final en vez de repartir inserciones al azar (como haría un uuid4)
+        return f"{self.dispositivo}{reloj:012x}{k:06x}"
+
+    def insertar_cita(self, cliente, costo, fecha, ini, fin, imagen, servicios=(), duracion=None, recurso=None):
+        with self.transaccion() as conn:
+            reloj = self._tic()
+            id_cita = conn.execute(SQL_INSERTAR_MARCADO, (cliente, costo, fecha, ini, fin, imagen, fecha_a_iso(fecha),
+                                                          *rango_minutos(ini, fin), costo_a_centavos(costo),
+                                                          self._uid(reloj), reloj, self.dispositivo, duracion, recurso)).lastrowid
+            self._escribir_servicios(conn, id_cita, servicios)
+            conn.execute(SQL_REGISTRAR_FILAS, (id_cita, id_cita))
+            self._pendientes.append(Cambio("insertar", id_cita, None, (id_cita, cliente, costo, fecha, ini, fin, imagen, recurso)))
+        return id_cita
+
+    def insertar_lote(self, filas):
+        # Carga masiva (importar, benchmark): filas con los parámetros de SQL_INSERTAR y sin
+        # avisos por fila. El índice FTS, los ingresos y el registro se llenan con un
+        # INSERT ... SELECT cada uno al final del lote en vez de fila por fila (los triggers por
+        # fila eran más de la mitad del tiempo): el DROP/CREATE de los triggers es parte de la transacción
+        with self.transaccion() as conn:
+            reloj = self._tic()
+            desde = conn.execute("SELECT coalesce(MAX(id), 0) FROM citas").fetchone()[0]
+            triggers = [conn.execute(SQL_TRIGGER, (f"{tabla}_ai",)).fetchone() for tabla, *_ in INGRESOS]
+            for tabla, *_ in INGRESOS: conn.execute(f"DROP TRIGGER IF EXISTS {tabla}_ai")
+            conn.execute("DROP TRIGGER IF EXISTS citas_fts_ai")
+            conn.executemany(SQL_INSERTAR_MARCADO, ((*f, self._uid(reloj, k), reloj, self.dispositivo, None, None)
+                                                    for k, f in enumerate(filas)))
+            conn.execute(SQL_FTS_DESDE, (desde,))
+            conn.execute(SQL_TRIGGER_FTS_AI)
+            for (tabla, clave, expr, _), (trigger,) in zip(INGRESOS, triggers):
+                conn.execute(SQL_SUMAR_INGRESOS_DESDE.format(tabla=tabla, clave=clave, expr=expr), (desde,))
+                conn.execute(trigger)
+            conn.execute(SQL_REGISTRAR_FILAS, (desde + 1, 2 ** 62))
+
+    def actualizar_cita(self, id_cita, cliente, costo, fecha, ini, fin, imagen, servicios=(), duracion=None, recurso=None):
+        with self.transaccion() as conn:
+            self._desarchivar(conn, SQL_ARCHIVADA_POR_ID, id_cita)
+            antes = self.obtener_cita(id_cita)
+            conn.execute(SQL_ACTUALIZAR, (cliente, costo, fecha, ini, fin, imagen, fecha_a_iso(fecha),
+                                          *rango_minutos(ini, fin), costo_a_centavos(costo),
+                                          self._tic(), self.dispositivo, duracion, id_cita, recurso))
+            self._escribir_servicios(conn, id_cita, servicios)
+            conn.execute(SQL_REGISTRAR_FILAS, (id_cita, id_cita))
+            self._pendientes.append(Cambio("actualizar", id_cita, antes, (id_cita, cliente, costo, fecha, ini, fin, imagen, recurso)))
+
+    def _escribir_servicios(self, conn, id_cita, servicios):
+        conn.execute(SQL_BORRAR_SERVICIOS_CITA, (id_cita,))
+        conn.executemany(SQL_AGREGAR_SERVICIO_CITA, ((id_cita, s) for s in servicios))
+
+    def eliminar_cita(self, id_cita):
+        with self.transaccion() as conn:
+            self._desarchivar(conn, SQL_ARCHIVADA_POR_ID, id_cita)
+            antes = self.obtener_cita(id_cita)
+            conn.execute(SQL_REGISTRAR_BORRADO, (self._tic(), self.dispositivo, id_cita))
+            conn.execute(SQL_ELIMINAR, (id_cita,))
+            if antes: self._pendientes.append(Cambio("eliminar", id_cita, antes, None))
+
+    # --- ARCHIVO ---
+    def archivar_lote(self, iso_hasta, lote):
+        # Mueve al archivo hasta 'lote' citas con día anterior a 'iso_hasta', en una transacción.
+        # Con WAL cada BD confirma por su cuenta: si algo corta entre las dos, la cita queda en
+        # ambas y el siguiente lote lo termina (INSERT OR IGNORE por id). Devuelve cuántas movió.
+        # Sin avisos: nada cambia a la vista
+        with self.transaccion() as conn:
+            ids = json.dumps([f[0] for f in conn.execute(SQL_LOTE_A_ARCHIVAR, (iso_hasta, lote))])
+            conn.execute(SQL_ARCHIVAR_CITAS, (ids,))
+            conn.execute(SQL_ARCHIVAR_SERVICIOS, (ids,))
+            movidas = conn.execute(SQL_BORRAR_LOTE, (ids,)).rowcount
+            for tabla, clave, expr, _ in INGRESOS:
+                conn.execute(SQL_DEVOLVER_INGRESOS.format(tabla=tabla, clave=clave, expr=expr), (ids,))
+            if movidas: self.archivo_hasta, self.archivo_max_id = conn.execute(SQL_ARCHIVO_LIMITES).fetchone()
+        return movidas
+
+    def compactar(self):
+        # VACUUM de la BD caliente: tras el primer archivado grande el archivo se achica.
+        # Después no hace falta: las páginas que libera cada archivado las reusan las citas nuevas
+        with self.lock:
+            self.conn.execute("VACUUM main")
+
+    def _desarchivar(self, conn, sql, clave):
+        # Una cita archivada que se va a escribir vuelve primero a la caliente: las escrituras
+        # (y sus triggers, el registro de sincronización) solo tocan la caliente
+        if self.archivo_hasta is None: return False
+        fila = conn.execute(sql, (clave,)).fetchone()
+        if fila is None: return False
+        id_cita, dia, centavos = fila
+        # Si ya estaba también en la caliente (un lote cortado a mitad) vale la de la caliente
+        devuelta = conn.execute(SQL_DESARCHIVAR_CITA, (id_cita,)).rowcount
+        conn.execute(SQL_DESARCHIVAR_SERVICIOS, (id_cita,))
+        # El INSERT la sumó a los ingresos, donde ya estaba contada
+        if devuelta and dia is not None:
+            for tabla, clave_tabla, _, expr in INGRESOS:
+                conn.execute(SQL_RESTAR_INGRESOS.format(tabla=tabla, clave=clave_tabla, expr=expr), (dia, centavos))
+        conn.execute(SQL_BORRAR_ARCHIVADA, (id_cita,))
+        return True
+
+    # --- SINCRONIZACIÓN ---
+    def leer_estado(self, clave, defecto=None):
+        filas = self.consultar(SQL_ESTADO, (clave,))
+        return filas[0][0] if filas else defecto
+
+    def guardar_estado(self, clave, valor):
+        with self.transaccion() as conn:
+            conn.execute(SQL_GUARDAR_ESTADO, (clave, str(valor)))
+
+    def cambios_desde(self, seq, limite=1000, excluir_origen=None, solo_origen=None):
+        # [(seq, uid, reloj, origen, datos)] en orden de seq; el último seq es el token siguiente
+        if solo_origen: return self.consultar(SQL_REGISTRO_PROPIO_DESDE, (seq, solo_origen, limite))
+        if excluir_origen: return self.consultar(SQL_REGISTRO_DESDE_SIN, (seq, excluir_origen, limite))
+        return self.consultar(SQL_REGISTRO_DESDE, (seq, limite))
+
+    def aplicar_remotos(self, cambios, choques=None):
+        # cambios: [(uid, reloj, origen, datos)]. Para cada uid gana la versión con mayor
+        # (reloj, origen): el orden de llegada no importa y todos los dispositivos convergen.
+        # Lo aplicado se vuelve a registrar aquí con la versión original.
+        # Una cita que pisa otra local del mismo recurso (doble reserva hecha en otro equipo) se
+        # aplica igual, pero se agrega a 'choques' como (uid, origen, fila) y su aviso lo marca
+        avisos = []
+        with self.transaccion() as conn:
+            for uid_cita, reloj, origen, datos in cambios:
+                with self.lock: self._reloj = max(self._reloj, reloj)
+                fila = conn.execute(SQL_VERSION_FILA, (uid_cita,)).fetchone()
+                if fila is None and self._desarchivar(conn, SQL_ARCHIVADA_POR_UID, uid_cita):
+                    fila = conn.execute(SQL_VERSION_FILA, (uid_cita,)).fetchone()
+                actual = (fila[1], fila[2]) if fila else conn.execute(SQL_VERSION_BORRADO, (uid_cita,)).fetchone()
+                if actual is not None and tuple(actual) >= (reloj, origen): continue
+                antes = self.obtener_cita(fila[0]) if fila else None
+                if datos is None:
+                    if fila:
+                        conn.execute(SQL_REGISTRAR_BORRADO, (reloj, origen, fila[0]))
+                        conn.execute(SQL_ELIMINAR, (fila[0],))
+                        avisos.append(Cambio("eliminar", fila[0], antes, None))
+                    else:
+                        conn.execute(SQL_REGISTRAR_TUMBA, (uid_cita, reloj, origen))
+                        avisos.append(None)
+                    continue
+                # Versiones previas mandaban 6 campos; servicios y recurso viajan por nombre
+                # (si aquí no existe el recurso, la cita queda sin asignar)
+                cliente, costo, fecha, ini, fin, imagen, *extra = datos
+                duracion, nombres, nombre_recurso = (extra + [None, [], None])[:3]
+                encontrado = conn.execute(SQL_ID_RECURSO, (nombre_recurso,)).fetchone() if nombre_recurso else None
+                recurso = encontrado[0] if encontrado else None
+                m_ini, m_fin = rango_minutos(ini, fin)
+                params = (cliente, costo, fecha, ini, fin, imagen, fecha_a_iso(fecha), m_ini, m_fin, costo_a_centavos(costo))
+                if fila:
+                    conn.execute(SQL_ACTUALIZAR, (*params, reloj, origen, duracion, fila[0], recurso))
+                    id_cita = fila[0]
+                else:
+                    id_cita = conn.execute(SQL_INSERTAR_MARCADO, (*params, uid_cita, reloj, origen, duracion, recurso)).lastrowid
+                servicios = [f[0] for f in conn.execute(SQL_IDS_SERVICIOS, (json.dumps(nombres or []),))]
+                self._escribir_servicios(conn, id_cita, servicios)
+                conn.execute(SQL_REGISTRAR_FILAS, (id_cita, id_cita))
+                despues = (id_cita, cliente, costo, fecha, ini, fin, imagen, recurso)
+                choca = m_ini is not None and conn.execute(SQL_CHOQUE, (params[6], m_fin, m_ini, id_cita, recurso)).fetchone() is not None
+                if choca and choques is not None: choques.append((uid_cita, origen, despues))
+                avisos.append(Cambio("actualizar" if fila else "insertar", id_cita, antes, despues, int(choca)))
+            # Muchos cambios de golpe (primera sincronización): un solo aviso de recarga
+            if len(avisos) > MAX_AVISOS_SYNC:
+                self._pendientes.append(Cambio("recargar", None, None, None, sum(a.choques for a in avisos if a)))
+            else: self._pendientes.extend(a for a in avisos if a is not None)
+        return len(avisos)
+
+    # --- SERVICIOS ---
+    def servicios(self):
+        # [(id, nombre, minutos, centavos, base)] activos, en el orden del catálogo
+        return self.consultar(SQL_SERVICIOS)
+
+    def guardar_servicios(self, filas):
+        # filas: [(id o None, nombre, minutos, centavos, base, orden, activo)]; nunca se borran
+        # (las citas viejas siguen apuntando a ellos), se desactivan
+        with self.transaccion() as conn:
+            conn.executemany(SQL_GUARDAR_SERVICIO, filas)
+
+    def servicios_de_cita(self, id_cita):
+        # ([ids de servicio], duración guardada en minutos)
+        ids = [f[0] for f in self.consultar(SQL_SERVICIOS_DE_CITA, (id_cita,))]
+        filas = self.consultar(SQL_DURACION_CITA, (id_cita,))
+        if not filas and self.archivo_hasta is not None:
+            ids = [f[0] for f in self.consultar(SQL_SERVICIOS_DE_CITA_ARCHIVO, (id_cita,))]
+            filas = self.consultar(SQL_DURACION_CITA_ARCHIVO, (id_cita,))
+        return ids, (filas[0][0] if filas else None)
+
+    # --- PERSONAL Y SILLAS ---
+    def recursos(self):
+        # [(id, nombre, activo)] en el orden elegido, también los desactivados (citas viejas)
+        return self.consultar(SQL_RECURSOS)
+
+    def guardar_recursos(self, filas):
+        # filas: [(id o None, nombre, orden, activo)]; como los servicios, no se borran
+        with self.transaccion() as conn:
+            conn.executemany(SQL_GUARDAR_RECURSO, filas)
+
+    # --- CITAS RECURRENTES ---
+    def reglas(self):
+        # ([filas de SQL_REGLAS], {regla_id: {días omitidos}})
+        omitidas = {}
+        for regla_id, dia in self.consultar(SQL_EXCEPCIONES):
+            omitidas.setdefault(regla_id, set()).add(dia)
+        return self.consultar(SQL_REGLAS), omitidas
+
+    def _serie_cambiada(self):
+        # Una serie toca un número indefinido de días: se avisa como recarga
+        with self.lock: self.version_reglas += 1
+        self._pendientes.append(Cambio("recargar", None, None, None))
+
+    def crear_regla(self, cliente, costo, fecha, ini, fin, imagen, frecuencia, intervalo=1,
+                    servicios=(), duracion=None, hasta=None, recurso=None):
+        with self.transaccion() as conn:
+            regla_id = conn.execute(SQL_INSERTAR_REGLA, (cliente, costo, costo_a_centavos(costo), ini, fin, imagen,
+                                                         *rango_minutos(ini, fin), duracion, json.dumps(list(servicios)),
+                                                         frecuencia, intervalo, fecha_a_iso(fecha),
+                                                         fecha_a_iso(hasta) if hasta else None, recurso)).lastrowid
+            self._serie_cambiada()
+        return regla_id
+
+    def omitir_ocurrencia(self, regla_id, iso):
+        with self.transaccion() as conn:
+            conn.execute(SQL_OMITIR_OCURRENCIA, (regla_id, iso))
+            self._serie_cambiada()
+
+    def separar_ocurrencia(self, regla_id, iso, cliente, costo, fecha, ini, fin, imagen, servicios=(), duracion=None,
+                           recurso=None):
+        # Editar una sola fecha: pasa a ser una cita normal y la serie la omite
+        with self.transaccion() as conn:
+            conn.execute(SQL_OMITIR_OCURRENCIA, (regla_id, iso))
+            self._serie_cambiada()
+            return self.insertar_cita(cliente, costo, fecha, ini, fin, imagen, servicios, duracion, recurso)
+
+    def terminar_regla(self, regla_id, iso_ultimo):
+        # La serie deja de repetirse después de 'iso_ultimo'; si no llegó a empezar, se borra
+        with self.transaccion() as conn:
+            conn.execute(SQL_TERMINAR_REGLA, (iso_ultimo, regla_id))
+            conn.execute(SQL_ELIMINAR_REGLA, (regla_id, iso_ultimo))
+            self._serie_cambiada()
+
+    def dias_ocupados_desde(self, iso, min_ini, min_fin, recurso=None):
+        # Días desde 'iso' con alguna cita que pisa [min_ini, min_fin): choques de una serie nueva
+        return [f[0] for f in self.consultar(SQL_DIAS_OCUPADOS_DESDE, (iso, min_fin, min_ini, recurso))]
+
+    # --- BÚSQUEDA POR CLIENTE ---
+    def buscar_citas(self, texto, antes_de_id=None, limite=TAM_PAGINA):
+        # Misma paginación por id que pagina_citas, pero sobre las citas cuyo cliente coincide
+        expresion = expresion_fts(texto)
+        if not expresion: return []
+        if antes_de_id is None:
+            filas = self.consultar(SQL_BUSCAR_PRIMERA, (expresion, limite))
+        else:
+            filas = self.consultar(SQL_BUSCAR_PAGINA, (expresion, antes_de_id, limite))
+        if self._sigue_en_archivo(filas, limite):
+            return self.consultar(SQL_BUSCAR_AMBAS, (expresion, 2 ** 62 if antes_de_id is None else antes_de_id, limite))
+        return filas
+
+    def sugerir_clientes(self, texto, n=MAX_SUGERENCIAS):
+        # Nombres distintos entre las coincidencias más recientes (autocompletar)
+        expresion = expresion_fts(texto)
+        if not expresion: return []
+        nombres, vistos = [], set()
+        for (cliente,) in self.consultar(SQL_AUTOCOMPLETAR, (expresion, n * 40)):
+            clave = (cliente or "").strip().casefold()
+            if clave and clave not in vistos:
+                vistos.add(clave); nombres.append(cliente.strip())
+                if len(nombres) >= n: break
+        return nombres
+
+    # --- REPORTES DE INGRESOS ---
+    def ingresos_por_dia(self, mes, anio):
+        # {'yyyy-mm-dd': (citas, centavos)} del mes
+        return {d: (n, c) for d, n, c in self.consultar(SQL_INGRESOS_DIAS, limites_mes(mes, anio))}
+
+    def ingresos_por_mes(self, anio):
+        # {mes (1-12): (citas, centavos)} del año
+        return {int(m[5:]): (n, c) for m, n, c in self.consultar(SQL_INGRESOS_MESES, (f"{anio}-", f"{anio + 1}-"))}
+
+    # --- CALENDARIOS ---
+    # Con recurso, solo las citas asignadas a ese recurso. Los meses viejos suman el archivo
+    def nombres_del_dia(self, fecha, recurso=None):
+        iso = fecha_a_iso(fecha)
+        if self._toca_archivo(iso):
+            if recurso is not None: return [f[0] for f in self.consultar(SQL_NOMBRES_DIA_RECURSO_AMBAS, (recurso, iso))]
+            return [f[0] for f in self.consultar(SQL_NOMBRES_DIA_AMBAS, (iso,))]
+        if recurso is not None:
+            return [f[0] for f in self.consultar(SQL_NOMBRES_DIA_RECURSO, (recurso, iso))]
+        return [f[0] for f in self.consultar(SQL_NOMBRES_DIA, (iso,))]
+
+    def nombres_por_dia(self, mes, anio, recurso=None):
+        citas_mes = {}
+        limites = limites_mes(mes, anio)
+        if self._toca_archivo(limites[0]):
+            filas = (self.consultar(SQL_NOMBRES_MES_RECURSO_AMBAS, (recurso, *limites)) if recurso is not None
+                     else self.consultar(SQL_NOMBRES_MES_AMBAS, limites))
+        else:
+            filas = (self.consultar(SQL_NOMBRES_MES_RECURSO, (recurso, *limites)) if recurso is not None
+                     else self.consultar(SQL_NOMBRES_MES, limites))
+        for f, nombre, *_ in filas:
+            citas_mes.setdefault(f, []).append(nombre)
+        return citas_mes
+
+    def conteos_por_dia(self, mes, anio):
+        limites = limites_mes(mes, anio)
+        return dict(self.consultar(SQL_CONTEOS_MES_AMBAS if self._toca_archivo(limites[0]) else SQL_CONTEOS_MES, limites))
+
+
+_repo = [None]
+_repo_ruta = [None]
+_repo_lock = threading.Lock()
+
+def obtener_repositorio(ruta=RUTA_BD):
+    # Conexión de larga vida compartida por todas las sesiones del proceso. Una sola BD por
+    # proceso (motor, cachés y recordatorios se arman sobre ella): pedir otra ruta es un error
+    with _repo_lock:
+        if _repo[0] is None:
+            _repo[0] = Repositorio(ruta)
+            _repo_ruta[0] = os.path.abspath(ruta)
+        elif os.path.abspath(ruta) != _repo_ruta[0]:
+            raise ValueError(f"ya está abierta {_repo_ruta[0]}; no se puede abrir también {ruta}")
+        return _repo[0]
@@ -0,0 +1,60 @@
+import threading
+
+# --- CATÁLOGO DE SERVICIOS ---
+# La lista sale de la tabla 'servicios' una vez y queda en memoria; la duración y el precio
+# de cada combinación elegida se calculan una sola vez (clave: frozenset de ids).
+# Guardar el catálogo invalida todo.
+
+
+class Catalogo:
+    def __init__(self, repo):
+        self.repo = repo
+        self.lock = threading.Lock()
+        self._lista = None
+        self._totales = {}
+
+    def servicios(self):
+        # [(id, nombre, minutos, centavos, base)]
+        with self.lock:
+            if self._lista is None:
+                self._lista = self.repo.servicios()
+            return self._lista
+
+    def opcionales(self):
+        # Los que se muestran como chips (los 'base' van siempre)
+        return [s for s in self.servicios() if not s[4]]
+
+    def _total(self, ids):
+        clave = frozenset(ids)
+        with self.lock:
+            total = self._totales.get(clave)
+        if total is None:
+            elegidos = [s for s in self.servicios() if s[4] or s[0] in clave]
+            total = (sum(s[2] for s in elegidos), sum(s[3] for s in elegidos))
+            with self.lock: self._totales[clave] = total
+        return total
+
+    def duracion(self, ids=()):
+        return self._total(ids)[0]
+
+    def precio(self, ids=()):
+        return self._total(ids)[1]
+
+    def guardar(self, filas):
+        self.repo.guardar_servicios(filas)
+        self.invalidar()
+
+    def invalidar(self):
+        with self.lock:
+            self._lista = None
+            self._totales.clear()
+
+
+_catalogo = [None]
+_catalogo_lock = threading.Lock()
+
+def obtener_catalogo(repo):
+    with _catalogo_lock:
+        if _catalogo[0] is None:
+            _catalogo[0] = Catalogo(repo)
+        return _catalogo[0]
@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from repositorio import obtener_repositorio, RUTA_BD
+from recurrencia import Recurrencias
+
+# --- SINCRONIZACIÓN ENTRE DISPOSITIVOS ---
+# Cada dispositivo guarda sus escrituras en la tabla 'registro' (log append-only, seq
+# monótono). Uno de ellos (p. ej. la PC) sirve su log por HTTP; los demás suben sus
+# cambios propios desde su último token y bajan los ajenos desde el suyo: solo viajan
+# deltas. Los choques de versión los resuelve Repositorio.aplicar_remotos (mayor reloj,
+# desempate por dispositivo), igual en todos lados.
+#
+#   python sincronizacion.py servidor --puerto 8765
+#   python sincronizacion.py sincronizar http://192.168.1.10:8765
+#
+# En la app: AGENDA_SYNC_SERVIDOR=8765 (servir) o AGENDA_SYNC_URL=http://... (cliente),
+# AGENDA_SYNC_CLAVE=... (clave compartida) y AGENDA_SYNC_INTERVALO=30 (segundos). Sin clave, el
+# servidor solo escucha en 127.0.0.1: cualquiera en la red podría sobrescribir o borrar citas.
+
+PUERTO = 8765
+LOTE = 1000
+INTERVALO = 30
+TIMEOUT = 15
+
+log = logging.getLogger("agenda.sync")
+
+
+def _a_json(filas):
+    return [{"seq": seq, "uid": uid, "reloj": reloj, "origen": origen, "datos": json.loads(datos) if datos else None}
+            for seq, uid, reloj, origen, datos in filas]
+
+
+def _de_json(cambios):
+    return [(c["uid"], int(c["reloj"]), c["origen"], c["datos"]) for c in cambios]
+
+
+def _aplicar(repo, cambios):
+    # Una cita remota que pisa otra local del mismo recurso (doble reserva hecha en otro equipo)
+    # o una ocurrencia de serie se aplica igual (si se descartara, los dispositivos no
+    # convergerían: el otro ya la tiene), pero queda avisado en el log y, en la app, en pantalla
+    recurrencias = Recurrencias(repo)
+    if recurrencias.reglas():
+        for uid, _, origen, datos in cambios:
+            if datos and recurrencias.choca(*datos[2:5]):
+                log.warning("cita remota %s (%s) pisa una serie: %s %s-%s", uid, origen, *datos[2:5])
+    choques = []
+    aplicados = repo.aplicar_remotos(cambios, choques)
+    for uid, origen, fila in choques:
+        log.warning("cita remota %s (%s) pisa otra cita: %s %s %s-%s", uid, origen, fila[1], *fila[3:6])
+    return aplicados
+
+
+# --- SERVIDOR ---
+class _Manejador(BaseHTTPRequestHandler):
+    repo = None
+    clave = None
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _autorizado(self):
+        if self.clave and self.headers.get("X-Agenda-Clave") != self.clave:
+            self._responder(403, {"error": "clave incorrecta"}); return False
+        return True
+
+    def do_GET(self):
+        # /cambios?desde=<seq>&excluir=<dispositivo>&limite=<n>
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/cambios": return self._responder(404, {"error": "no existe"})
+        if not self._autorizado(): return
+        q = urllib.parse.parse_qs(url.query)
+        try:
+            desde = int(q.get("desde", ["0"])[0])
+            limite = min(int(q.get("limite", [str(LOTE)])[0]), 10 * LOTE)
+        except ValueError as ex:
+            return self._responder(400, {"error": str(ex)})
+        if limite <= 0: return self._responder(400, {"error": "limite debe ser positivo"})
+        filas = self.repo.cambios_desde(desde, limite, excluir_origen=q.get("excluir", [None])[0])
+        self._responder(200, {"cambios": _a_json(filas), "token": filas[-1][0] if filas else desde,
+                              "mas": len(filas) == limite, "servidor": self.repo.dispositivo})
+
+    def do_POST(self):
+        if self.path != "/cambios": return self._responder(404, {"error": "no existe"})
+        if not self._autorizado(): return
+        try:
+            cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            aplicados = _aplicar(self.repo, _de_json(cuerpo.get("cambios", [])))
+        except (ValueError, KeyError, TypeError) as ex:
+            return self._responder(400, {"error": str(ex)})
+        self._responder(200, {"aplicados": aplicados})
+
+    def log_message(self, formato, *args):
+        log.debug(formato, *args)
+
+
+def servir(repo, puerto=PUERTO, host=None, clave=None):
+    # Servidor en un hilo aparte; devuelve el objeto para poder apagarlo con shutdown().
+    # Todas las interfaces solo con clave; sin ella, únicamente este equipo
+    if host is None: host = "0.0.0.0" if clave else "127.0.0.1"
+    if not clave and host not in ("127.0.0.1", "localhost", "::1"): raise ValueError("servir en la red requiere una clave (AGENDA_SYNC_CLAVE)")
+    if not clave: log.warning("sync sin AGENDA_SYNC_CLAVE: el servidor solo acepta conexiones de 127.0.0.1")
+    manejador = type("Manejador", (_Manejador,), {"repo": repo, "clave": clave})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    threading.Thread(target=servidor.serve_forever, daemon=True, name="sync-servidor").start()
+    return servidor
+
+
+# --- CLIENTE ---
+def _pedir(url, clave=None, cuerpo=None):
+    datos = json.dumps(cuerpo).encode("utf-8") if cuerpo is not None else None
+    peticion = urllib.request.Request(url, data=datos, method="POST" if datos else "GET")
+    peticion.add_header("Content-Type", "application/json")
+    if clave: peticion.add_header("X-Agenda-Clave", clave)
+    with urllib.request.urlopen(peticion, timeout=TIMEOUT) as r:
+        return json.loads(r.read())
+
+
+def sincronizar(repo, url, clave=None, lote=LOTE):
+    # Sube lo propio desde el token de subida y baja lo ajeno desde el de bajada.
+    # Cada token se guarda junto con lo aplicado: si se corta a medias, se retoma ahí
+    url = url.rstrip("/")
+    clave_subida, clave_bajada = f"sync_subida:{url}", f"sync_bajada:{url}"
+    resultado = {"subidos": 0, "bajados": 0, "aplicados": 0}
+
+    token = int(repo.leer_estado(clave_subida, 0))
+    while True:
+        filas = repo.cambios_desde(token, lote, solo_origen=repo.dispositivo)
+        if not filas: break
+        _pedir(f"{url}/cambios", clave, {"cambios": _a_json(filas)})
+        token = filas[-1][0]
+        repo.guardar_estado(clave_subida, token)
+        resultado["subidos"] += len(filas)
+
+    token = int(repo.leer_estado(clave_bajada, 0))
+    while True:
+        q = urllib.parse.urlencode({"desde": token, "excluir": repo.dispositivo, "limite": lote})
+        r = _pedir(f"{url}/cambios?{q}", clave)
+        with repo.transaccion():
+            resultado["aplicados"] += _aplicar(repo, _de_json(r["cambios"]))
+            repo.guardar_estado(clave_bajada, r["token"])
+        token = r["token"]
+        resultado["bajados"] += len(r["cambios"])
+        if not r["mas"]: break
+    return resultado
+
+
+def _periodica(repo, url, clave, intervalo):
+    while True:
+        try:
+            r = sincronizar(repo, url, clave)
+            if r["subidos"] or r["bajados"]: log.info("sync %s", r)
+        except Exception as ex:
+            log.warning("sync con %s falló: %s", url, ex)  # Sin red: se reintenta en el próximo ciclo
+        time.sleep(intervalo)
+
+
+_iniciada = [False]
+_iniciada_lock = threading.Lock()
+
+def configurar_desde_entorno(repo):
+    # Una sola vez por proceso, aunque main() corra por cada sesión
+    with _iniciada_lock:
+        if _iniciada[0]: return
+        _iniciada[0] = True
+    clave = os.environ.get("AGENDA_SYNC_CLAVE")
+    if os.environ.get("AGENDA_SYNC_SERVIDOR"):
+        servir(repo, int(os.environ["AGENDA_SYNC_SERVIDOR"]), clave=clave)
+    if os.environ.get("AGENDA_SYNC_URL"):
+        intervalo = float(os.environ.get("AGENDA_SYNC_INTERVALO", INTERVALO))
+        threading.Thread(target=_periodica, args=(repo, os.environ["AGENDA_SYNC_URL"], clave, intervalo),
+                         daemon=True, name="sync-cliente").start()
+
+
+def principal(argv=None):
+    parser = argparse.ArgumentParser(description="Sincronización de citas entre dispositivos")
+    parser.add_argument("accion", choices=["servidor", "sincronizar"])
+    parser.add_argument("url", nargs="?", help="URL del servidor (para 'sincronizar')")
+    parser.add_argument("--bd", default=RUTA_BD)
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--clave", default=os.environ.get("AGENDA_SYNC_CLAVE"))
+    args = parser.parse_args(argv)
+
+    repo = obtener_repositorio(args.bd)
+    if args.accion == "servidor":
+        servidor = servir(repo, args.puerto, clave=args.clave)
+        donde = "la red" if args.clave else "127.0.0.1 (sin --clave)"
+        print(f"Sirviendo cambios de {args.bd} en el puerto {args.puerto} de {donde} (dispositivo {repo.dispositivo})")
+        try:
+            while True: time.sleep(3600)
+        except KeyboardInterrupt:
+            servidor.shutdown()
+    else:
+        if not args.url: parser.error("falta la URL del servidor")
+        r = sincronizar(repo, args.url, args.clave)
+        print(f"Subidos: {r['subidos']}  Bajados: {r['bajados']}  Aplicados: {r['aplicados']}")
+
+
+if __name__ == "__main__":
+    principal()
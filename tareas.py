@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- TRABAJO FUERA DEL HILO DE EVENTOS ---
+# Consultas y cálculos corren en un pool compartido; el resultado vuelve a la página
+# con un callback. Cada tarea lleva una clave: al lanzar otra con la misma clave,
+# la anterior se cancela (o, si ya estaba corriendo, su resultado se descarta).
+# diferir() agrega un retardo (debounce): solo sale la última de una ráfaga.
+
+POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tareas")
+
+
+class Tareas:
+    def __init__(self, pool=POOL):
+        self.pool = pool
+        self.generaciones = {}
+        self.futuros = {}
+        self.esperas = {}  # clave -> Timer de diferir() aún sin disparar
+        self.lock = threading.Lock()
+        self.lock_ui = threading.RLock()  # Los callbacks de una sesión no se pisan entre sí
+
+    def lanzar(self, clave, funcion, al_terminar, al_error=None):
+        # clave=None: tarea que no se cancela (p. ej. una escritura)
+        with self.lock:
+            self._quitar_espera(clave)
+            generacion = self.generaciones.get(clave, 0) + 1
+            self.generaciones[clave] = generacion
+            anterior = self.futuros.get(clave)
+            if anterior is not None and clave is not None: anterior.cancel()
+            futuro = self.pool.submit(self._correr, clave, generacion, funcion, al_terminar, al_error)
+            if clave is not None: self.futuros[clave] = futuro
+        return futuro
+
+    def diferir(self, clave, segundos, funcion, al_terminar, al_error=None):
+        # Se lanza tras 'segundos' sin otra llamada con la misma clave
+        with self.lock:
+            self._quitar_espera(clave)
+            espera = threading.Timer(segundos, self._disparar, (clave, funcion, al_terminar, al_error))
+            espera.daemon = True
+            self.esperas[clave] = espera
+        espera.start()
+
+    def _disparar(self, clave, funcion, al_terminar, al_error):
+        with self.lock:
+            if self.esperas.get(clave) is not threading.current_thread(): return
+            del self.esperas[clave]
+        self.lanzar(clave, funcion, al_terminar, al_error)
+
+    def _quitar_espera(self, clave):
+        espera = self.esperas.pop(clave, None)
+        if espera is not None: espera.cancel()
+
+    def cancelar(self, clave):
+        with self.lock:
+            self._quitar_espera(clave)
+            self.generaciones[clave] = self.generaciones.get(clave, 0) + 1
+            futuro = self.futuros.pop(clave, None)
+        if futuro is not None: futuro.cancel()
+
+    def pendiente(self, clave):
+        with self.lock:
+            if clave in self.esperas: return True
+            futuro = self.futuros.get(clave)
+        return futuro is not None and not futuro.done()
+
+    def _vigente(self, clave, generacion):
+        return clave is None or self.generaciones.get(clave) == generacion
+
+    def _correr(self, clave, generacion, funcion, al_terminar, al_error):
+        if not self._vigente(clave, generacion): return
+        try:
+            resultado = funcion()
+        except Exception as ex:
+            with self.lock_ui:
+                if al_error and self._vigente(clave, generacion): al_error(ex)
+            return
+        with self.lock_ui:
+            if self._vigente(clave, generacion): al_terminar(resultado)
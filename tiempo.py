@@ -0,0 +1,50 @@
+# --- CONVERSIONES DE FECHA Y HORA ---
+# La UI muestra 'dd/mm/yyyy' y '07:30 PM'; la base de datos indexa 'yyyy-mm-dd'
+# y minutos desde medianoche. Parseo manual: mucho más barato que strptime.
+
+FMT_HORA = "%I:%M %p"
+FMT_FECHA = "%d/%m/%Y"
+
+
+def fecha_a_iso(fecha):
+    try:
+        d, m, a = fecha.split("/")
+        return f"{int(a):04d}-{int(m):02d}-{int(d):02d}"
+    except (AttributeError, ValueError):
+        return None
+
+
+def iso_a_fecha(iso):
+    a, m, d = iso.split("-")
+    return f"{d}/{m}/{a}"
+
+
+def hora_a_minutos(hora):
+    try:
+        hm, ampm = hora.strip().split(" ")
+        h, m = hm.split(":")
+        h = int(h) % 12
+        if ampm.upper() == "PM": h += 12
+        return h * 60 + int(m)
+    except (AttributeError, ValueError):
+        return None
+
+
+def minutos_a_hora(minutos):
+    minutos %= 1440
+    h, m = divmod(minutos, 60)
+    return f"{(h % 12) or 12:02d}:{m:02d} {'PM' if h >= 12 else 'AM'}"
+
+
+def rango_minutos(ini, fin):
+    # Devuelve (inicio, fin) en minutos; si la cita cruza medianoche el fin pasa de 1440
+    m_ini, m_fin = hora_a_minutos(ini), hora_a_minutos(fin)
+    if m_ini is None or m_fin is None: return None, None
+    if m_fin <= m_ini: m_fin += 1440
+    return m_ini, m_fin
+
+
+def limites_mes(mes, anio):
+    # Rango ISO [inicio, fin) de un mes, apto para un range scan sobre el índice
+    sig_mes, sig_anio = (1, anio + 1) if mes == 12 else (mes + 1, anio)
+    return f"{anio:04d}-{mes:02d}-01", f"{sig_anio:04d}-{sig_mes:02d}-01"